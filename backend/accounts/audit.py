@@ -0,0 +1,230 @@
+"""
+Buffered audit log writer.
+
+Admin actions used to pay for their audit entry with a synchronous INSERT,
+which on SQLite is a write transaction of its own. Once started (from the
+ASGI/WSGI entry points, like the expiry sweeper), ``audit_writer`` queues
+entries in memory when the action's transaction commits, and a
+background thread writes them with one ``bulk_create`` every
+``FLUSH_INTERVAL`` seconds or as soon as ``BATCH_SIZE`` entries are
+waiting. Entries are flushed on interpreter exit, and before the audit log
+is read so admins always see their own actions. Between flushes the thread
+also moves expired entries to the monthly archives (accounts.audit_archive).
+
+Until it is started the writer saves each entry synchronously, in the
+caller's transaction, so tests and management commands behave as before.
+If the queue backs up past ``MAX_PENDING`` (the database is unavailable
+for a long time), entries are written synchronously again instead of
+piling up in memory.
+
+``filter_audit_log()`` applies the audit log list's filters. Each of them
+(action, user, target) has an index ending in ``(created_at, id)``, so a
+filtered page is a short index range scan whatever the table size. Text
+search goes through the ``accounts_auditlog_fts`` FTS5 index over
+``description`` and ``metadata``, kept in sync by triggers (migration
+0029). A migration that rebuilds the ``accounts_auditlog`` table drops
+those triggers and must recreate them.
+"""
+import atexit
+import logging
+import re
+import threading
+from collections import deque
+
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .audit_archive import maybe_archive_audit_log
+from .models import AuditLog
+from .pagination import InvalidPageRequest, get_date_range
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 100
+MAX_PENDING = 10000
+
+FTS_TABLE = 'accounts_auditlog_fts'
+_SEARCH_TERM = re.compile(r'\w+')
+
+
+class AuditWriter:
+    """Queues audit entries and writes them in batches on its own thread."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        logger.info("Audit log writer started")
+
+    def stop(self):
+        """Stop the thread and write everything still queued."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def record(self, entry):
+        """Write ``entry`` (an unsaved AuditLog) now, or queue it once the transaction commits."""
+        if not self.running or len(self._pending) >= self.max_pending:
+            entry.save()
+            return
+        transaction.on_commit(lambda: self._enqueue(entry))
+
+    def _enqueue(self, entry):
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                return  # stop() writes the rest on its own thread
+            try:
+                self.flush()
+                maybe_archive_audit_log()
+            except Exception:
+                logger.exception("Audit log flush or archive pass failed")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write all queued entries; return how many were written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return written
+                try:
+                    AuditLog.objects.bulk_create(batch)
+                except IntegrityError:
+                    # e.g. an entry's user was deleted meanwhile: write the rest one by one
+                    written += self._write_each(batch)
+                    continue
+                except DatabaseError:
+                    # Database busy or down: keep the entries for the next flush
+                    with self._lock:
+                        self._pending.extendleft(reversed(batch))
+                    raise
+                written += len(batch)
+
+    @staticmethod
+    def _write_each(batch):
+        written = 0
+        for entry in batch:
+            try:
+                entry.save()
+                written += 1
+            except IntegrityError:
+                logger.error(f"Dropped audit entry {entry.action} ({entry.description!r})")
+        return written
+
+
+audit_writer = AuditWriter()
+
+
+def start_audit_writer():
+    """Start the process-wide writer (called from the ASGI/WSGI entry points)."""
+    audit_writer.start()
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    never interpreted. Returns '' if ``text`` has no words.
+    """
+    return ' '.join(f'"{term}"*' for term in _SEARCH_TERM.findall(text))
+
+
+def search_audit_log(queryset, text):
+    """Restrict ``queryset`` to entries whose description or metadata match ``text``."""
+    query = fts_query(text)
+    if not query:
+        return queryset
+    if connection.vendor == 'sqlite':
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query],
+        ))
+    terms = Q()
+    for term in _SEARCH_TERM.findall(text):
+        terms &= Q(description__icontains=term) | Q(metadata_text__icontains=term)
+    return queryset.annotate(metadata_text=Cast('metadata', TextField())).filter(terms)
+
+
+def parse_audit_filters(request):
+    """Read the audit log list's filter parameters.
+
+    * ``action`` — one action or a comma-separated list
+    * ``user`` — username of the acting user (``System`` for entries without one)
+    * ``target_type`` / ``target_id`` — the affected object
+    * ``date_from`` / ``date_to`` — bounds on ``created_at`` (see accounts.pagination)
+    * ``q`` — full-text search over description and metadata
+
+    Raises InvalidPageRequest for malformed values.
+    """
+    params = request.query_params
+    target_id = params.get('target_id', '').strip()
+    if target_id:
+        try:
+            target_id = int(target_id)
+        except ValueError:
+            raise InvalidPageRequest('target_id must be an integer.')
+    start, end = get_date_range(request)
+    return {
+        'actions': [a.strip() for a in params.get('action', '').split(',') if a.strip()],
+        'user': params.get('user', '').strip(),
+        'target_type': params.get('target_type', '').strip(),
+        'target_id': target_id if target_id != '' else None,
+        'start': start,
+        'end': end,
+        'q': params.get('q', ''),
+    }
+
+
+def filter_audit_log(queryset, filters):
+    """Apply ``parse_audit_filters`` output to an AuditLog queryset."""
+    if filters['actions']:
+        queryset = queryset.filter(action__in=filters['actions'])
+    if filters['user'] == 'System':
+        queryset = queryset.filter(user__isnull=True)
+    elif filters['user']:
+        queryset = queryset.filter(user__username=filters['user'])
+    if filters['target_type']:
+        queryset = queryset.filter(target_type=filters['target_type'])
+    if filters['target_id'] is not None:
+        queryset = queryset.filter(target_id=filters['target_id'])
+    if filters['start']:
+        queryset = queryset.filter(created_at__gte=filters['start'])
+    if filters['end']:
+        queryset = queryset.filter(created_at__lt=filters['end'])
+    return search_audit_log(queryset, filters['q'])
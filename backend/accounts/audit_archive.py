@@ -0,0 +1,316 @@
+"""
+Audit log retention and monthly archives.
+
+The audit log shares its SQLite file with the RFID scan path, so it should
+not grow without bound. Entries older than their retention period
+(``AUDIT_RETENTION_DAYS``, overridable per action with
+``AUDIT_RETENTION_BY_ACTION``) are moved out of the database into one
+gzip-compressed JSON Lines file per month (``audit-log-YYYY-MM.jsonl.gz``
+in ``AUDIT_ARCHIVE_DIR``, months in UTC). The audit writer thread runs
+``maybe_archive_audit_log()``. A pass moves at most
+``MAX_BATCHES_PER_PASS`` batches so queued audit entries are not held up
+for long, and a backlog is worked off over the following passes.
+
+Each batch is appended as a complete gzip member with a single write and
+synced before its rows are deleted, so a crash can at worst leave rows in
+both places. Readers drop such duplicates by id. SQLite reuses the pages
+freed by the deletes, so the hot table and the database file stay at
+their steady-state size.
+
+Archives stay queryable: ``search_archive()`` reads only the months the
+request needs, newest first, and applies the same filters as the audit
+log list. Each month is streamed member by member from its newest end
+and the read stops once the page is full; the member offsets are indexed
+on first read and extended as batches are appended. This is slower than
+the indexed table but needs no database work.
+"""
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+MAX_BATCHES_PER_PASS = 10
+ARCHIVE_INTERVAL = 6 * 3600
+SCAN_CHUNK = 64 * 1024
+
+_FILE_NAME = re.compile(r'^audit-log-(\d{4}-\d{2})\.jsonl\.gz$')
+_WORD = re.compile(r'\w+')
+ACTION_LABELS = dict(AuditLog.ACTION_CHOICES)
+
+
+def archive_dir():
+    return Path(settings.AUDIT_ARCHIVE_DIR)
+
+
+def archive_path(month):
+    """Path of the archive file for ``month`` (``"YYYY-MM"``)."""
+    return archive_dir() / f'audit-log-{month}.jsonl.gz'
+
+
+def archive_months():
+    """Return the archived months, newest first."""
+    if not archive_dir().is_dir():
+        return []
+    months = [m.group(1) for m in map(_FILE_NAME.match, os.listdir(archive_dir())) if m]
+    return sorted(months, reverse=True)
+
+
+def _month(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def retention_condition(now=None):
+    """Return a Q matching entries past their retention, or None if nothing expires."""
+    now = now or timezone.now()
+    overrides = getattr(settings, 'AUDIT_RETENTION_BY_ACTION', {})
+    default_days = getattr(settings, 'AUDIT_RETENTION_DAYS', 0)
+    condition = Q()
+    for action, days in overrides.items():
+        if days > 0:
+            condition |= Q(action=action, created_at__lt=now - timedelta(days=days))
+    if default_days > 0:
+        condition |= Q(created_at__lt=now - timedelta(days=default_days)) & ~Q(action__in=list(overrides))
+    return condition or None
+
+
+def archive_record(entry):
+    return {
+        'id': entry.id,
+        'user': entry.user.username if entry.user else 'System',
+        'action': entry.action,
+        'target_type': entry.target_type,
+        'target_id': entry.target_id,
+        'description': entry.description,
+        'metadata': entry.metadata,
+        'created_at': entry.created_at.isoformat(),
+    }
+
+
+def _append(month, records):
+    path = archive_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ''.join(json.dumps(r, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n' for r in records)
+    member = gzip.compress(lines.encode('utf-8'))
+    # One O_APPEND write per member: concurrent archivers never interleave bytes.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, member)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def archive_audit_log(now=None, batch_size=BATCH_SIZE, max_batches=None):
+    """Move entries past their retention into the monthly archives.
+
+    Returns ``(archived, done)``; ``done`` is False if ``max_batches`` was
+    reached with expired entries left.
+    """
+    condition = retention_condition(now)
+    if condition is None:
+        return 0, True
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = list(
+            AuditLog.objects.filter(condition).select_related('user').order_by('id')[:batch_size]
+        )
+        if not batch:
+            return archived, True
+        by_month = defaultdict(list)
+        for entry in batch:
+            by_month[_month(entry.created_at)].append(archive_record(entry))
+        for month, records in sorted(by_month.items()):
+            _append(month, records)
+        AuditLog.objects.filter(id__in=[entry.id for entry in batch]).delete()
+        archived += len(batch)
+        batches += 1
+    logger.info(f"Archived {archived} audit log entries (more pending)")
+    return archived, False
+
+
+_archive_lock = threading.Lock()
+_last_archive = 0.0
+
+
+def maybe_archive_audit_log():
+    """Run one bounded archive pass if this process has not in ``ARCHIVE_INTERVAL``."""
+    global _last_archive
+    if time.monotonic() - _last_archive < ARCHIVE_INTERVAL:
+        return False
+    if not _archive_lock.acquire(blocking=False):
+        return False
+    try:
+        archived, done = archive_audit_log(max_batches=MAX_BATCHES_PER_PASS)
+        if done:
+            # Otherwise the next pass continues with the backlog right away.
+            _last_archive = time.monotonic()
+            if archived:
+                logger.info(f"Archived {archived} audit log entries")
+    finally:
+        _archive_lock.release()
+    return True
+
+
+_index_lock = threading.Lock()
+# path -> (inode, bytes indexed, [(newest key, oldest key, offset, length)])
+_member_index = {}
+
+
+def _scan_members(f, offset, name):
+    """Yield ``(newest key, oldest key, offset, length)`` for each complete member from ``offset``."""
+    f.seek(offset)
+    data = b''
+    while True:
+        decompressor = zlib.decompressobj(wbits=31)
+        chunks = []
+        consumed = 0
+        try:
+            while not decompressor.eof:
+                if not data:
+                    data = f.read(SCAN_CHUNK)
+                    if not data:
+                        if consumed:
+                            logger.warning(f"Truncated audit archive {name} at byte {offset}")
+                        return
+                consumed += len(data)
+                chunks.append(decompressor.decompress(data))
+                data = b''
+            keys = [archive_sort_key(json.loads(line)) for line in b''.join(chunks).splitlines()]
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Unreadable audit archive {name} at byte {offset}: {e}")
+            return
+        data = decompressor.unused_data
+        length = consumed - len(data)
+        if keys:
+            yield min(keys), max(keys), offset, length
+        offset += length
+
+
+def _members(path):
+    """Return the index of ``path``'s gzip members, scanning only bytes appended since the last call."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return []
+    with _index_lock:
+        inode, scanned, members = _member_index.get(str(path), (None, 0, []))
+        if inode != stat.st_ino or stat.st_size < scanned:
+            scanned, members = 0, []
+        if stat.st_size > scanned:
+            with open(path, 'rb') as f:
+                new = list(_scan_members(f, scanned, path.name))
+            if new:
+                members = members + new
+                scanned = new[-1][2] + new[-1][3]
+            _member_index[str(path)] = (stat.st_ino, scanned, members)
+        return members
+
+
+def _read_member(f, offset, length):
+    f.seek(offset)
+    lines = gzip.decompress(f.read(length)).decode('utf-8').splitlines()
+    return [json.loads(line) for line in lines]
+
+
+def read_month(month, after=None):
+    """Yield a month's archived entries, newest first, without duplicates.
+
+    Batches are appended as gzip members in roughly time order, so entries
+    are merged from the newest members back and a member is decompressed
+    only once the reader gets to it. ``after`` is an ``archive_sort_key``
+    to continue from; members holding nothing past it are not read.
+    """
+    members = sorted(m for m in _members(archive_path(month)) if after is None or m[1] > after)
+    if not members:
+        return
+    pending = []
+    order = itertools.count()
+    seen = set()
+    with open(archive_path(month), 'rb') as f:
+        opened = 0
+        while pending or opened < len(members):
+            # Open every member that may hold an entry newer than the best one buffered.
+            while opened < len(members) and (not pending or members[opened][0] <= pending[0][0]):
+                for record in _read_member(f, *members[opened][2:]):
+                    heapq.heappush(pending, (archive_sort_key(record), next(order), record))
+                opened += 1
+            key, _, record = heapq.heappop(pending)
+            if (after and key <= after) or record['id'] in seen:
+                continue
+            seen.add(record['id'])
+            yield record
+
+
+def archive_sort_key(record):
+    """Position of an archived entry, newest first (``created_at``, then id)."""
+    created_at = datetime.fromisoformat(record['created_at'])
+    return (-created_at.timestamp(), -record['id'])
+
+
+def _matches(record, filters):
+    if filters['actions'] and record['action'] not in filters['actions']:
+        return False
+    if filters['user'] and record['user'] != filters['user']:
+        return False
+    if filters['target_type'] and record['target_type'] != filters['target_type']:
+        return False
+    if filters['target_id'] is not None and record['target_id'] != filters['target_id']:
+        return False
+    created_at = datetime.fromisoformat(record['created_at'])
+    if filters['start'] and created_at < filters['start']:
+        return False
+    if filters['end'] and created_at >= filters['end']:
+        return False
+    terms = [t.lower() for t in _WORD.findall(filters['q'])]
+    if terms:
+        # Same semantics as the FTS index: every word matches a word's prefix.
+        words = _WORD.findall(f"{record['description']} {json.dumps(record['metadata'])}".lower())
+        if not all(any(w.startswith(t) for w in words) for t in terms):
+            return False
+    return True
+
+
+def search_archive(filters, limit, after=None):
+    """Return up to ``limit`` archived entries matching ``filters``, newest first.
+
+    ``filters`` is ``accounts.audit.parse_audit_filters`` output; ``after``
+    is an ``archive_sort_key`` to continue from. Only the months that can
+    hold results are read.
+    """
+    start_month = _month(filters['start']) if filters['start'] else None
+    end_month = _month(filters['end']) if filters['end'] else None
+    after_month = (
+        _month(datetime.fromtimestamp(-after[0], tz=dt_timezone.utc)) if after else None
+    )
+    results = []
+    for month in archive_months():
+        if (end_month and month > end_month) or (after_month and month > after_month):
+            continue
+        if start_month and month < start_month:
+            break
+        for record in read_month(month, after):
+            if _matches(record, filters):
+                label = ACTION_LABELS.get(record['action'], record['action'])
+                results.append(dict(record, action_display=label, archived=True))
+                if len(results) >= limit:
+                    return results
+    return results
@@ -1,11 +1,22 @@
 """
 WebSocket consumers for real-time station communication.
 """
+import asyncio
 import json
 import logging
+import time
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import station_link
+from .leaderboard import get_leaderboard_snapshot
+from .topology import get_topology
+from .views import STATION_LINK_HANDLERS
 
 logger = logging.getLogger(__name__)
 
@@ -126,12 +137,178 @@ class StationConsumer(AsyncWebsocketConsumer):
         }))
 
 
+class StationControlConsumer(StationConsumer):
+    """Persistent control link from a station's hardware app.
+
+    Stations connect to ``ws/station/<station_id>/control/?ip=...`` with
+    ``Authorization: Bearer <STATION_TOKEN>`` (see ``accounts.station_link``). The link is refused with close code
+    4401 for a bad token and 4404 for an IP that is not a controller.
+
+    Station -> backend:
+        {"type": "heartbeat"}  ->  {"type": "heartbeat_ack", "server_time"}
+        {"type": "scan" | "events" | "health", "id", "data": {...}}
+            ->  {"type": "response", "id", "status", "body"}
+        where data, body and status are those of rfid/scan/,
+        stations/events/ and controllers/health/[batch/]. Requests run
+        concurrently, each on its own worker thread, so a long journal
+        batch does not hold up the scans sent after it; responses may come
+        back out of order and are matched by id.
+
+    Backend -> station:
+        {"type": "config", "config": {...}}  on connect and on changes
+        {"type": "staff_cache_invalidate", "rfid_tags": [...]}
+
+    Messages of the plain station socket (ping, get_status, ...) work too.
+    """
+
+    async def connect(self):
+        """Authenticate the station and register its presence."""
+        self.controller = None
+        self.request_tasks = set()
+        self.uri_builder = _ScopeUri(self.scope)
+        params = parse_qs(self.scope.get('query_string', b'').decode('latin1'))
+        await self.accept()
+
+        headers = dict(self.scope.get('headers') or [])
+        authorization = headers.get(b'authorization', b'').decode('latin1')
+        if not station_link.token_valid(station_link.bearer_token(authorization)):
+            logger.warning("Station control link refused: invalid token")
+            await self.close(code=station_link.CLOSE_UNAUTHORIZED)
+            return
+        client = self.scope.get('client') or ['']
+        ip_address = params.get('ip', [''])[0] or client[0]
+        controller = await database_sync_to_async(lambda: get_topology().for_ip(ip_address))()
+        if controller is None:
+            logger.warning(f"Station control link refused: no controller at {ip_address}")
+            await self.close(code=station_link.CLOSE_UNKNOWN_STATION)
+            return
+
+        self.controller = controller
+        url_kwargs = self.scope.get('url_route', {}).get('kwargs', {})
+        self.station_id = url_kwargs.get('station_id') or str(controller.id)
+        self.station_group_name = f'station_{self.station_id}'
+        self.control_group_name = station_link.control_group(controller.id)
+        for group in (self.station_group_name, self.control_group_name):
+            await self.channel_layer.group_add(group, self.channel_name)
+        station_link.mark_connected(controller.id, self.channel_name)
+        logger.info(f"Station control link connected: {controller.name} ({ip_address})")
+
+        await self.send_message({
+            'type': 'config',
+            'config': station_link.station_config(controller, self.uri_builder),
+        })
+
+    async def disconnect(self, close_code):
+        """Drop the station's presence and leave its groups."""
+        for task in self.request_tasks:
+            task.cancel()
+        if self.controller is None:
+            return
+        station_link.mark_disconnected(self.controller.id, self.channel_name)
+        await self.channel_layer.group_discard(self.control_group_name, self.channel_name)
+        await super().disconnect(close_code)
+
+    async def send_message(self, message):
+        await self.send(text_data=json.dumps(message, cls=DjangoJSONEncoder))
+
+    async def receive(self, text_data):
+        """Answer heartbeats and requests; hand anything else to StationConsumer."""
+        if self.controller is None:
+            return
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON received")
+            return
+        message_type = data.get('type')
+        station_link.touch(self.controller.id, self.channel_name)
+
+        if message_type == 'heartbeat':
+            await self.send_message({'type': 'heartbeat_ack', 'server_time': time.time()})
+        elif message_type in STATION_LINK_HANDLERS:
+            task = asyncio.ensure_future(self.answer_request(message_type, data))
+            self.request_tasks.add(task)
+            task.add_done_callback(self.request_tasks.discard)
+        else:
+            await super().receive(text_data)
+
+    async def answer_request(self, message_type, data):
+        body, status_code = await self.handle_request(message_type, data.get('data') or {})
+        await self.send_message({
+            'type': 'response',
+            'id': data.get('id'),
+            'status': status_code,
+            'body': body,
+        })
+
+    async def handle_request(self, message_type, data):
+        """Run a request through the HTTP endpoint's logic; return ``(body, status_code)``."""
+        if not isinstance(data, dict):
+            return {'error': 'data must be an object.'}, 400
+        # The link already says which controller is asking; a station can't speak for another
+        data['controller_ip'] = self.controller.ip_address
+        data['ip_address'] = self.controller.ip_address
+        handler = STATION_LINK_HANDLERS[message_type]
+        try:
+            # Not thread-sensitive: requests must not queue behind each other
+            return await database_sync_to_async(handler, thread_sensitive=False)(data, self.uri_builder)
+        except Exception:
+            logger.exception(f"Station control link {message_type} request failed")
+            return {'error': 'Internal server error.'}, 500
+
+    async def station_push(self, event):
+        """Forward a message from ``station_link.push_to_station``."""
+        await self.send_message(event['message'])
+
+
+class _ScopeUri:
+    """Builds absolute URLs from a websocket scope, like ``request.build_absolute_uri``.
+
+    Lets pushed boards share snapshots (and absolute photo URLs) with HTTP
+    clients of the same host.
+    """
+
+    def __init__(self, scope):
+        headers = dict(scope.get('headers') or [])
+        host = headers.get(b'host', b'').decode('latin1')
+        scheme = 'https' if scope.get('scheme') == 'wss' else 'http'
+        self.base = f'{scheme}://{host}' if host else ''
+
+    def build_absolute_uri(self, location='/'):
+        return self.base + location
+
+
 class LeaderboardConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for live leaderboard updates."""
+    """WebSocket consumer for live leaderboard updates.
+
+    Clients choose a board with ``?filter=active|7days|all`` (or a
+    ``subscribe`` message). On connect they receive the whole board as
+    ``{"type": "leaderboard_update", "epoch", "seq", "leaderboard": [...]}``
+    and after that only ``leaderboard_delta`` messages (see
+    ``accounts.leaderboard.diff_leaderboards``), each with ``base_seq`` and
+    ``seq``. A client that sees a delta whose ``base_seq`` or ``epoch`` does
+    not match what it holds sends ``{"type": "resync"}`` and gets the whole
+    board again.
+
+    Writes only send a ``leaderboard_changed`` notification; notifications
+    within ``COALESCE_SECONDS`` are merged into a single push of the shared
+    snapshot. Boards with live countdowns are also re-sent when their
+    snapshot goes stale, so displays never need to poll.
+    """
+
+    COALESCE_SECONDS = 0.25
     
     async def connect(self):
         """Handle WebSocket connection."""
         self.group_name = 'leaderboard'
+        params = parse_qs(self.scope.get('query_string', b'').decode('latin1'))
+        self.time_filter = params.get('filter', ['all'])[0]
+        self.uri_builder = _ScopeUri(self.scope)
+        self.sent_seq = None
+        self.push_lock = asyncio.Lock()
+        self.refresh_handle = None
+        self.refresh_at = None
+        self.push_tasks = set()  # Timer-started pushes, cancelled on disconnect
         
         # Join leaderboard group
         await self.channel_layer.group_add(
@@ -141,9 +318,15 @@ class LeaderboardConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         logger.info("Leaderboard WebSocket connected")
+        await self.push_leaderboard()
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
+        if self.refresh_handle is not None:
+            self.refresh_handle.cancel()
+            self.refresh_handle = None
+        for task in self.push_tasks:
+            task.cancel()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
@@ -160,10 +343,58 @@ class LeaderboardConsumer(AsyncWebsocketConsumer):
                 await self.send(text_data=json.dumps({
                     'type': 'pong'
                 }))
+            
+            elif message_type == 'subscribe':
+                # Switch boards (e.g. display auto-rotation) without reconnecting
+                self.time_filter = data.get('filter', 'all')
+                self.sent_seq = None
+                await self.push_leaderboard()
+            
+            elif message_type == 'resync':
+                self.sent_seq = None
+                await self.push_leaderboard()
         
         except json.JSONDecodeError:
             logger.error("Invalid JSON received")
     
+    def schedule_refresh(self, delay):
+        """Push the board after ``delay`` seconds unless a push is due sooner."""
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self.refresh_handle is not None:
+            if self.refresh_at <= when:
+                return
+            self.refresh_handle.cancel()
+        self.refresh_at = when
+        self.refresh_handle = loop.call_at(when, self._refresh_due)
+    
+    def _refresh_due(self):
+        self.refresh_handle = None
+        self.refresh_at = None
+        task = asyncio.ensure_future(self.push_leaderboard())
+        self.push_tasks.add(task)
+        task.add_done_callback(self.push_tasks.discard)
+    
+    async def push_leaderboard(self):
+        """Bring the client up to date, with deltas where they are still kept."""
+        async with self.push_lock:
+            snapshot = await database_sync_to_async(get_leaderboard_snapshot)(
+                self.time_filter, self.uri_builder
+            )
+            if snapshot.seq != self.sent_seq:
+                messages = snapshot.deltas_since(self.sent_seq)
+                if messages is None:
+                    messages = [snapshot.message]
+                for message in messages:
+                    await self.send(text_data=message.decode('utf-8'))
+                self.sent_seq = snapshot.seq
+        if snapshot.stale_at:
+            self.schedule_refresh(max(0.0, (snapshot.stale_at - timezone.now()).total_seconds()))
+    
+    async def leaderboard_changed(self, event):
+        """Handle a change notification; see ``notify_leaderboard_changed``."""
+        self.schedule_refresh(self.COALESCE_SECONDS)
+    
     async def leaderboard_update(self, event):
         """Handle leaderboard update event."""
         await self.send(text_data=json.dumps({
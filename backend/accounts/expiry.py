@@ -0,0 +1,119 @@
+"""
+Session expiry engine.
+
+Approved sessions carry an indexed ``expires_at`` deadline. The sweeper
+thread ends every overdue session with a single bulk UPDATE, then sleeps
+until the next deadline (or ``MAX_SLEEP_SECONDS``, whichever is sooner).
+Approving or extending a session wakes it so a shortened deadline is not
+missed. Read endpoints never expire sessions themselves.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Min, Value, When
+from django.utils import timezone
+
+from .leaderboard import leaderboard_changed
+from .models import PendingSignup
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP_SECONDS = 30
+
+
+def expire_overdue_sessions(now=None):
+    """End every approved session whose deadline has passed.
+
+    The session is recorded as ending at its deadline. Sessions that were
+    mid-station get the time played up to the deadline added to
+    ``total_elapsed_seconds``. Returns the number of sessions ended.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        overdue = PendingSignup.objects.filter(status='approved', expires_at__lte=now)
+        # Only the handful of sessions still on a station need per-row
+        # timer accounting; fold it into the same UPDATE with a CASE.
+        playing = overdue.filter(is_playing=True, last_started_at__isnull=False)
+        played_seconds = [
+            When(pk=pk, then=Value(max(0, int((expires_at - started).total_seconds()))))
+            for pk, started, expires_at in playing.values_list('pk', 'last_started_at', 'expires_at')
+        ]
+        changes = {
+            'status': 'ended',
+            'ended_at': F('expires_at'),
+            'is_playing': False,
+            'last_started_at': None,
+        }
+        if played_seconds:
+            changes['total_elapsed_seconds'] = F('total_elapsed_seconds') + Case(
+                *played_seconds, default=Value(0), output_field=IntegerField(),
+            )
+        count = overdue.update(**changes)
+        if count:
+            # QuerySet.update() sends no model signals.
+            transaction.on_commit(leaderboard_changed)
+    if count:
+        logger.info(f"Expired {count} overdue session(s)")
+    return count
+
+
+def seconds_until_next_expiry(now=None):
+    """Return seconds until the earliest approved session deadline, or None."""
+    now = now or timezone.now()
+    next_deadline = (
+        PendingSignup.objects
+        .filter(status='approved', expires_at__isnull=False)
+        .aggregate(next_deadline=Min('expires_at'))['next_deadline']
+    )
+    if next_deadline is None:
+        return None
+    return max(0.0, (next_deadline - now).total_seconds())
+
+
+class SessionExpirySweeper:
+    """Background thread that ends sessions as their deadlines pass."""
+
+    def __init__(self, max_sleep=MAX_SLEEP_SECONDS):
+        self.max_sleep = max_sleep
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='session-expiry-sweeper', daemon=True,
+            )
+            self._thread.start()
+        logger.info("Session expiry sweeper started")
+
+    def wake(self):
+        """Re-check deadlines now (e.g. after a session was approved or changed)."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            timeout = self.max_sleep
+            try:
+                expire_overdue_sessions()
+                remaining = seconds_until_next_expiry()
+                if remaining is not None:
+                    # Land just after the deadline rather than just before it.
+                    timeout = min(self.max_sleep, remaining + 0.05)
+            except Exception:
+                logger.exception("Session expiry sweep failed")
+            finally:
+                close_old_connections()
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+
+sweeper = SessionExpirySweeper()
+
+
+def start_sweeper():
+    """Start the process-wide sweeper (called from the ASGI/WSGI entry points)."""
+    sweeper.start()
@@ -0,0 +1,127 @@
+"""
+Change-only ingestion of station health reports.
+
+Stations report every few seconds, but the display values on the
+``Controller`` row (``cpu_usage = "45%"`` and friends) rarely change in a
+way anyone looking at the dashboard would notice. Each process remembers
+what it last wrote per controller and issues a single UPDATE only when a
+value moved by at least its threshold, the power status changed, or the
+row has not been touched for ``HEARTBEAT`` (so ``updated_at`` keeps
+showing that the station is alive). ``system_uptime`` only goes out with
+another write, or when it went backwards (a reboot).
+
+Every report still becomes a raw sample of the controller's time series
+(``accounts.metrics``); a batch is stored with one INSERT. Controllers are
+resolved through the cached topology, so ingestion needs no controller
+query at all.
+"""
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import parse_health_metrics, record_samples
+from .models import Controller
+
+DISPLAY_FIELDS = (
+    'cpu_usage', 'storage_usage', 'cpu_temperature',
+    'ram_usage', 'system_uptime', 'voltage_power_status',
+)
+
+# Display field -> (parsed metric, minimum change worth a write)
+THRESHOLDS = {
+    'cpu_usage': ('cpu_percent', 5.0),
+    'ram_usage': ('ram_percent', 2.0),
+    'storage_usage': ('disk_percent', 1.0),
+    'cpu_temperature': ('temperature', 2.0),
+}
+
+HEARTBEAT = timedelta(minutes=5)
+MAX_BATCH_SAMPLES = 100
+
+
+def _significant(field, old, new):
+    """Return whether replacing display value ``old`` with ``new`` is worth a write."""
+    if old is None:
+        return True
+    if old == new:
+        return False
+    if field in THRESHOLDS:
+        metric, threshold = THRESHOLDS[field]
+        old_value = parse_health_metrics({field: old})[metric]
+        new_value = parse_health_metrics({field: new})[metric]
+        if old_value is not None and new_value is not None:
+            return abs(new_value - old_value) >= threshold
+    return True
+
+
+def _rebooted(old_uptime, new_uptime):
+    if old_uptime is None:
+        return True
+    old_seconds = parse_health_metrics({'system_uptime': old_uptime})['uptime_seconds']
+    new_seconds = parse_health_metrics({'system_uptime': new_uptime})['uptime_seconds']
+    return old_seconds is not None and new_seconds is not None and new_seconds < old_seconds
+
+
+class HealthBaselines:
+    """Per-process memory of the display values last written per controller."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (controller id, created_at) -> (values dict, written_at); created_at
+        # tells a re-created controller apart from one that reused its id.
+        self._written = {}
+
+    def clear(self):
+        with self._lock:
+            self._written.clear()
+
+    def apply(self, controller, report, now):
+        """Write the fields of ``report`` that changed enough; return their names."""
+        values = {
+            field: str(report[field]) for field in DISPLAY_FIELDS if report.get(field) is not None
+        }
+        key = (controller.id, controller.created_at)
+        with self._lock:
+            written, written_at = self._written.get(key, ({}, None))
+            if written_at is None or now - written_at >= HEARTBEAT:
+                changed = values
+            else:
+                changed = {
+                    field: value for field, value in values.items()
+                    if field != 'system_uptime' and _significant(field, written.get(field), value)
+                }
+                # Uptime rides along with any write, or forces one after a reboot.
+                uptime = values.get('system_uptime')
+                if uptime is not None and (changed or _rebooted(written.get('system_uptime'), uptime)):
+                    changed['system_uptime'] = uptime
+            if not changed:
+                return []
+            # QuerySet.update(): no model signals (nothing routing-related changed)
+            Controller.objects.filter(pk=controller.pk).update(**changed, updated_at=now)
+        # Remembered once committed: values from a rolled-back batch must not be skipped later.
+        transaction.on_commit(lambda: self._remember(key, changed, now))
+        return [field for field in DISPLAY_FIELDS if field in changed]
+
+    def _remember(self, key, changed, now):
+        with self._lock:
+            written, _ = self._written.get(key, ({}, None))
+            self._written[key] = ({**written, **changed}, now)
+
+
+baselines = HealthBaselines()
+
+
+def ingest_health(controller, reports, now=None):
+    """Ingest ``(recorded_at, report)`` pairs from one controller.
+
+    Stores every report as a raw time-series sample and applies the
+    newest one to the controller's display values if it changed enough.
+    Returns ``(updated_fields, samples_recorded)``.
+    """
+    now = now or timezone.now()
+    reports = sorted(reports, key=lambda pair: pair[0])
+    recorded = record_samples(controller, reports)
+    updated = baselines.apply(controller, reports[-1][1], now) if reports else []
+    return updated, recorded
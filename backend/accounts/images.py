@@ -0,0 +1,232 @@
+"""
+Resized derivatives of uploaded images.
+
+Team photos, storyline images and staff pictures are uploaded straight
+from phones, often several megabytes each, while the leaderboard and the
+dashboard show them as small circles. After an upload commits, a worker
+pool writes a WebP and a JPEG copy of the image at each of ``SIZES``
+(shortest side, never upscaled, EXIF rotation applied) next to the
+original::
+
+    signups/team.jpg -> signups/derivatives/team_thumb.webp, team_thumb.jpg, ...
+
+Derivative names follow from the original's, so no model field tracks
+them. ``image_sizes()`` gives serializers the URLs once the derivatives
+exist and returns ``{}`` until then, so clients fall back to the original.
+It also queues images uploaded before this pipeline existed, so they
+convert the first time they are served. A lookup that finds no
+derivatives is remembered for ``MISSING_TTL`` seconds, so rebuilding a
+board does not stat every pending photo again. ``on_done`` callbacks run once
+each when the pool next runs out of work, so a backlog of team photos
+rebuilds the leaderboard once rather than once per photo.
+"""
+import io
+import logging
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Name -> shortest side in pixels, smallest first. Clients crop photos into
+# squares, so a size must cover its square on the short side.
+SIZES = {'thumb': 128, 'small': 320, 'medium': 800}
+
+# Format key -> (extension, Pillow format, save options)
+FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Models whose uploads get derivatives -> their image field
+IMAGE_FIELDS = {
+    'PendingSignup': 'profile_photo',
+    'Storyline': 'image',
+    'StaffProfile': 'profile_picture',
+}
+
+# Remember this many originals whose derivatives are known to exist.
+READY_CACHE_SIZE = 10000
+
+# Seconds to trust a lookup that found no derivatives before checking storage
+# again (another process may have written them in the meantime).
+MISSING_TTL = 30.0
+
+# Seconds before an image that failed to convert is tried again, doubling
+# with each failure up to RETRY_BACKOFF_MAX.
+RETRY_BACKOFF = 60.0
+RETRY_BACKOFF_MAX = 3600.0
+
+
+def derivative_name(name, size, fmt):
+    """Storage name of ``name``'s derivative at ``size`` in ``fmt``."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'derivatives', f'{stem}_{size}.{FORMATS[fmt][0]}')
+
+
+def _marker_name(name):
+    # The smallest size is written last: once it exists, every derivative does.
+    return derivative_name(name, list(SIZES)[0], list(FORMATS)[-1])
+
+
+def _encode(image, fmt):
+    _, pillow_format, options = FORMATS[fmt]
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=None):
+    """Write every size and format of image ``name``; return the names written."""
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        largest = max(SIZES.values())
+        # Let the JPEG decoder downscale while loading (much faster for photos).
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+    written = []
+    # Largest first, each size resized from the previous one.
+    for size, pixels in sorted(SIZES.items(), key=lambda item: -item[1]):
+        scale = pixels / min(image.size)
+        if scale < 1:
+            width, height = image.size
+            image = image.resize(
+                (max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.LANCZOS,
+            )
+        for fmt in FORMATS:
+            target = derivative_name(name, size, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            written.append(storage.save(target, ContentFile(_encode(image, fmt))))
+    return written
+
+
+class DerivativePool:
+    """Generates derivatives on a small thread pool, each image once at a time.
+
+    Images that fail to convert are retried after ``RETRY_BACKOFF`` seconds,
+    doubling with each failure. Callbacks given to ``submit`` are collected
+    and called once each whenever the queue drains.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._ready = set()
+        self._missing = {}  # name -> when storage last had no derivatives
+        self._failed = {}  # name -> (failures, when to try again)
+        self._on_drain = set()
+
+    def _get_executor(self):
+        if self._executor is None:
+            workers = self.workers or getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-derivatives')
+        return self._executor
+
+    def submit(self, name, on_done=None):
+        """Queue ``name``; return a Future, or None if it is already queued.
+
+        ``on_done`` runs once the queue drains, even if ``name`` was
+        already queued.
+        """
+        with self._lock:
+            if time.monotonic() < self._failed.get(name, (0, 0.0))[1]:
+                return None
+            if on_done is not None:
+                self._on_drain.add(on_done)
+            if name in self._queued:
+                return None
+            self._queued.add(name)
+            executor = self._get_executor()
+        return executor.submit(self._generate, name)
+
+    def _generate(self, name):
+        try:
+            generate_derivatives(name)
+            self.mark_ready(name)
+        except Exception as e:
+            # Unreadable or vanished upload: keep serving the original.
+            logger.warning(f"Could not create derivatives of {name}: {e}")
+            with self._lock:
+                failures = self._failed.get(name, (0, 0.0))[0] + 1
+                delay = min(RETRY_BACKOFF * 2 ** (failures - 1), RETRY_BACKOFF_MAX)
+                self._failed[name] = (failures, time.monotonic() + delay)
+        finally:
+            with self._lock:
+                self._queued.discard(name)
+                callbacks = set()
+                if not self._queued:
+                    callbacks, self._on_drain = self._on_drain, set()
+            for callback in callbacks:
+                callback()
+
+    def mark_ready(self, name):
+        with self._lock:
+            if len(self._ready) >= READY_CACHE_SIZE:
+                self._ready.clear()
+            self._ready.add(name)
+            self._missing.pop(name, None)
+            self._failed.pop(name, None)
+
+    def is_ready(self, name, storage=None):
+        with self._lock:
+            if name in self._ready:
+                return True
+            checked_at = self._missing.get(name)
+            if checked_at is not None and time.monotonic() - checked_at < MISSING_TTL:
+                return False
+        if (storage or default_storage).exists(_marker_name(name)):
+            self.mark_ready(name)
+            return True
+        with self._lock:
+            if len(self._missing) >= READY_CACHE_SIZE:
+                self._missing.clear()
+            self._missing[name] = time.monotonic()
+        return False
+
+
+derivative_pool = DerivativePool()
+
+
+def schedule_derivatives(name, on_done=None):
+    """Generate derivatives of ``name`` in the background (call after commit)."""
+    return derivative_pool.submit(name, on_done)
+
+
+def image_sizes(field_file, request=None, on_done=None):
+    """Return ``{size: {"webp": url, "jpeg": url}}`` for an image field, or ``{}``.
+
+    Images without derivatives yet are queued for generation; ``on_done``
+    runs once the queue has drained.
+    """
+    if not field_file:
+        return {}
+    name = field_file.name
+    if not derivative_pool.is_ready(name, field_file.storage):
+        schedule_derivatives(name, on_done)
+        return {}
+
+    def url(path):
+        path = field_file.storage.url(path)
+        return request.build_absolute_uri(path) if request else path
+
+    return {
+        size: {fmt: url(derivative_name(name, size, fmt)) for fmt in FORMATS}
+        for size in SIZES
+    }
@@ -0,0 +1,347 @@
+"""
+Leaderboard query, serialization and snapshot helpers.
+
+Shared by the public and admin leaderboard views so that a board of any
+size is built in two queries: one for the sessions (with their storyline
+joined in and the checkpoint count annotated) and one for all of their
+checkpoints. The controller count comes from the cached arena topology.
+
+Built boards are kept as versioned snapshots, one per filter. Writes that
+can change a board bump the shared version (see ``accounts.signals``) and
+the next read rebuilds it; every other read serves the pre-rendered JSON.
+The same writes notify connected displays, which then pull the new
+snapshot over ``ws/leaderboard/`` (see ``LeaderboardConsumer``).
+
+Each rebuilt snapshot also carries a sequence number and the deltas from
+its predecessors, so displays that already hold the previous board only
+receive the rows that changed (see ``diff_leaderboards``).
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Prefetch
+from django.utils import timezone
+
+from .images import image_sizes
+from .models import Checkpoint, PendingSignup
+from .pagination import get_date_range
+from .topology import get_topology
+from .websocket_utils import notify_leaderboard_changed
+
+LEADERBOARD_FILTERS = ('active', '7days', 'all')
+
+# Loads every checkpoint of a session batch (with its controller) in one query.
+CHECKPOINTS_PREFETCH = Prefetch(
+    'checkpoints',
+    queryset=Checkpoint.objects.select_related('controller'),
+)
+
+
+# Sessions in these states are listed on some board.
+BOARD_STATUSES = frozenset({'approved', 'ended'})
+# Session columns a board row is built from (its serialization, ranking,
+# filters and countdown). Saves that change none of them keep the snapshots.
+BOARD_FIELDS = (
+    'party_name', 'email', 'team_size', 'points', 'profile_photo', 'avatar_id', 'storyline_id',
+    'session_minutes', 'status', 'created_at', 'approved_at', 'ended_at', 'leaderboard_hidden',
+)
+
+
+def leaderboard_sessions(time_filter='all', include_hidden=False, now=None):
+    """Return the ranked session queryset for a leaderboard filter.
+
+    Unknown filters fall back to 'all', matching the previous view behaviour.
+    """
+    now = now or timezone.now()
+
+    if time_filter == 'active':
+        sessions = PendingSignup.objects.filter(status='approved')
+    elif time_filter == '7days':
+        sessions = PendingSignup.objects.filter(
+            status__in=['approved', 'ended'],
+            created_at__gte=now - timedelta(days=7),
+        )
+    else:
+        sessions = PendingSignup.objects.filter(status__in=['approved', 'ended'])
+
+    if not include_hidden:
+        sessions = sessions.filter(leaderboard_hidden=False)
+
+    return (
+        sessions
+        .select_related('storyline')
+        .prefetch_related(CHECKPOINTS_PREFETCH)
+        .annotate(checkpoints_cleared=Count('checkpoints'))
+        .order_by('-points', 'created_at', 'id')
+    )
+
+
+def serialize_leaderboard_entry(p, request=None, total_controllers=0):
+    """Serialize one row of a queryset returned by ``leaderboard_sessions``."""
+    photo_url = ''
+    if p.profile_photo:
+        photo_url = request.build_absolute_uri(p.profile_photo.url) if request else p.profile_photo.url
+
+    # Calculate remaining time for live sessions
+    remaining_minutes = 0
+    session_status = p.status
+    if p.status == 'approved':
+        remaining_seconds = p.get_remaining_seconds()
+        if remaining_seconds > 0:
+            remaining_minutes = remaining_seconds // 60
+            session_status = 'live'
+        else:
+            session_status = 'ended'
+
+    return {
+        'id': p.id,
+        'name': p.party_name,
+        'email': p.email,
+        'team_size': p.team_size,
+        'points': p.points,
+        'profile_photo': photo_url,
+        'profile_photo_sizes': image_sizes(p.profile_photo, request, on_done=leaderboard_changed),
+        'avatar_id': p.avatar_id,
+        'storyline_title': p.storyline.title if p.storyline else '',
+        'session_minutes': p.session_minutes,
+        'remaining_minutes': remaining_minutes,
+        'session_status': session_status,
+        'checkpoints_cleared': p.checkpoints_cleared,
+        'total_controllers': total_controllers,
+        'checkpoints': [
+            {
+                'controller_id': cp.controller.id,
+                'controller_name': cp.controller.name,
+                'cleared_at': cp.cleared_at.isoformat(),
+            }
+            for cp in p.checkpoints.all()
+        ],
+        'created_at': p.created_at.isoformat() if p.created_at else '',
+        'approved_at': p.approved_at.isoformat() if p.approved_at else '',
+    }
+
+
+def _next_change(p, time_filter, now):
+    """Return when a row's clock-driven fields change without any write.
+
+    Live rows count down ``remaining_minutes`` and eventually flip to
+    'ended'; rows on the 7-day board drop off a week after creation.
+    """
+    changes = []
+    if p.status == 'approved':
+        remaining_seconds = p.get_remaining_seconds()
+        if remaining_seconds > 0:
+            changes.append(now + timedelta(seconds=remaining_seconds % 60 + 1))
+    if time_filter == '7days' and p.created_at:
+        changes.append(p.created_at + timedelta(days=7))
+    return min(changes) if changes else None
+
+
+def build_leaderboard(time_filter='all', request=None, include_hidden=False, now=None):
+    """Return the serialized leaderboard for a filter and when it goes stale.
+
+    The second value is the earliest moment the board changes on its own
+    (see ``_next_change``), or None if it only changes through writes.
+    """
+    now = now or timezone.now()
+    total_controllers = get_topology().count
+    sessions = leaderboard_sessions(time_filter, include_hidden=include_hidden, now=now)
+    result = []
+    stale_at = None
+    for p in sessions:
+        entry = serialize_leaderboard_entry(p, request, total_controllers)
+        if include_hidden:
+            entry['leaderboard_hidden'] = p.leaderboard_hidden
+        result.append(entry)
+        change = _next_change(p, time_filter, now)
+        if change and (stale_at is None or change < stale_at):
+            stale_at = change
+    return result, stale_at
+
+
+def leaderboard_sort_key(entry):
+    """Position of a serialized entry on the board (rank order, then id)."""
+    return (-entry['points'], entry['created_at'], entry['id'])
+
+
+def filter_leaderboard_entries(entries, request):
+    """Apply the list filters (see ``accounts.pagination``) to built entries.
+
+    ``q`` matches the team name, ``status`` the reported session status
+    ('live' or 'ended') and the date range the signup time.
+    """
+    params = request.query_params
+    name = params.get('q', '').strip().lower()
+    if name:
+        entries = [e for e in entries if name in e['name'].lower()]
+    if params.get('status'):
+        entries = [e for e in entries if e['session_status'] == params['status']]
+    start, end = get_date_range(request)
+    if start or end:
+        def in_range(entry):
+            created = datetime.fromisoformat(entry['created_at']) if entry['created_at'] else None
+            return created is not None and (not start or created >= start) and (not end or created < end)
+        entries = [e for e in entries if in_range(e)]
+    return entries
+
+
+# ── Snapshots ──
+
+VERSION_CACHE_KEY = 'leaderboard:version'
+
+_snapshots = {}
+_build_lock = threading.Lock()
+
+
+def leaderboard_version():
+    """Return the shared leaderboard data version."""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # Seed from the clock so a restarted or evicted counter never
+        # repeats a version that an old snapshot was built against.
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_leaderboard():
+    """Mark every leaderboard snapshot as outdated."""
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+
+
+def leaderboard_changed():
+    """Outdate the snapshots and push the change to connected displays.
+
+    Call it after the write has committed (``transaction.on_commit``).
+    """
+    invalidate_leaderboard()
+    notify_leaderboard_changed()
+
+
+# ── Deltas ──
+
+# Identifies this process's sequence numbering; clients resync when it changes.
+FEED_EPOCH = time.time_ns()
+# Deltas kept per board for clients that missed a few updates.
+DELTA_HISTORY = 32
+
+
+def _to_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def diff_leaderboards(old_entries, new_entries):
+    """Return the changes that turn one serialized board into another.
+
+    ``changed`` and ``inserted`` hold full rows, ``removed`` the ids that
+    left the board and ``moves`` the 1-based rank changes of changed rows.
+    Rows pushed down by someone else's move are not listed: clients
+    re-sort by ``leaderboard_sort_key`` after applying a delta.
+    """
+    old_rows = {e['id']: (rank, e) for rank, e in enumerate(old_entries, 1)}
+    new_ids = set()
+    changed, inserted, moves = [], [], []
+    for rank, entry in enumerate(new_entries, 1):
+        new_ids.add(entry['id'])
+        previous = old_rows.get(entry['id'])
+        if previous is None:
+            inserted.append(entry)
+            continue
+        old_rank, old_entry = previous
+        if entry != old_entry:
+            changed.append(entry)
+            if rank != old_rank:
+                moves.append({'id': entry['id'], 'from': old_rank, 'to': rank})
+    removed = [pk for pk in old_rows if pk not in new_ids]
+    return {'changed': changed, 'inserted': inserted, 'removed': removed, 'moves': moves}
+
+
+class LeaderboardSnapshot:
+    """A built leaderboard for one filter, with its rendered JSON body.
+
+    ``seq`` increases by one whenever the board's content changes;
+    ``history`` holds the rendered delta messages for the latest changes.
+    """
+
+    def __init__(self, time_filter, version, entries, stale_at, previous=None):
+        self.time_filter = time_filter
+        self.version = version
+        self.entries = entries
+        self.stale_at = stale_at
+        self.built_at = timezone.now()
+        self.body = _to_json(entries)
+        self.etag = hashlib.md5(self.body).hexdigest()
+        self._message = None
+
+        self.seq, self.history = 1, ()
+        if previous is not None and previous.etag == self.etag:
+            self.seq, self.history = previous.seq, previous.history
+        elif previous is not None:
+            self.seq = previous.seq + 1
+            delta = diff_leaderboards(previous.entries, entries)
+            delta.update(type='leaderboard_delta', filter=time_filter, epoch=FEED_EPOCH,
+                         base_seq=previous.seq, seq=self.seq)
+            self.history = (previous.history + ((self.seq, _to_json(delta)),))[-DELTA_HISTORY:]
+
+    def is_current(self, version, now=None):
+        if self.version != version:
+            return False
+        return self.stale_at is None or (now or timezone.now()) < self.stale_at
+
+    @property
+    def message(self):
+        """The full board as a ``leaderboard_update`` websocket message."""
+        if self._message is None:
+            header = _to_json({
+                'type': 'leaderboard_update', 'filter': self.time_filter,
+                'epoch': FEED_EPOCH, 'seq': self.seq,
+            })
+            # Splice in the pre-rendered body instead of re-encoding the board.
+            self._message = header[:-1] + b',"leaderboard":' + self.body + b'}'
+        return self._message
+
+    def deltas_since(self, seq):
+        """Return the delta messages that bring a client at ``seq`` up to date.
+
+        Returns None if they are no longer all kept; send ``message`` instead.
+        """
+        if seq is None or seq > self.seq:
+            return None
+        deltas = [body for delta_seq, body in self.history if delta_seq > seq]
+        if len(deltas) != self.seq - seq:
+            return None
+        return deltas
+
+
+def get_leaderboard_snapshot(time_filter='all', request=None, include_hidden=False):
+    """Return an up-to-date snapshot, rebuilding it only when outdated.
+
+    Snapshots are keyed by the request's base URL as well, since profile
+    photo URLs are absolute.
+    """
+    if time_filter not in LEADERBOARD_FILTERS:
+        time_filter = 'all'
+    base_url = request.build_absolute_uri('/') if request else ''
+    key = (time_filter, include_hidden, base_url)
+
+    version = leaderboard_version()
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot.is_current(version):
+        return snapshot
+
+    with _build_lock:
+        # Another thread may have rebuilt it while we waited for the lock.
+        snapshot = _snapshots.get(key)
+        if snapshot is not None and snapshot.is_current(version):
+            return snapshot
+        entries, stale_at = build_leaderboard(time_filter, request, include_hidden)
+        snapshot = LeaderboardSnapshot(time_filter, version, entries, stale_at, previous=snapshot)
+        _snapshots[key] = snapshot
+    return snapshot
@@ -0,0 +1,330 @@
+"""
+Controller health time series.
+
+Every station health report becomes a raw ``ControllerMetricSample`` with
+typed numeric fields. Raw samples are rolled up into 1-minute buckets and
+those into 1-hour buckets, and each resolution is pruned after its own
+retention period, so the table stays small however long stations report:
+about a day of 15-second samples, two weeks of minutes and a year of hours.
+
+Rollups are recomputed for the last few buckets on every pass (an upsert
+on the bucket's unique key), so a report that arrives a little late, such
+as a station's journal replaying after a short outage, still lands in its
+bucket. ``maybe_maintain_metrics()`` runs the rollup and pruning at most
+once per ``MAINTENANCE_INTERVAL`` per process; ingestion calls it after
+commit.
+
+``metric_series()`` serves charts: it picks the finest resolution that
+fits the requested range in ``MAX_POINTS`` and returns aligned arrays (one
+timestamp list and one value list per metric), with ``None`` for buckets
+without samples. Ranges are clipped to the data that can exist (the hourly
+retention up to now), and an explicitly requested resolution that would
+need more than ``MAX_POINTS`` buckets is refused.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Max, Sum, When
+from django.db.models.functions import NullIf, TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import ControllerMetricSample
+
+RAW = ControllerMetricSample.RESOLUTION_RAW
+MINUTE = ControllerMetricSample.RESOLUTION_MINUTE
+HOUR = ControllerMetricSample.RESOLUTION_HOUR
+
+RESOLUTION_NAMES = {RAW: 'raw', MINUTE: 'minute', HOUR: 'hour'}
+
+RETENTION = {
+    RAW: timedelta(hours=36),
+    MINUTE: timedelta(days=14),
+    HOUR: timedelta(days=400),
+}
+
+# Each rollup resolution is built from the next finer one.
+ROLLUP_SOURCE = {MINUTE: RAW, HOUR: MINUTE}
+ROLLUP_TRUNC = {MINUTE: TruncMinute, HOUR: TruncHour}
+# Closed buckets recomputed on every pass to pick up late samples.
+REBUILD_BUCKETS = 2
+
+MAINTENANCE_INTERVAL = 60.0
+
+# Numeric metrics averaged by rollups; uptime and throttling take the max.
+AVERAGED_FIELDS = ('cpu_percent', 'ram_percent', 'disk_percent', 'temperature')
+METRIC_FIELDS = AVERAGED_FIELDS + ('uptime_seconds', 'throttled')
+
+# Stations report about every 15 seconds; used to size raw queries.
+RAW_INTERVAL_ESTIMATE = 15
+MAX_POINTS = 1500
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_UPTIME_PART = re.compile(r'(\d+)\s*([dhms])')
+_UPTIME_UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+
+def _leading_number(value):
+    """Return the first number in a display string such as ``"62% (512MB / 1024MB)"``."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value or ''))
+    return float(match.group()) if match else None
+
+
+def _uptime_seconds(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return max(0, int(value))
+    parts = _UPTIME_PART.findall(str(value or ''))
+    if not parts:
+        return None
+    return sum(int(amount) * _UPTIME_UNITS[unit] for amount, unit in parts)
+
+
+def _throttled(value):
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    if text.startswith('ok'):
+        return False
+    return True
+
+
+def parse_health_metrics(data):
+    """Return typed metric values from a station health report.
+
+    Numeric fields (``cpu_percent``, ``ram_percent``, ``disk_percent``,
+    ``temperature``, ``uptime_seconds``, ``throttled``) are used when the
+    station sends them; otherwise the display strings (``cpu_usage``,
+    ``ram_usage``, ...) are parsed. Metrics that are missing or unreadable
+    are None.
+    """
+    def pick(numeric_key, display_key, parse):
+        value = data.get(numeric_key)
+        if value is None:
+            value = data.get(display_key)
+        return parse(value) if value is not None else None
+
+    return {
+        'cpu_percent': pick('cpu_percent', 'cpu_usage', _leading_number),
+        'ram_percent': pick('ram_percent', 'ram_usage', _leading_number),
+        'disk_percent': pick('disk_percent', 'storage_usage', _leading_number),
+        'temperature': pick('temperature', 'cpu_temperature', _leading_number),
+        'uptime_seconds': pick('uptime_seconds', 'system_uptime', _uptime_seconds),
+        'throttled': pick('throttled', 'voltage_power_status', _throttled),
+    }
+
+
+def record_samples(controller, reports):
+    """Store raw samples for ``(recorded_at, report)`` pairs in one INSERT.
+
+    Reports without any readable metric are skipped. Returns the number
+    of samples stored.
+    """
+    samples = []
+    for recorded_at, data in reports:
+        values = parse_health_metrics(data)
+        if all(value is None for value in values.values()):
+            continue
+        samples.append(ControllerMetricSample(
+            controller=controller, resolution=RAW, recorded_at=recorded_at, **values,
+        ))
+    # A duplicate timestamp for the same controller is the same report.
+    ControllerMetricSample.objects.bulk_create(samples, ignore_conflicts=True)
+    return len(samples)
+
+
+def _floor(moment, seconds):
+    """Return the start of the ``seconds``-wide UTC bucket containing ``moment``."""
+    epoch = moment.timestamp()
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def _weighted_avg(field):
+    """Average ``field`` over source rows, weighting each by its ``sample_count``.
+
+    Raw samples weigh one each; a minute bucket weighs as many samples as it
+    holds, so an hour built from minutes matches the average of its samples.
+    Rows without a value for ``field`` add nothing to either side.
+    """
+    weight = Case(When(**{f'{field}__isnull': False}, then=F('sample_count')), output_field=FloatField())
+    weighted = ExpressionWrapper(F(field) * F('sample_count'), output_field=FloatField())
+    return Sum(weighted) / NullIf(Sum(weight), 0.0)
+
+
+def rollup(resolution, now=None):
+    """Build (or rebuild) the closed ``resolution`` buckets; return how many were written."""
+    now = now or timezone.now()
+    step = timedelta(seconds=resolution)
+    until = _floor(now, resolution)
+    since = until - step * REBUILD_BUCKETS
+    last = (
+        ControllerMetricSample.objects
+        .filter(resolution=resolution)
+        .aggregate(last=Max('recorded_at'))['last']
+    )
+    source = ControllerMetricSample.objects.filter(
+        resolution=ROLLUP_SOURCE[resolution], recorded_at__lt=until,
+    )
+    if last is not None:
+        # Catch up from the last built bucket after a pause.
+        source = source.filter(recorded_at__gte=min(since, last + step))
+
+    rows = (
+        source
+        .annotate(bucket=ROLLUP_TRUNC[resolution]('recorded_at', tzinfo=dt_timezone.utc))
+        .values('controller_id', 'bucket')
+        .annotate(
+            total=Sum('sample_count'),
+            avg_cpu=_weighted_avg('cpu_percent'),
+            avg_ram=_weighted_avg('ram_percent'),
+            avg_disk=_weighted_avg('disk_percent'),
+            avg_temperature=_weighted_avg('temperature'),
+            max_uptime=Max('uptime_seconds'),
+            any_throttled=Max('throttled'),
+        )
+        .order_by()
+    )
+    buckets = [
+        ControllerMetricSample(
+            controller_id=row['controller_id'],
+            resolution=resolution,
+            recorded_at=row['bucket'],
+            sample_count=row['total'] or 0,
+            cpu_percent=row['avg_cpu'],
+            ram_percent=row['avg_ram'],
+            disk_percent=row['avg_disk'],
+            temperature=row['avg_temperature'],
+            uptime_seconds=row['max_uptime'],
+            throttled=None if row['any_throttled'] is None else bool(row['any_throttled']),
+        )
+        for row in rows
+    ]
+    if buckets:
+        ControllerMetricSample.objects.bulk_create(
+            buckets,
+            update_conflicts=True,
+            unique_fields=['controller', 'resolution', 'recorded_at'],
+            update_fields=['sample_count', *METRIC_FIELDS],
+        )
+    return len(buckets)
+
+
+def prune_metrics(now=None):
+    """Delete samples older than their resolution's retention; return the count."""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, retention in RETENTION.items():
+        deleted += ControllerMetricSample.objects.filter(
+            resolution=resolution, recorded_at__lt=now - retention,
+        ).delete()[0]
+    return deleted
+
+
+def maintain_metrics(now=None):
+    """Roll up finished buckets (finest first), then apply retention."""
+    now = now or timezone.now()
+    rollup(MINUTE, now)
+    rollup(HOUR, now)
+    prune_metrics(now)
+
+
+_maintenance_lock = threading.Lock()
+_last_maintenance = 0.0
+
+
+def maybe_maintain_metrics():
+    """Run ``maintain_metrics`` if this process has not in the last interval."""
+    global _last_maintenance
+    if time.monotonic() - _last_maintenance < MAINTENANCE_INTERVAL:
+        return False
+    if not _maintenance_lock.acquire(blocking=False):
+        return False  # Another thread is on it
+    try:
+        _last_maintenance = time.monotonic()
+        maintain_metrics()
+    finally:
+        _maintenance_lock.release()
+    return True
+
+
+def clamp_range(since, until, now=None):
+    """Clip ``since``/``until`` to the span any resolution still holds (ends at now)."""
+    now = now or timezone.now()
+    return max(since, now - RETENTION[HOUR]), min(until, now)
+
+
+def _point_count(since, until, resolution):
+    return (until - since).total_seconds() / (resolution or RAW_INTERVAL_ESTIMATE)
+
+
+def choose_resolution(since, until, now=None):
+    """Return the finest resolution that still holds ``since`` and fits ``MAX_POINTS``."""
+    now = now or timezone.now()
+    for resolution in (RAW, MINUTE):
+        if since >= now - RETENTION[resolution] and _point_count(since, until, resolution) <= MAX_POINTS:
+            return resolution
+    return HOUR
+
+
+def metric_series(controller, since, until, resolution=None, fields=METRIC_FIELDS):
+    """Return a controller's metrics between ``since`` and ``until`` as aligned arrays.
+
+    Rollup resolutions return one entry per bucket, with None where no
+    samples were recorded; raw returns one entry per sample. Timestamps
+    are Unix seconds (bucket starts for rollups). The range is clipped
+    with ``clamp_range()``; raises ValueError if ``resolution`` is given
+    and the range needs more than ``MAX_POINTS`` entries at it.
+    """
+    since, until = clamp_range(since, until)
+    if since >= until:
+        raise ValueError('No metrics are kept for that range.')
+    if resolution is None:
+        resolution = choose_resolution(since, until)
+    elif _point_count(since, until, resolution) > MAX_POINTS:
+        raise ValueError(
+            f'Range too long for {RESOLUTION_NAMES[resolution]} resolution '
+            f'(at most {MAX_POINTS} points); use a coarser resolution.'
+        )
+    if resolution != RAW:
+        since = _floor(since, resolution)
+
+    rows = (
+        ControllerMetricSample.objects
+        .filter(controller=controller, resolution=resolution,
+                recorded_at__gte=since, recorded_at__lt=until)
+        .order_by('recorded_at')
+        .values_list('recorded_at', 'sample_count', *fields)
+    )
+
+    if resolution == RAW:
+        timestamps = [int(row[0].timestamp()) for row in rows]
+        counts = [row[1] for row in rows]
+        columns = [[row[i + 2] for row in rows] for i in range(len(fields))]
+    else:
+        by_bucket = {int(row[0].timestamp()): row for row in rows}
+        start, end = int(since.timestamp()), until.timestamp()
+        timestamps = list(range(start, int(end) + (0 if end.is_integer() else 1), resolution))
+        empty = (None, None) + (None,) * len(fields)
+        filled = [by_bucket.get(ts, empty) for ts in timestamps]
+        counts = [row[1] or 0 for row in filled]
+        columns = [[row[i + 2] for row in filled] for i in range(len(fields))]
+
+    return {
+        'controller_id': controller.id,
+        'resolution': RESOLUTION_NAMES[resolution],
+        'interval': resolution or None,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'timestamps': timestamps,
+        'sample_count': counts,
+        'series': {
+            field: [round(v, 2) if isinstance(v, float) else v for v in column]
+            for field, column in zip(fields, columns)
+        },
+    }
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_pendingsignup_leaderboard_hidden'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='controller',
+            name='ip_address',
+            field=models.GenericIPAddressField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='checkpoint',
+            index=models.Index(fields=['controller', '-cleared_at'], name='checkpoint_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsignup',
+            index=models.Index(fields=['rfid_tag', 'status'], name='signup_rfid_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsignup',
+            index=models.Index(fields=['status', '-points', 'created_at'], name='signup_leaderboard_idx'),
+        ),
+    ]
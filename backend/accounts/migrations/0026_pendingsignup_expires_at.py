@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    PendingSignup = apps.get_model('accounts', 'PendingSignup')
+    sessions = PendingSignup.objects.filter(approved_at__isnull=False)
+    for p in sessions.only('id', 'approved_at', 'session_minutes').iterator():
+        p.expires_at = p.approved_at + timedelta(minutes=p.session_minutes)
+        p.save(update_fields=['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_rfid_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingsignup',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Deadline derived from approved_at + session_minutes (used by the expiry sweeper)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pendingsignup',
+            index=models.Index(fields=['status', 'expires_at'], name='signup_expiry_idx'),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_pendingsignup_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationEventReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('event_type', models.CharField(max_length=20)),
+                ('controller_ip', models.CharField(blank=True, default='', max_length=45)),
+                ('occurred_at', models.DateTimeField(help_text='When the event happened on the station (corrected for clock offset)')),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('response', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Station Event Receipt',
+                'verbose_name_plural': 'Station Event Receipts',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_station_event_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControllerMetricSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(0, 'Raw'), (60, '1 minute'), (3600, '1 hour')], default=0, help_text='Bucket size in seconds (0 for raw samples)')),
+                ('recorded_at', models.DateTimeField(help_text='Sample time, or the start of the bucket')),
+                ('sample_count', models.PositiveIntegerField(default=1)),
+                ('cpu_percent', models.FloatField(blank=True, null=True)),
+                ('ram_percent', models.FloatField(blank=True, null=True)),
+                ('disk_percent', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, help_text='CPU temperature in °C', null=True)),
+                ('uptime_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('throttled', models.BooleanField(blank=True, null=True)),
+                ('controller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_samples', to='accounts.controller')),
+            ],
+            options={
+                'verbose_name': 'Controller Metric Sample',
+                'verbose_name_plural': 'Controller Metric Samples',
+                'ordering': ['recorded_at'],
+                'indexes': [models.Index(fields=['resolution', 'recorded_at'], name='metric_resolution_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('controller', 'resolution', 'recorded_at'), name='unique_controller_metric_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Full-text index over AuditLog.description and .metadata (SQLite FTS5,
+# external content: the index stores tokens only, rows stay in the table).
+FTS_SQL = [
+    """CREATE VIRTUAL TABLE accounts_auditlog_fts USING fts5(
+        description, metadata,
+        content='accounts_auditlog', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER accounts_auditlog_fts_insert AFTER INSERT ON accounts_auditlog BEGIN
+        INSERT INTO accounts_auditlog_fts(rowid, description, metadata)
+        VALUES (new.id, new.description, new.metadata);
+    END""",
+    """CREATE TRIGGER accounts_auditlog_fts_delete AFTER DELETE ON accounts_auditlog BEGIN
+        INSERT INTO accounts_auditlog_fts(accounts_auditlog_fts, rowid, description, metadata)
+        VALUES ('delete', old.id, old.description, old.metadata);
+    END""",
+    """CREATE TRIGGER accounts_auditlog_fts_update AFTER UPDATE OF description, metadata ON accounts_auditlog BEGIN
+        INSERT INTO accounts_auditlog_fts(accounts_auditlog_fts, rowid, description, metadata)
+        VALUES ('delete', old.id, old.description, old.metadata);
+        INSERT INTO accounts_auditlog_fts(rowid, description, metadata)
+        VALUES (new.id, new.description, new.metadata);
+    END""",
+    "INSERT INTO accounts_auditlog_fts(accounts_auditlog_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    'DROP TRIGGER IF EXISTS accounts_auditlog_fts_insert',
+    'DROP TRIGGER IF EXISTS accounts_auditlog_fts_delete',
+    'DROP TRIGGER IF EXISTS accounts_auditlog_fts_update',
+    'DROP TABLE IF EXISTS accounts_auditlog_fts',
+]
+
+
+def _run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # Other databases fall back to a LIKE scan (see accounts.audit.search_audit_log).
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0028_controller_metric_samples'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at', 'id'], name='audit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', 'created_at', 'id'], name='audit_action_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='audit_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['target_type', 'target_id', 'created_at', 'id'], name='audit_target_idx'),
+        ),
+        migrations.RunPython(_run_on_sqlite(FTS_SQL), _run_on_sqlite(DROP_FTS_SQL)),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_audit_log_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pendingsignup',
+            index=models.Index(condition=models.Q(('receive_offers', True)), fields=['-created_at', '-id'], name='signup_subscriber_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_signup_subscriber_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkpoint',
+            name='cleared_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -192,6 +194,10 @@ class PendingSignup(models.Model):
         null=True, blank=True,
         help_text='When the session was fully ended',
     )
+    expires_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text='Deadline derived from approved_at + session_minutes (used by the expiry sweeper)',
+    )
     current_controller_index = models.PositiveIntegerField(
         default=0,
         help_text='Index of the current controller station the player is at (0-based)',
@@ -203,9 +209,36 @@ class PendingSignup(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # RFID scans look up the session by tag + status
+            models.Index(fields=['rfid_tag', 'status'], name='signup_rfid_status_idx'),
+            # Leaderboard ranking: filter by status, order by -points, created_at
+            models.Index(fields=['status', '-points', 'created_at'], name='signup_leaderboard_idx'),
+            # Expiry sweeper: approved sessions whose deadline has passed
+            models.Index(fields=['status', 'expires_at'], name='signup_expiry_idx'),
+            # Subscriber list and CSV export stream opted-in signups newest first
+            models.Index(
+                fields=['-created_at', '-id'], name='signup_subscriber_idx',
+                condition=models.Q(receive_offers=True),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.party_name} ({self.status})'
+
+    def save(self, *args, **kwargs):
+        # keep the indexed deadline in step with the fields it derives from
+        self.expires_at = self.compute_expires_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'approved_at', 'session_minutes'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'expires_at'}
+        super().save(*args, **kwargs)
+
+    def compute_expires_at(self):
+        """Return when the session countdown runs out, or None if not approved yet."""
+        if not self.approved_at:
+            return None
+        return self.approved_at + timedelta(minutes=self.session_minutes)
     
     def get_elapsed_seconds(self):
         """Calculate total session elapsed time in seconds.
@@ -231,7 +264,7 @@ class PendingSignup(models.Model):
 
 class Controller(models.Model):
     name = models.CharField(max_length=255)
-    ip_address = models.GenericIPAddressField()
+    ip_address = models.GenericIPAddressField(db_index=True)
     station_host = models.CharField(
         max_length=255, blank=True, default='',
         help_text='Station hardware WebSocket host (defaults to ip_address if empty)',
@@ -280,7 +313,8 @@ class Checkpoint(models.Model):
     controller = models.ForeignKey(
         Controller, on_delete=models.CASCADE, related_name='checkpoints'
     )
-    cleared_at = models.DateTimeField(auto_now_add=True)
+    # Set explicitly when a journaled scan is replayed after the fact
+    cleared_at = models.DateTimeField(default=timezone.now)
     elapsed_seconds = models.PositiveIntegerField(
         default=0,
         help_text='Time in seconds taken to complete this station',
@@ -293,6 +327,10 @@ class Checkpoint(models.Model):
     class Meta:
         ordering = ['cleared_at']
         unique_together = [('session', 'controller')]
+        indexes = [
+            # Station "recent scans": filter by controller, newest first
+            models.Index(fields=['controller', '-cleared_at'], name='checkpoint_recent_idx'),
+        ]
 
     def __str__(self):
         return f'{self.session.party_name} @ {self.controller.name}'
@@ -374,8 +412,91 @@ class AuditLog(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Audit Log'
         verbose_name_plural = 'Audit Logs'
+        indexes = [
+            # Keyset pagination walks (created_at, id); each filter has its own prefix.
+            models.Index(fields=['created_at', 'id'], name='audit_created_idx'),
+            models.Index(fields=['action', 'created_at', 'id'], name='audit_action_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='audit_user_idx'),
+            models.Index(fields=['target_type', 'target_id', 'created_at', 'id'], name='audit_target_idx'),
+        ]
 
     def __str__(self):
         username = self.user.username if self.user else 'System'
         return f'{username} - {self.get_action_display()} - {self.created_at}'
 
+
+
+class StationEventReceipt(models.Model):
+    """Outcome of a journaled station event, keyed by its idempotency key.
+
+    Stations replay their offline journal until the backend acknowledges
+    each event; a replayed key gets the stored response instead of being
+    applied twice.
+    """
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    event_type = models.CharField(max_length=20)
+    controller_ip = models.CharField(max_length=45, blank=True, default='')
+    occurred_at = models.DateTimeField(
+        help_text='When the event happened on the station (corrected for clock offset)',
+    )
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Station Event Receipt'
+        verbose_name_plural = 'Station Event Receipts'
+
+    def __str__(self):
+        return f'{self.event_type} {self.idempotency_key} ({self.status_code})'
+
+
+class ControllerMetricSample(models.Model):
+    """One point of a controller's health time series.
+
+    Raw samples are recorded from station health reports and rolled up
+    into 1-minute and 1-hour averages (``accounts.metrics``); each
+    resolution is kept for its own retention period.
+    """
+    RESOLUTION_RAW = 0
+    RESOLUTION_MINUTE = 60
+    RESOLUTION_HOUR = 3600
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_RAW, 'Raw'),
+        (RESOLUTION_MINUTE, '1 minute'),
+        (RESOLUTION_HOUR, '1 hour'),
+    ]
+
+    controller = models.ForeignKey(
+        Controller, on_delete=models.CASCADE, related_name='metric_samples'
+    )
+    resolution = models.PositiveIntegerField(
+        choices=RESOLUTION_CHOICES, default=RESOLUTION_RAW,
+        help_text='Bucket size in seconds (0 for raw samples)',
+    )
+    recorded_at = models.DateTimeField(help_text='Sample time, or the start of the bucket')
+    sample_count = models.PositiveIntegerField(default=1)
+    cpu_percent = models.FloatField(null=True, blank=True)
+    ram_percent = models.FloatField(null=True, blank=True)
+    disk_percent = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True, help_text='CPU temperature in °C')
+    uptime_seconds = models.PositiveIntegerField(null=True, blank=True)
+    throttled = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['recorded_at']
+        verbose_name = 'Controller Metric Sample'
+        verbose_name_plural = 'Controller Metric Samples'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['controller', 'resolution', 'recorded_at'],
+                name='unique_controller_metric_bucket',
+            ),
+        ]
+        indexes = [
+            # Retention deletes by resolution and age across all controllers.
+            models.Index(fields=['resolution', 'recorded_at'], name='metric_resolution_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.controller_id} @ {self.recorded_at} ({self.get_resolution_display()})'
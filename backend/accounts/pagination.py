@@ -0,0 +1,185 @@
+"""
+Keyset (cursor) pagination and list filters for dashboard endpoints.
+
+List endpoints stay backwards compatible: without ``page_size`` or
+``cursor`` they return a plain JSON list as before. With either parameter
+they return one page::
+
+    {"results": [...], "next_cursor": "<opaque token or null>"}
+
+A page is selected with a keyset condition on the list's sort columns
+(always ending with ``id`` as a tie-breaker), so every page costs the same
+regardless of how deep it is and rows written between requests never shift
+later pages. Cursors are opaque to clients: URL-safe base64 of the sort
+values of the last row returned.
+
+Filters shared by the list endpoints:
+
+* ``q`` — case-insensitive match on the team name
+* ``date_from`` / ``date_to`` — ISO date or datetime bounds on the list's
+  main timestamp; a plain ``date_to`` includes that whole day
+* ``status`` — exact match on the status each endpoint reports
+"""
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Query parameters that select a subset of a list endpoint's rows.
+LIST_PARAMS = ('page_size', 'cursor', 'q', 'status', 'date_from', 'date_to')
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for malformed pagination or filter parameters."""
+
+
+def has_list_params(request):
+    """Return True if the request filters or paginates the list."""
+    return any(name in request.query_params for name in LIST_PARAMS)
+
+
+def is_paginated(request):
+    """Return True if the client asked for a single page."""
+    params = request.query_params
+    return 'page_size' in params or 'cursor' in params
+
+
+def get_page_size(request):
+    raw = request.query_params.get('page_size', '')
+    if not raw:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(raw)
+    except ValueError:
+        raise InvalidPageRequest('page_size must be an integer.')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Return the sort values stored in a cursor token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest('Invalid cursor.')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidPageRequest('Invalid cursor.')
+    return values
+
+
+def _parse_bound(raw, end_of_day):
+    value = parse_datetime(raw)
+    if value is None:
+        day = parse_date(raw)
+        if day is None:
+            raise ValueError(raw)
+        if end_of_day:
+            day += timedelta(days=1)
+        value = datetime.combine(day, time.min)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def get_date_range(request):
+    """Return ``(start, end)`` from ``date_from``/``date_to``; either may be None.
+
+    ``end`` is exclusive.
+    """
+    bounds = []
+    for name, end_of_day in (('date_from', False), ('date_to', True)):
+        raw = request.query_params.get(name, '').strip()
+        if not raw:
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(_parse_bound(raw, end_of_day))
+        except ValueError:
+            raise InvalidPageRequest(f'{name} must be an ISO date or datetime.')
+    return tuple(bounds)
+
+
+def filter_queryset(queryset, request, date_field, name_field='party_name', status_field=None):
+    """Apply the shared ``q``, date range and (optional) ``status`` filters."""
+    params = request.query_params
+    name = params.get('q', '').strip()
+    if name:
+        queryset = queryset.filter(**{f'{name_field}__icontains': name})
+    start, end = get_date_range(request)
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    if status_field and params.get('status'):
+        queryset = queryset.filter(**{status_field: params['status']})
+    return queryset
+
+
+def paginate_queryset(queryset, request, ordering):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset``.
+
+    ``ordering`` lists the sort keys as ``(name, descending)`` pairs and must
+    end with a unique column; names may be fields or annotations.
+    """
+    size = get_page_size(request)
+    queryset = queryset.order_by(*[f'-{name}' if desc else name for name, desc in ordering])
+
+    token = request.query_params.get('cursor')
+    if token:
+        values = decode_cursor(token, len(ordering))
+        after = Q()
+        equal = {}
+        for (name, desc), value in zip(ordering, values):
+            after |= Q(**equal, **{f'{name}__{"lt" if desc else "gt"}': value})
+            equal[name] = value
+        try:
+            queryset = queryset.filter(after)
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidPageRequest('Invalid cursor.')
+
+    try:
+        rows = list(queryset[:size + 1])
+    except (ValueError, TypeError, ValidationError):
+        raise InvalidPageRequest('Invalid cursor.')
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor([getattr(rows[-1], name) for name, _ in ordering])
+    return rows, next_cursor
+
+
+def paginate_list(items, request, sort_key):
+    """Return ``(items, next_cursor)`` for one page of an already sorted list.
+
+    ``sort_key(item)`` must return a JSON-serializable tuple that increases
+    along the list and is unique per item.
+    """
+    size = get_page_size(request)
+    token = request.query_params.get('cursor')
+    if token and items:
+        position = tuple(decode_cursor(token, len(sort_key(items[0]))))
+        try:
+            items = [item for item in items if sort_key(item) > position]
+        except TypeError:
+            raise InvalidPageRequest('Invalid cursor.')
+
+    page = items[:size]
+    next_cursor = encode_cursor(sort_key(page[-1])) if len(items) > size else None
+    return page, next_cursor
+
+
+def page_data(results, next_cursor):
+    return {'results': results, 'next_cursor': next_cursor}
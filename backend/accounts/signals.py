@@ -0,0 +1,108 @@
+"""
+Model signal handlers that keep derived caches in sync with writes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .expiry import sweeper
+from .leaderboard import BOARD_FIELDS, BOARD_STATUSES, leaderboard_changed
+from .images import IMAGE_FIELDS, schedule_derivatives
+from .models import Checkpoint, Controller, PendingSignup, StaffProfile, Storyline
+from .station_link import push_station_config
+from .topology import ROUTING_FIELDS, invalidate_topology
+
+
+def _schedule_leaderboard_invalidation():
+    # Wait for the commit so a concurrent read can't rebuild a snapshot
+    # from the old rows under the new version.
+    transaction.on_commit(leaderboard_changed)
+
+
+def _invalidate_topology():
+    # Drop it now so this thread sees the change, and again after the
+    # commit in case another thread rebuilt it from the old rows meanwhile.
+    invalidate_topology()
+    transaction.on_commit(invalidate_topology)
+
+
+def _board_state(session):
+    # Raw attribute values: reading them must not load deferred fields or build FieldFiles.
+    return session.status in BOARD_STATUSES, tuple(session.__dict__.get(f) for f in BOARD_FIELDS)
+
+
+@receiver(post_init, sender=PendingSignup)
+def note_board_state(sender, instance, **kwargs):
+    instance._board_state = _board_state(instance)
+
+
+@receiver(post_save, sender=PendingSignup)
+def session_saved(sender, instance, created=False, **kwargs):
+    was_listed, old_values = instance._board_state
+    instance._board_state = listed, values = _board_state(instance)
+    if not (was_listed or listed):
+        return  # Pending or rejected before and after: on no board
+    if created or values != old_values:
+        # Opt-ins, tags, deadlines and station progress are not shown
+        _schedule_leaderboard_invalidation()
+
+
+@receiver(post_delete, sender=PendingSignup)
+def session_deleted(sender, instance, **kwargs):
+    if instance._board_state[0] or instance.status in BOARD_STATUSES:
+        _schedule_leaderboard_invalidation()
+
+
+@receiver(post_save, sender=Checkpoint)
+@receiver(post_delete, sender=Checkpoint)
+@receiver(post_save, sender=Storyline)
+@receiver(post_delete, sender=Storyline)
+def leaderboard_rows_changed(sender, **kwargs):
+    _schedule_leaderboard_invalidation()
+
+
+@receiver(post_save, sender=PendingSignup)
+def session_deadline_changed(sender, instance, update_fields=None, **kwargs):
+    if instance.status != 'approved':
+        return
+    if update_fields is None or 'expires_at' in update_fields:
+        transaction.on_commit(sweeper.wake)
+
+
+@receiver(post_save, sender=Controller)
+def controller_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if not created and update_fields and ROUTING_FIELDS.isdisjoint(update_fields):
+        # Health report: no routing or leaderboard-visible field changed.
+        return
+    _invalidate_topology()
+    _schedule_leaderboard_invalidation()
+    if not created:
+        transaction.on_commit(lambda: push_station_config(instance.pk))
+
+
+@receiver(post_delete, sender=Controller)
+def controller_deleted(sender, **kwargs):
+    _invalidate_topology()
+    _schedule_leaderboard_invalidation()
+
+
+@receiver(pre_save, sender=PendingSignup)
+@receiver(pre_save, sender=Storyline)
+@receiver(pre_save, sender=StaffProfile)
+def note_image_upload(sender, instance, **kwargs):
+    # A freshly assigned upload is not committed to storage until the save.
+    image = getattr(instance, IMAGE_FIELDS[sender.__name__])
+    instance._image_uploaded = bool(image) and not image._committed
+
+
+@receiver(post_save, sender=PendingSignup)
+@receiver(post_save, sender=Storyline)
+@receiver(post_save, sender=StaffProfile)
+def image_uploaded(sender, instance, **kwargs):
+    if not getattr(instance, '_image_uploaded', False):
+        return
+    instance._image_uploaded = False
+    name = getattr(instance, IMAGE_FIELDS[sender.__name__]).name
+    # Leaderboard rows carry team photo URLs; rebuild them once the sizes exist.
+    on_done = leaderboard_changed if sender is PendingSignup else None
+    transaction.on_commit(lambda: schedule_derivatives(name, on_done))
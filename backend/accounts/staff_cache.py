@@ -0,0 +1,107 @@
+"""
+Push staff card changes to the stations' staff caches.
+
+Stations cache which RFID tags belong to active staff (seeded from
+``rfid/staff-tags/``) so staff resets do not wait on the backend. When a
+staff member's tag or active flag changes, every station is told to drop
+the affected tags, over its control link when it has one open
+(``accounts.station_link``) and otherwise with ``POST
+/staff-cache/invalidate`` on the station app; the next tap of those cards
+asks the backend again.
+
+The push runs after the write commits. HTTP pushes go through a small
+thread pool (``InvalidationPusher``), so an unreachable station never slows
+down the staff page and a bulk edit can't start a thread per controller.
+Tags queued for a station whose push has not started are sent together,
+and a failed push is retried a few times. Stations that still miss a push
+catch up on their next periodic refresh.
+"""
+import json
+import logging
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from .station_link import push_to_station
+from .topology import get_topology
+
+logger = logging.getLogger(__name__)
+
+PUSH_TIMEOUT_SECONDS = 3
+PUSH_WORKERS = 2
+PUSH_ATTEMPTS = 3
+PUSH_RETRY_DELAY = 2.0  # Seconds, times the attempt number
+
+
+def _station_url(controller):
+    host = controller.station_host or controller.ip_address
+    return f'http://{host}:{controller.station_port}/staff-cache/invalidate'
+
+
+def _post_invalidation(url, body):
+    req = urllib.request.Request(url, data=body, method='POST', headers={
+        'Authorization': f'Bearer {settings.STATION_TOKEN}',
+        'Content-Type': 'application/json',
+    })
+    with urllib.request.urlopen(req, timeout=PUSH_TIMEOUT_SECONDS):
+        pass
+
+
+class InvalidationPusher:
+    """Posts invalidations to stations on a bounded thread pool, merging queued tags."""
+
+    def __init__(self, workers=PUSH_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}  # Station URL -> tags not sent yet
+
+    def push(self, url, rfid_tags):
+        """Queue ``rfid_tags`` for ``url``; return a Future, or None if merged into a queued push."""
+        with self._lock:
+            queued = url in self._pending
+            self._pending.setdefault(url, set()).update(rfid_tags)
+            if queued:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='staff-cache-push')
+            executor = self._executor
+        return executor.submit(self._send, url)
+
+    def _send(self, url):
+        with self._lock:
+            rfid_tags = self._pending.pop(url)
+        body = json.dumps({'rfid_tags': sorted(rfid_tags)}).encode('utf-8')
+        for attempt in range(1, PUSH_ATTEMPTS + 1):
+            try:
+                _post_invalidation(url, body)
+                return True
+            except Exception as exc:
+                if attempt == PUSH_ATTEMPTS:
+                    logger.warning(f"Staff cache invalidation to {url} failed after {attempt} attempts: {exc}")
+                    return False
+                time.sleep(PUSH_RETRY_DELAY * attempt)
+
+
+pusher = InvalidationPusher()
+
+
+def push_staff_cache_invalidation(rfid_tags):
+    """Tell every station to drop these tags from its staff cache."""
+    rfid_tags = sorted({tag for tag in rfid_tags if tag})
+    if not rfid_tags:
+        return
+    for controller in get_topology().controllers:
+        if not push_to_station(controller.id, 'staff_cache_invalidate', {'rfid_tags': rfid_tags}):
+            pusher.push(_station_url(controller), rfid_tags)
+
+
+def staff_tags_changed(*rfid_tags):
+    """Push an invalidation for these tags once the current transaction commits."""
+    tags = [tag for tag in rfid_tags if tag]
+    if tags:
+        transaction.on_commit(lambda: push_staff_cache_invalidation(tags))
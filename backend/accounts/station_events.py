@@ -0,0 +1,115 @@
+"""
+Exactly-once application of journaled station events.
+
+Stations write stops, checkpoints and health reports to a local journal
+before sending them, and replay the journal in order (in batches) until
+the backend acknowledges each event, so nothing is lost while the backend
+is slow or unreachable. Every event carries an idempotency key: the event
+is applied and its receipt stored in one transaction, and a key that
+arrives again (a retry after a lost response, or the live attempt racing
+the replayer) gets the stored response back instead of being applied
+twice.
+
+Events are applied at the time they happened on the station. Station
+clocks are not trusted as such: the batch carries the station's clock at
+send time, and each event's age on that clock is subtracted from the
+backend's clock.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import StationEventReceipt
+
+# Receipts only need to outlive the longest outage a station can replay.
+RECEIPT_RETENTION = timedelta(days=7)
+MAX_BATCH_SIZE = 100
+
+PRUNE_INTERVAL = 3600.0
+
+
+class InvalidEvent(ValueError):
+    """Raised for an event that can never be applied (bad shape or type)."""
+
+
+def event_time(occurred_at, sent_at, now=None):
+    """Return the backend time at which a station event happened.
+
+    ``occurred_at`` and ``sent_at`` are Unix timestamps on the station's
+    clock; the result is never in the future.
+    """
+    now = now or timezone.now()
+    try:
+        age = float(sent_at) - float(occurred_at)
+    except (TypeError, ValueError):
+        return now
+    return now - timedelta(seconds=max(0.0, age))
+
+
+def apply_event(event, handlers, sent_at, now=None):
+    """Apply one event at most once; return ``(body, status_code, duplicate)``.
+
+    ``handlers`` maps event types to ``handler(data, occurred_at)``
+    callables returning ``(body, status_code)``. Handlers run inside the
+    event's transaction; responses with a 5xx status are not recorded, so
+    the station retries them.
+    """
+    key = str(event.get('idempotency_key') or '').strip()
+    event_type = event.get('type')
+    if not key or len(key) > 64:
+        raise InvalidEvent('idempotency_key is required (at most 64 characters).')
+    handler = handlers.get(event_type)
+    if handler is None:
+        raise InvalidEvent(f'Unknown event type: {event_type!r}.')
+
+    receipt = StationEventReceipt.objects.filter(idempotency_key=key).first()
+    if receipt is not None:
+        return receipt.response, receipt.status_code, True
+
+    data = event.get('data') or {}
+    occurred_at = event_time(event.get('occurred_at'), sent_at, now)
+    try:
+        with transaction.atomic():
+            body, status_code = handler(data, occurred_at)
+            if status_code < 500:
+                StationEventReceipt.objects.create(
+                    idempotency_key=key,
+                    event_type=event_type,
+                    controller_ip=str(data.get('controller_ip') or data.get('ip_address') or '')[:45],
+                    occurred_at=occurred_at,
+                    status_code=status_code,
+                    response=body,
+                )
+    except IntegrityError:
+        # The same key was applied concurrently; ours rolled back.
+        receipt = StationEventReceipt.objects.get(idempotency_key=key)
+        return receipt.response, receipt.status_code, True
+    return body, status_code, False
+
+
+def prune_receipts(now=None):
+    """Delete receipts older than ``RECEIPT_RETENTION``."""
+    cutoff = (now or timezone.now()) - RECEIPT_RETENTION
+    return StationEventReceipt.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def maybe_prune_receipts():
+    """Run ``prune_receipts`` if this process has not in the last ``PRUNE_INTERVAL``."""
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL:
+        return False
+    if not _prune_lock.acquire(blocking=False):
+        return False  # Another thread is on it
+    try:
+        _last_prune = time.monotonic()
+        prune_receipts()
+    finally:
+        _prune_lock.release()
+    return True
@@ -0,0 +1,138 @@
+"""
+Persistent control links between stations and the backend.
+
+Each station's hardware app keeps one websocket open to
+``ws/station/<station_id>/control/`` (``StationControlConsumer``),
+authenticated with the shared ``STATION_TOKEN`` (sent as an
+``Authorization: Bearer`` header, never in the URL, so access logs don't
+record it) and tied to a controller by the station's IP. The station sends heartbeats over it, and RFID scans,
+journal event batches and health samples as id-tagged requests answered on
+the same socket, so none of them pays for a new HTTP connection. The
+backend pushes controller config changes and staff cache invalidations
+down the link instead of dialing the station.
+
+Presence lives in the cache: a station is online while its link is open
+and it has sent something within ``PRESENCE_TTL`` seconds. Use a shared
+cache (Redis) when running more than one backend process.
+"""
+import hmac
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .topology import get_topology
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_TTL = 90  # Three missed heartbeats at the station's default interval
+
+# Close codes sent to a station whose link is refused
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_UNKNOWN_STATION = 4404
+
+
+def control_group(controller_id):
+    return f'station_control_{controller_id}'
+
+
+def _presence_key(controller_id):
+    return f'station_link:{controller_id}'
+
+
+def token_valid(token):
+    """Check a station's token against ``STATION_TOKEN`` (links are refused if unset)."""
+    expected = getattr(settings, 'STATION_TOKEN', '')
+    return bool(expected) and hmac.compare_digest(str(token or ''), expected)
+
+
+def bearer_token(authorization):
+    """Return the token of an ``Authorization: Bearer <token>`` header value, or ''."""
+    authorization = authorization or ''
+    return authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+
+
+def mark_connected(controller_id, channel_name, now=None):
+    now = (now or timezone.now()).isoformat()
+    cache.set(_presence_key(controller_id), {
+        'channel': channel_name, 'connected_at': now, 'last_seen': now,
+    }, PRESENCE_TTL)
+
+
+def touch(controller_id, channel_name, now=None):
+    """Record that the station behind ``channel_name`` is still there."""
+    now = (now or timezone.now()).isoformat()
+    entry = cache.get(_presence_key(controller_id))
+    if entry is None or entry['channel'] != channel_name:
+        entry = {'channel': channel_name, 'connected_at': now}
+    entry['last_seen'] = now
+    cache.set(_presence_key(controller_id), entry, PRESENCE_TTL)
+
+
+def mark_disconnected(controller_id, channel_name):
+    # A reconnect may already have replaced this link's entry.
+    entry = cache.get(_presence_key(controller_id))
+    if entry is not None and entry['channel'] == channel_name:
+        cache.delete(_presence_key(controller_id))
+
+
+def presence(controller_ids):
+    """Return ``{controller_id: {"online", "connected_at", "last_seen"}}``."""
+    entries = cache.get_many([_presence_key(pk) for pk in controller_ids])
+    result = {}
+    for pk in controller_ids:
+        entry = entries.get(_presence_key(pk))
+        result[pk] = {
+            'online': entry is not None,
+            'connected_at': entry['connected_at'] if entry else None,
+            'last_seen': entry['last_seen'] if entry else None,
+        }
+    return result
+
+
+def is_connected(controller_id):
+    return cache.get(_presence_key(controller_id)) is not None
+
+
+def push_to_station(controller_id, message_type, data=None):
+    """Send a message down a station's control link; return False if it has none."""
+    if not is_connected(controller_id):
+        return False
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return False
+    try:
+        async_to_sync(channel_layer.group_send)(
+            control_group(controller_id),
+            {'type': 'station.push', 'message': {'type': message_type, **(data or {})}},
+        )
+    except Exception as e:
+        logger.error(f"Failed to push {message_type} to controller {controller_id}: {e}")
+        return False
+    return True
+
+
+def station_config(controller, request=None):
+    """The controller settings a station runs with."""
+    hint_audio = ''
+    if controller.hint_audio:
+        url = controller.hint_audio.url
+        hint_audio = request.build_absolute_uri(url) if request else url
+    return {
+        'controller_id': controller.id,
+        'name': controller.name,
+        'station_minutes': controller.station_minutes,
+        'is_start': controller.is_start,
+        'is_end': controller.is_end,
+        'hint_audio': hint_audio,
+    }
+
+
+def push_station_config(controller_id):
+    """Send a station its current config, if it is connected."""
+    controller = get_topology().get(controller_id)
+    if controller is not None:
+        push_to_station(controller_id, 'config', {'config': station_config(controller)})
@@ -1,10 +1,45 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from channels.routing import URLRouter
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.models import User
 
-from .models import Controller, PendingSignup
+from .audit import AuditWriter
+from .audit_archive import archive_audit_log, archive_months, archive_path, read_month
+from .consumers import LeaderboardConsumer
+from .exports import streaming_csv_response
+from .health import ingest_health
+from .images import DerivativePool, derivative_name, generate_derivatives, image_sizes
+from .expiry import expire_overdue_sessions
+from .leaderboard import (
+    DELTA_HISTORY, LeaderboardSnapshot, diff_leaderboards, invalidate_leaderboard, leaderboard_changed,
+    leaderboard_version,
+)
+from .metrics import HOUR, RETENTION, maintain_metrics
+from .models import AuditLog, Checkpoint, Controller, ControllerMetricSample, PendingSignup, StaffProfile, Storyline
+from .routing import websocket_urlpatterns
+from .staff_cache import InvalidationPusher
+from .views import STATION_LINK_HANDLERS
+from .topology import get_topology
+from PIL import Image
+from . import audit_archive, transitions
 
 
 class RfidStationReplayTests(TestCase):
@@ -160,3 +195,1537 @@ class SessionApprovalRfidValidationTests(TestCase):
         self.assertEqual(res.status_code, 200)
         session.refresh_from_db()
         self.assertEqual(session.rfid_tag, 'RFID-NEW-001')
+
+
+class LeaderboardQueryCountTests(TestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.storyline = Storyline.objects.create(title='Lost Temple')
+        self.controllers = [
+            Controller.objects.create(name=f'Station {i}', ip_address=f'10.0.0.{i}')
+            for i in range(1, 4)
+        ]
+
+    def _create_sessions(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_session_rows(count)
+
+    def _create_session_rows(self, count):
+        for i in range(count):
+            session = PendingSignup.objects.create(
+                party_name=f'Team {PendingSignup.objects.count()}',
+                status='ended' if i % 2 else 'approved',
+                approved_at=timezone.now(),
+                storyline=self.storyline,
+                points=i * 10,
+            )
+            for controller in self.controllers[:i % 4]:
+                Checkpoint.objects.create(session=session, controller=controller)
+
+    def _count_queries(self, url):
+        get_topology()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries), res.json()
+
+    def test_public_leaderboard_query_count_is_constant(self):
+        url = reverse('public-leaderboard') + '?filter=all'
+        self._create_sessions(2)
+        small, _ = self._count_queries(url)
+        self._create_sessions(20)
+        large, data = self._count_queries(url)
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 22)
+        self.assertEqual(data[0]['storyline_title'], 'Lost Temple')
+        self.assertEqual(
+            [row['checkpoints_cleared'] for row in data],
+            [len(row['checkpoints']) for row in data],
+        )
+
+    def test_admin_leaderboard_query_count_is_constant(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin-leaderboard') + '?filter=all'
+        self._create_sessions(2)
+        small, _ = self._count_queries(url)
+        self._create_sessions(20)
+        large, data = self._count_queries(url)
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 22)
+        self.assertIn('leaderboard_hidden', data[0])
+
+
+class LeaderboardSnapshotTests(TestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        self.controller = Controller.objects.create(name='Station 1', ip_address='10.0.0.1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session = PendingSignup.objects.create(
+                party_name='Team Snapshot',
+                rfid_tag='RFID-SNAP',
+                status='approved',
+                approved_at=timezone.now(),
+                session_minutes=10,
+            )
+        self.url = reverse('public-leaderboard') + '?filter=active'
+
+    def test_unchanged_board_is_served_without_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url)
+        self.assertEqual(res.json()[0]['name'], 'Team Snapshot')
+
+    def test_scan_write_rebuilds_snapshot(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('rfid-stop-session'),
+                data={'rfid': 'RFID-SNAP', 'controller_ip': self.controller.ip_address},
+                content_type='application/json',
+            )
+        data = self.client.get(reverse('public-leaderboard') + '?filter=all').json()
+        self.assertEqual(data[0]['points'], 600)
+        self.assertEqual(data[0]['checkpoints_cleared'], 1)
+
+    def test_only_board_visible_session_writes_invalidate(self):
+        version = leaderboard_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            pending = PendingSignup.objects.create(party_name='Team Pending')
+            pending.email = 'pending@example.com'
+            pending.save()
+            pending.delete()
+            self.session.receive_offers = True
+            self.session.current_controller_index = 1
+            self.session.save()
+        self.assertEqual(leaderboard_version(), version)
+
+        session = PendingSignup.objects.get(pk=self.session.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            session.points = 50
+            session.save(update_fields=['points'])
+        self.assertNotEqual(leaderboard_version(), version)
+
+    def test_health_report_does_not_invalidate_snapshot(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('controller-health-update'),
+                data={'ip_address': self.controller.ip_address, 'cpu_usage': '12%'},
+                content_type='application/json',
+            )
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.controller = Controller.objects.create(name='Station 1', ip_address='10.0.0.1')
+        with self.captureOnCommitCallbacks(execute=True):
+            PendingSignup.objects.create(
+                party_name='Team ETag',
+                status='ended',
+                approved_at=timezone.now(),
+                points=42,
+            )
+
+    def test_public_leaderboard_answers_matching_etag_with_304(self):
+        url = reverse('public-leaderboard') + '?filter=all'
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertTrue(etag)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PendingSignup.objects.create(party_name='Team New', status='ended', points=7)
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+    def test_public_controllers_etag_changes_after_update(self):
+        url = reverse('public-controllers')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Controller.objects.create(name='Station 2', ip_address='10.0.0.2')
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()), 2)
+
+    def test_controller_list_requires_auth_before_304(self):
+        url = reverse('controller-list-create')
+        self.client.force_login(self.admin)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+    def test_controller_list_etag_follows_rendered_fields(self):
+        url = reverse('controller-list-create')
+        self.client.force_login(self.admin)
+        etag = self.client.get(url)['ETag']
+
+        self.controller.save()  # Only moves updated_at
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.controller.cpu_usage = '45%'
+        self.controller.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()[0]['cpu_usage'], '45%')
+
+    def test_app_theme_etag(self):
+        url = reverse('app-theme')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RfidIndexTests(TestCase):
+    def _query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_rfid_lookup_uses_tag_status_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are SQLite-specific.')
+        plan = self._query_plan(PendingSignup.objects.filter(rfid_tag='RFID-1', status='approved'))
+        self.assertIn('signup_rfid_status_idx', plan)
+
+    def test_controller_lookup_by_ip_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are SQLite-specific.')
+        plan = self._query_plan(Controller.objects.filter(ip_address='10.0.0.1'))
+        self.assertIn('USING INDEX', plan)
+
+
+class ArenaTopologyTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.controller = Controller.objects.create(
+            name='Station 1', ip_address='192.168.1.10', station_minutes=5,
+        )
+        Controller.objects.create(name='Station 2', ip_address='192.168.1.11')
+        self.session = PendingSignup.objects.create(
+            party_name='Team Topology',
+            rfid_tag='RFID-TOPO',
+            status='approved',
+            approved_at=timezone.now(),
+        )
+
+    def _scan(self, name):
+        return self.client.post(
+            reverse(name),
+            data={'rfid': 'RFID-TOPO', 'controller_ip': self.controller.ip_address},
+            content_type='application/json',
+        )
+
+    def test_scans_do_not_query_controllers(self):
+        get_topology()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._scan('rfid-start-session').status_code, 200)
+            self.assertEqual(self._scan('rfid-stop-session').status_code, 200)
+        controller_queries = [q['sql'] for q in ctx.captured_queries if '"accounts_controller"' in q['sql']]
+        self.assertEqual(controller_queries, [])
+
+    def test_routing_change_invalidates_topology(self):
+        version = get_topology().version
+        self.client.force_login(self.admin)
+        res = self.client.put(
+            reverse('controller-detail', args=[self.controller.id]),
+            data=encode_multipart(BOUNDARY, {'station_minutes': '3'}),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(get_topology().version, version)
+
+        res = self._scan('rfid-start-session')
+        self.assertEqual(res.json()['per_station_seconds'], 180)
+
+    def test_health_report_keeps_topology(self):
+        topology = get_topology()
+        self.client.post(
+            reverse('controller-health-update'),
+            data={'ip_address': self.controller.ip_address, 'cpu_usage': '50%'},
+            content_type='application/json',
+        )
+        self.assertIs(get_topology(), topology)
+
+
+class SessionExpiryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.client.force_login(self.admin)
+        approved_at = timezone.now() - timedelta(minutes=15)
+        self.overdue = PendingSignup.objects.create(
+            party_name='Overdue Team',
+            rfid_tag='RFID-OLD',
+            status='approved',
+            approved_at=approved_at,
+            session_minutes=10,
+            is_playing=True,
+            last_started_at=approved_at + timedelta(minutes=8),
+        )
+        self.live = PendingSignup.objects.create(
+            party_name='Live Team',
+            status='approved',
+            approved_at=timezone.now(),
+            session_minutes=10,
+        )
+
+    def test_expires_at_follows_session_minutes(self):
+        self.assertEqual(self.live.expires_at, self.live.approved_at + timedelta(minutes=10))
+        self.live.session_minutes = 25
+        self.live.save(update_fields=['session_minutes'])
+        self.live.refresh_from_db()
+        self.assertEqual(self.live.expires_at, self.live.approved_at + timedelta(minutes=25))
+
+    def test_sweeper_ends_overdue_sessions_in_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(expire_overdue_sessions(), 1)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.overdue.status, 'ended')
+        self.assertEqual(self.overdue.ended_at, self.overdue.expires_at)
+        self.assertFalse(self.overdue.is_playing)
+        # Played from the last start (minute 8) until the deadline (minute 10).
+        self.assertEqual(self.overdue.total_elapsed_seconds, 120)
+        self.live.refresh_from_db()
+        self.assertEqual(self.live.status, 'approved')
+
+    def test_session_reads_do_not_write(self):
+        with CaptureQueriesContext(connection) as ctx:
+            live = self.client.get(reverse('live-sessions')).json()
+            ended = self.client.get(reverse('ended-sessions')).json()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+
+        self.assertEqual([s['party_name'] for s in live], ['Live Team'])
+        self.assertEqual([s['party_name'] for s in ended], ['Overdue Team'])
+        self.assertEqual(ended[0]['status'], 'ended')
+        self.overdue.refresh_from_db()
+        self.assertEqual(self.overdue.status, 'approved')
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.client.force_login(self.admin)
+        base = timezone.now() - timedelta(days=3)
+        for i in range(5):
+            PendingSignup.objects.create(
+                party_name=f'Team {i}',
+                email=f'team{i}@example.com',
+                receive_offers=True,
+                status='ended',
+                points=10 * (i % 3),
+                approved_at=base + timedelta(hours=i),
+                ended_at=base + timedelta(hours=i, minutes=30),
+            )
+
+    def _collect(self, url, params):
+        names, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            body = self.client.get(url, query).json()
+            names += [row.get('party_name', row.get('name')) for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                return names
+
+    def test_unpaginated_requests_keep_the_plain_list(self):
+        response = self.client.get(reverse('ended-sessions'))
+        self.assertEqual(len(response.json()), 5)
+
+    def test_ended_sessions_pages_cover_the_list_once_in_order(self):
+        names = self._collect(reverse('ended-sessions'), {'page_size': 2})
+        self.assertEqual(names, ['Team 4', 'Team 3', 'Team 2', 'Team 1', 'Team 0'])
+
+    def test_later_pages_cost_the_same_number_of_queries(self):
+        first = self.client.get(reverse('ended-sessions'), {'page_size': 2}).json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('ended-sessions'), {'page_size': 2, 'cursor': first['next_cursor']})
+        # Session (with storyline) and checkpoint queries only.
+        self.assertEqual(len([q for q in ctx.captured_queries if 'accounts_' in q['sql']]), 2)
+
+    def test_leaderboard_pages_follow_rank_order(self):
+        full = [row['name'] for row in self.client.get(reverse('public-leaderboard')).json()]
+        self.assertEqual(self._collect(reverse('public-leaderboard'), {'page_size': 2}), full)
+
+    def test_filters(self):
+        response = self.client.get(reverse('email-subscribers'), {'q': 'team 3'})
+        self.assertEqual([row['party_name'] for row in response.json()], ['Team 3'])
+
+        window = {
+            'date_from': timezone.localdate(timezone.now() - timedelta(days=4)).isoformat(),
+            'date_to': timezone.localdate(timezone.now() - timedelta(days=2)).isoformat(),
+        }
+        response = self.client.get(reverse('ended-sessions'), window)
+        self.assertEqual(len(response.json()), 5)
+        response = self.client.get(reverse('ended-sessions'), {'date_from': timezone.localdate().isoformat()})
+        self.assertEqual(response.json(), [])
+
+        response = self.client.get(reverse('public-leaderboard'), {'status': 'live'})
+        self.assertEqual(response.json(), [])
+
+    def test_malformed_parameters_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'page_size': 'ten'}, {'date_from': 'yesterday'}):
+            response = self.client.get(reverse('ended-sessions'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class LeaderboardPushTests(TransactionTestCase):
+    def setUp(self):
+        invalidate_leaderboard()
+        self.controller = Controller.objects.create(name='Gate', ip_address='10.0.0.5')
+        self.session = PendingSignup.objects.create(
+            party_name='Pushed Team', status='ended', points=5,
+        )
+
+    def _connect(self):
+        return WebsocketCommunicator(LeaderboardConsumer.as_asgi(), '/ws/leaderboard/?filter=all')
+
+    async def test_initial_board_then_one_push_per_burst(self):
+        communicator = self._connect()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        initial = json.loads(await communicator.receive_from())
+        self.assertEqual(initial['type'], 'leaderboard_update')
+        self.assertEqual(initial['leaderboard'][0]['points'], 5)
+
+        def burst():
+            for points in (10, 20, 30):
+                self.session.points = points
+                self.session.save(update_fields=['points'])
+            Checkpoint.objects.create(session=self.session, controller=self.controller)
+
+        await sync_to_async(burst)()
+        delta = json.loads(await communicator.receive_from(timeout=2))
+        self.assertEqual(delta['type'], 'leaderboard_delta')
+        self.assertEqual(delta['base_seq'], initial['seq'])
+        self.assertEqual(delta['changed'][0]['points'], 30)
+        self.assertEqual(delta['changed'][0]['checkpoints_cleared'], 1)
+        self.assertTrue(await communicator.receive_nothing(timeout=LeaderboardConsumer.COALESCE_SECONDS * 2))
+        await communicator.disconnect()
+
+    async def test_health_reports_do_not_push(self):
+        communicator = self._connect()
+        await communicator.connect()
+        await communicator.receive_from()
+
+        def report():
+            self.controller.cpu_usage = '12%'
+            self.controller.save(update_fields=['cpu_usage', 'updated_at'])
+
+        await sync_to_async(report)()
+        self.assertTrue(await communicator.receive_nothing(timeout=LeaderboardConsumer.COALESCE_SECONDS * 2))
+        await communicator.disconnect()
+
+    async def test_deltas_carry_rank_moves_and_resync_sends_the_board(self):
+        communicator = self._connect()
+        await communicator.connect()
+        initial = json.loads(await communicator.receive_from())
+
+        def changes():
+            PendingSignup.objects.create(party_name='Newcomer', status='ended', points=1)
+            self.session.points = 0
+            self.session.save(update_fields=['points'])
+
+        await sync_to_async(changes)()
+        delta = json.loads(await communicator.receive_from(timeout=2))
+        self.assertEqual([row['name'] for row in delta['inserted']], ['Newcomer'])
+        self.assertEqual(delta['moves'], [{'id': self.session.id, 'from': 1, 'to': 2}])
+        self.assertEqual(delta['seq'], initial['seq'] + 1)
+
+        await communicator.send_to(text_data=json.dumps({'type': 'resync'}))
+        board = json.loads(await communicator.receive_from())
+        self.assertEqual(board['type'], 'leaderboard_update')
+        self.assertEqual(board['seq'], delta['seq'])
+        self.assertEqual([row['name'] for row in board['leaderboard']], ['Newcomer', 'Pushed Team'])
+        await communicator.disconnect()
+
+
+class LeaderboardDeltaTests(TestCase):
+    def test_diff_reports_changes_insertions_removals_and_moves(self):
+        old = [
+            {'id': 1, 'points': 30},
+            {'id': 2, 'points': 20},
+            {'id': 3, 'points': 10},
+        ]
+        new = [
+            {'id': 3, 'points': 40},
+            {'id': 1, 'points': 30},
+            {'id': 4, 'points': 5},
+        ]
+        self.assertEqual(diff_leaderboards(old, new), {
+            'changed': [{'id': 3, 'points': 40}],
+            'inserted': [{'id': 4, 'points': 5}],
+            'removed': [2],
+            'moves': [{'id': 3, 'from': 3, 'to': 1}],
+        })
+
+    def test_snapshots_keep_a_bounded_delta_history(self):
+        snapshot = LeaderboardSnapshot('all', 1, [], None)
+        self.assertEqual(snapshot.deltas_since(snapshot.seq), [])
+        for points in range(DELTA_HISTORY + 2):
+            snapshot = LeaderboardSnapshot('all', 1, [{'id': 1, 'points': points}], None, previous=snapshot)
+        self.assertEqual(len(snapshot.deltas_since(snapshot.seq - 2)), 2)
+        self.assertIsNone(snapshot.deltas_since(1))
+
+        unchanged = LeaderboardSnapshot('all', 2, snapshot.entries, None, previous=snapshot)
+        self.assertEqual(unchanged.seq, snapshot.seq)
+
+
+class SessionTransitionTests(TestCase):
+    def setUp(self):
+        self.controller1 = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+        self.controller2 = Controller.objects.create(name='Station 2', ip_address='192.168.1.11')
+        self.session = PendingSignup.objects.create(
+            party_name='Team Beta',
+            rfid_tag='RFID-456',
+            status='approved',
+            session_minutes=10,
+            approved_at=timezone.now(),
+        )
+        get_topology()
+
+    def _scan(self, name, controller):
+        return self.client.post(
+            reverse(name),
+            data={'rfid': self.session.rfid_tag, 'controller_ip': controller.ip_address},
+            content_type='application/json',
+        )
+
+    def test_repeated_stop_does_not_count_the_station_twice(self):
+        self.assertEqual(self._scan('rfid-start-session', self.controller1).status_code, 200)
+        first = self._scan('rfid-stop-session', self.controller1).json()
+        retry = self._scan('rfid-stop-session', self.controller1).json()
+
+        self.assertTrue(first['checkpoint_created'])
+        self.assertFalse(retry['checkpoint_created'])
+        self.assertEqual(retry['total_points'], first['total_points'])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.points, first['total_points'])
+        self.assertEqual(self.session.current_controller_index, 1)
+
+    def test_last_station_ends_the_session(self):
+        for controller in (self.controller1, self.controller2):
+            self._scan('rfid-start-session', controller)
+            data = self._scan('rfid-stop-session', controller).json()
+        self.assertTrue(data['session_ended'])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'ended')
+        self.assertEqual(self.session.points, data['total_points'])
+
+    def _statements(self, ctx):
+        # Savepoints are transaction bookkeeping (the test case's own
+        # transaction turns atomic blocks into savepoints).
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if not q['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ]
+
+    def test_scans_are_a_few_statements(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._scan('rfid-start-session', self.controller1)
+        # Lock/read, completed-station check, update.
+        self.assertEqual(len(self._statements(ctx)), 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._scan('rfid-stop-session', self.controller1)
+        # Lock/read, checkpoint insert, count, update.
+        self.assertEqual(len(self._statements(ctx)), 4)
+
+    def test_removing_a_checkpoint_takes_back_its_points(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'adminpass123'))
+        added = self.client.post(
+            reverse('add-checkpoint', args=[self.session.pk]),
+            data={'controller_id': self.controller1.pk},
+            content_type='application/json',
+        ).json()
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.points, added['checkpoint']['points_earned'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            removed = self.client.delete(
+                reverse('remove-checkpoint', args=[self.session.pk, added['checkpoint']['id']])
+            ).json()
+        self.assertEqual(removed['new_total'], 0)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.points, 0)
+        self.assertEqual(len([c for c in callbacks if c is leaderboard_changed]), 1)
+
+    def test_manual_checkpoint_rescan_and_lookup_errors(self):
+        first = self._scan('rfid-checkpoint', self.controller1)
+        again = self._scan('rfid-checkpoint', self.controller1)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['points_earned'], 0)
+
+        # An unknown session is reported before an unknown controller.
+        response = self.client.post(
+            reverse('rfid-checkpoint'), data={'rfid': 'UNKNOWN', 'controller_ip': '10.0.0.99'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error'], 'No active session found for this RFID tag.')
+
+
+class RfidScanTests(TestCase):
+    def setUp(self):
+        self.controller = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+        self.session = PendingSignup.objects.create(
+            party_name='Team Gamma',
+            rfid_tag='RFID-789',
+            status='approved',
+            session_minutes=10,
+            approved_at=timezone.now(),
+        )
+        staff = User.objects.create_user('staffer', password='staffpass123', is_staff=True)
+        StaffProfile.objects.create(user=staff, rfid_tag='STAFF-1')
+
+    def _scan(self, rfid, mode, **extra):
+        return self.client.post(
+            reverse('rfid-scan'),
+            data={'rfid': rfid, 'controller_ip': self.controller.ip_address, 'station_mode': mode, **extra},
+            content_type='application/json',
+        )
+
+    def test_player_card_in_ready_mode_starts_the_session(self):
+        response = self._scan('RFID-789', 'ready')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['action'], 'start')
+        self.assertFalse(data['is_staff'])
+        self.assertEqual(data['result']['party_name'], 'Team Gamma')
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_playing)
+
+    def test_staff_card_in_active_mode_stops_the_session(self):
+        self._scan('RFID-789', 'ready')
+        data = self._scan('STAFF-1', 'active', session_rfid='RFID-789').json()
+        self.assertEqual(data['action'], 'stop')
+        self.assertEqual(data['staff']['username'], 'staffer')
+        self.assertTrue(data['result']['checkpoint_created'])
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.is_playing)
+
+    def test_mode_specific_outcomes(self):
+        self.assertEqual(self._scan('STAFF-1', 'ready').json()['action'], 'staff')
+        self.assertEqual(self._scan('STAFF-1', 'result').json()['action'], 'reset')
+        self.assertEqual(self._scan('RFID-789', 'result').json()['action'], 'ignored')
+        self.assertEqual(self._scan('RFID-789', 'active').json()['action'], 'ignored')
+
+    def test_failed_start_returns_the_start_error(self):
+        response = self._scan('UNKNOWN', 'ready')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+        self.assertFalse(response.json()['is_staff'])
+
+    def test_failed_stop_still_reports_the_staff_card(self):
+        response = self._scan('STAFF-1', 'active', session_rfid='UNKNOWN')
+        self.assertEqual(response.status_code, 404)
+        data = response.json()
+        self.assertIn('error', data)
+        self.assertTrue(data['is_staff'])
+        self.assertEqual(data['staff']['username'], 'staffer')
+
+
+class StaffCacheTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='adminpass123')
+        self.staff = User.objects.create_user('staffer', password='staffpass123', is_staff=True)
+        StaffProfile.objects.create(user=self.staff, rfid_tag='STAFF-1')
+        blocked = User.objects.create_user('blocked', password='staffpass123', is_staff=True, is_active=False)
+        StaffProfile.objects.create(user=blocked, rfid_tag='STAFF-2')
+        untagged = User.objects.create_user('untagged', password='staffpass123', is_staff=True)
+        StaffProfile.objects.create(user=untagged)
+        self.client.force_login(self.admin)
+
+    @override_settings(STATION_TOKEN='link-secret')
+    def test_staff_tags_lists_only_active_tagged_staff(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('rfid-staff-tags'), HTTP_AUTHORIZATION='Bearer link-secret')
+        self.assertEqual(response.status_code, 200)
+        staff = response.json()['staff']
+        self.assertEqual(staff, [{'rfid_tag': 'STAFF-1', 'staff_id': self.staff.id, 'username': 'staffer'}])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT') and 'staffprofile' in q['sql']]), 1)
+
+    @override_settings(STATION_TOKEN='link-secret')
+    def test_staff_tags_require_the_station_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('rfid-staff-tags')).status_code, 401)
+        response = self.client.get(reverse('rfid-staff-tags'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch('accounts.staff_cache.PUSH_RETRY_DELAY', 0)
+    def test_http_pushes_are_merged_and_retried(self):
+        release = threading.Event()
+        sent = []
+
+        def post(url, body):
+            if url == 'http://busy':
+                release.wait(5)
+            sent.append((url, json.loads(body)['rfid_tags']))
+            if len(sent) == 2:
+                raise OSError('station unreachable')
+
+        pusher = InvalidationPusher(workers=1)
+        with mock.patch('accounts.staff_cache._post_invalidation', side_effect=post):
+            busy = pusher.push('http://busy', ['A'])
+            station = pusher.push('http://station', ['B'])
+            self.assertIsNone(pusher.push('http://station', ['C']))  # Merged into the queued push
+            release.set()
+            busy.result(timeout=5)
+            self.assertTrue(station.result(timeout=5))
+        self.assertEqual(sent, [
+            ('http://busy', ['A']), ('http://station', ['B', 'C']), ('http://station', ['B', 'C']),
+        ])
+
+    @mock.patch('accounts.staff_cache.push_staff_cache_invalidation')
+    def test_blocking_staff_pushes_their_tag(self, push):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('staff-toggle-block', args=[self.staff.pk]))
+        push.assert_called_once_with(['STAFF-1'])
+
+    @mock.patch('accounts.staff_cache.push_staff_cache_invalidation')
+    def test_changing_a_tag_pushes_old_and_new_tags(self, push):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse('staff-detail', args=[self.staff.pk]),
+                data={'rfid_tag': 'STAFF-9'}, content_type='application/json',
+            )
+        push.assert_called_once_with(['STAFF-1', 'STAFF-9'])
+
+    @mock.patch('accounts.staff_cache.push_staff_cache_invalidation')
+    def test_unrelated_edit_pushes_nothing(self, push):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse('staff-detail', args=[self.staff.pk]),
+                data={'first_name': 'Sam'}, content_type='application/json',
+            )
+        push.assert_not_called()
+
+
+class StationEventBatchTests(TestCase):
+    def setUp(self):
+        self.controller1 = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+        self.controller2 = Controller.objects.create(name='Station 2', ip_address='192.168.1.11')
+        self.session = PendingSignup.objects.create(
+            party_name='Team Delta',
+            rfid_tag='RFID-321',
+            status='approved',
+            session_minutes=20,
+            approved_at=timezone.now(),
+        )
+
+    def _send(self, *events, sent_at=1000.0):
+        return self.client.post(
+            reverse('station-event-batch'),
+            data={'sent_at': sent_at, 'events': list(events)},
+            content_type='application/json',
+        )
+
+    def _stop(self, key, occurred_at=1000.0):
+        return {
+            'idempotency_key': key,
+            'type': 'stop',
+            'occurred_at': occurred_at,
+            'data': {'rfid': 'RFID-321', 'controller_ip': self.controller1.ip_address},
+        }
+
+    def test_stop_is_applied_when_it_happened(self):
+        transitions.start_session('RFID-321', self.controller1, now=timezone.now() - timedelta(seconds=300))
+        # Stopped 240 s before the batch was sent: 60 s played, 540 s left of 600
+        response = self._send(self._stop('stop-1', occurred_at=760.0))
+        self.assertEqual(response.status_code, 200)
+        result = response.json()['results'][0]
+        self.assertEqual(result['status'], 200)
+        self.assertFalse(result['duplicate'])
+        self.assertAlmostEqual(result['body']['station_points'], 540, delta=2)
+
+    def test_checkpoint_is_stamped_when_it_happened(self):
+        response = self._send({
+            'idempotency_key': 'checkpoint-1', 'type': 'checkpoint', 'occurred_at': 760.0,
+            'data': {'rfid': 'RFID-321', 'controller_ip': self.controller2.ip_address},
+        })
+        self.assertEqual(response.json()['results'][0]['status'], 200)
+        cleared_at = Checkpoint.objects.get(session=self.session).cleared_at
+        self.assertAlmostEqual((timezone.now() - cleared_at).total_seconds(), 240, delta=5)
+
+    @mock.patch('accounts.station_events.prune_receipts')
+    def test_receipts_are_pruned_at_most_once_per_interval(self, prune):
+        with mock.patch('accounts.station_events._last_prune', float('-inf')):
+            for key in ('stop-1', 'stop-2'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self._send(self._stop(key))
+        prune.assert_called_once_with()
+
+    def test_replayed_key_is_not_applied_twice(self):
+        transitions.start_session('RFID-321', self.controller1)
+        first = self._send(self._stop('stop-1')).json()['results'][0]
+        # The player moves on; a late replay must not stop them at station 2
+        transitions.start_session('RFID-321', self.controller2)
+        replay = self._send(self._stop('stop-1')).json()['results'][0]
+        self.assertTrue(replay['duplicate'])
+        self.assertEqual(replay['body'], first['body'])
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_playing)
+        self.assertEqual(Checkpoint.objects.filter(session=self.session).count(), 1)
+
+    def test_events_are_applied_in_order_with_per_event_results(self):
+        transitions.start_session('RFID-321', self.controller1)
+        results = self._send(
+            {'idempotency_key': 'bad-1', 'type': 'teleport', 'data': {}},
+            {'idempotency_key': 'health-1', 'type': 'health', 'occurred_at': 990.0,
+             'data': {'ip_address': self.controller1.ip_address, 'cpu_usage': '12%'}},
+            self._stop('stop-1'),
+        ).json()['results']
+        self.assertEqual([r['status'] for r in results], [400, 200, 200])
+        self.controller1.refresh_from_db()
+        self.assertEqual(self.controller1.cpu_usage, '12%')
+
+
+class ControllerMetricsTests(TestCase):
+    def setUp(self):
+        self.controller = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def _report(self, **metrics):
+        return self.client.post(
+            reverse('controller-health-update'),
+            data={'ip_address': self.controller.ip_address, **metrics},
+            content_type='application/json',
+        )
+
+    def test_health_report_records_numeric_sample(self):
+        response = self._report(
+            cpu_usage='45.5%', ram_usage='62% (512MB / 1024MB)', storage_usage='35% (4GB / 16GB)',
+            cpu_temperature='52.3°C', system_uptime='2d 5h 30m',
+            voltage_power_status='Warning: throttled=0x50005',
+        )
+        self.assertEqual(response.status_code, 200)
+        sample = ControllerMetricSample.objects.get(controller=self.controller)
+        self.assertEqual(sample.resolution, ControllerMetricSample.RESOLUTION_RAW)
+        self.assertEqual(sample.cpu_percent, 45.5)
+        self.assertEqual(sample.ram_percent, 62.0)
+        self.assertEqual(sample.disk_percent, 35.0)
+        self.assertEqual(sample.temperature, 52.3)
+        self.assertEqual(sample.uptime_seconds, 2 * 86400 + 5 * 3600 + 30 * 60)
+        self.assertTrue(sample.throttled)
+
+    def test_rollups_and_retention(self):
+        now = timezone.now().replace(minute=30, second=30, microsecond=0)
+        start = now - timedelta(minutes=3)
+        ControllerMetricSample.objects.bulk_create([
+            ControllerMetricSample(controller=self.controller, recorded_at=start + timedelta(seconds=15 * i),
+                                   cpu_percent=10.0 * (i % 4), throttled=(i == 5))
+            for i in range(12)
+        ] + [
+            ControllerMetricSample(controller=self.controller, recorded_at=now - timedelta(days=3), cpu_percent=1.0),
+        ])
+        maintain_metrics(now)
+
+        minutes = ControllerMetricSample.objects.filter(
+            controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_MINUTE,
+            recorded_at__gte=start - timedelta(minutes=1),
+        ).order_by('recorded_at')
+        # Samples from 27:30 to 30:15 fall in four minutes; the current minute is still open
+        self.assertEqual([m.sample_count for m in minutes], [2, 4, 4])
+        self.assertEqual([m.cpu_percent for m in minutes], [5.0, 15.0, 15.0])
+        self.assertEqual([m.throttled for m in minutes], [False, True, False])
+        # The raw sample from three days ago was rolled up, then pruned
+        old = ControllerMetricSample.objects.filter(recorded_at__lt=now - timedelta(days=1))
+        self.assertCountEqual(old.values_list('resolution', flat=True),
+                         [ControllerMetricSample.RESOLUTION_MINUTE, ControllerMetricSample.RESOLUTION_HOUR])
+
+        # A late sample for a recent minute is picked up by the next pass
+        ControllerMetricSample.objects.create(
+            controller=self.controller, recorded_at=now.replace(minute=29, second=59), cpu_percent=65.0,
+        )
+        maintain_metrics(now + timedelta(seconds=40))
+        last = minutes.get(recorded_at=now.replace(minute=29, second=0))
+        self.assertEqual(last.sample_count, 5)
+        self.assertEqual(last.cpu_percent, 25.0)
+
+    def test_hourly_rollup_weights_minutes_by_sample_count(self):
+        now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        hour = now.replace(minute=0) - timedelta(hours=1)
+        ControllerMetricSample.objects.bulk_create([
+            ControllerMetricSample(controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_MINUTE,
+                                   recorded_at=hour + timedelta(minutes=5), cpu_percent=10.0, sample_count=1),
+            ControllerMetricSample(controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_MINUTE,
+                                   recorded_at=hour + timedelta(minutes=6), cpu_percent=50.0, temperature=40.0,
+                                   sample_count=3),
+        ])
+        maintain_metrics(now)
+        bucket = ControllerMetricSample.objects.get(
+            controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_HOUR, recorded_at=hour,
+        )
+        self.assertEqual(bucket.sample_count, 4)
+        self.assertEqual(bucket.cpu_percent, 40.0)
+        # Minutes without a temperature reading don't drag the average down
+        self.assertEqual(bucket.temperature, 40.0)
+
+    def test_series_endpoint_returns_aligned_arrays(self):
+        base = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=10)
+        ControllerMetricSample.objects.bulk_create([
+            ControllerMetricSample(controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_MINUTE,
+                                   recorded_at=base + timedelta(minutes=m), cpu_percent=float(m), sample_count=4)
+            for m in (0, 1, 3)
+        ])
+        response = self.client.get(reverse('controller-metrics', args=[self.controller.id]), {
+            'since': base.isoformat(),
+            'until': (base + timedelta(minutes=4)).isoformat(),
+            'resolution': 'minute',
+            'fields': 'cpu_percent,temperature',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['resolution'], 'minute')
+        self.assertEqual(len(data['timestamps']), 4)
+        self.assertEqual(data['timestamps'][1] - data['timestamps'][0], 60)
+        self.assertEqual(data['series']['cpu_percent'], [0.0, 1.0, None, 3.0])
+        self.assertEqual(data['series']['temperature'], [None, None, None, None])
+        self.assertEqual(data['sample_count'], [4, 4, 0, 4])
+
+        bad = self.client.get(reverse('controller-metrics', args=[self.controller.id]), {'fields': 'fan_speed'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_series_endpoint_bounds_the_range(self):
+        url = reverse('controller-metrics', args=[self.controller.id])
+        self.assertEqual(self.client.get(url, {'hours': '1e9'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'hours': '48', 'resolution': 'raw'}).status_code, 400)
+
+        response = self.client.get(url, {'since': '1990-01-01T00:00:00Z', 'fields': 'cpu_percent'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['resolution'], 'hour')
+        self.assertLessEqual(len(data['timestamps']), RETENTION[HOUR].days * 24 + 1)
+
+
+class HealthBatchIngestionTests(TestCase):
+    def setUp(self):
+        self.controller = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+
+    def _batch(self, *samples, reported_at=1000.0):
+        return self.client.post(
+            reverse('controller-health-batch'),
+            data={'ip_address': self.controller.ip_address, 'reported_at': reported_at, 'samples': list(samples)},
+            content_type='application/json',
+        )
+
+    def _sample(self, occurred_at, cpu, uptime='1d 2h 3m'):
+        return {'occurred_at': occurred_at, 'cpu_usage': f'{cpu}%', 'cpu_percent': cpu,
+                'system_uptime': uptime, 'voltage_power_status': 'OK (no throttling)'}
+
+    def test_batch_records_every_sample_and_writes_only_significant_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self._batch(self._sample(940.0, 50.0), self._sample(970.0, 40.0), self._sample(955.0, 30.0))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['samples_recorded'], 3)
+        self.assertEqual(first.json()['updated_fields'], ['cpu_usage', 'system_uptime', 'voltage_power_status'])
+        self.controller.refresh_from_db()
+        # Display values come from the newest sample, not the last one in the list
+        self.assertEqual(self.controller.cpu_usage, '40.0%')
+        samples = ControllerMetricSample.objects.filter(
+            controller=self.controller, resolution=ControllerMetricSample.RESOLUTION_RAW,
+        ).order_by('recorded_at')
+        self.assertEqual([s.cpu_percent for s in samples], [50.0, 30.0, 40.0])
+
+        get_topology()
+        with CaptureQueriesContext(connection) as queries:
+            small = self._batch(self._sample(1010.0, 42.0, uptime='1d 2h 4m'), reported_at=1015.0)
+        self.assertEqual(small.json()['updated_fields'], [])
+        # No controller lookup and no UPDATE: only the sample INSERT
+        self.assertFalse([q for q in queries.captured_queries if '"accounts_controller"' in q['sql']])
+        self.assertEqual(samples.all().count(), 4)
+
+        large = self._batch(self._sample(1030.0, 75.0, uptime='1d 2h 4m'), reported_at=1030.0)
+        self.assertEqual(large.json()['updated_fields'], ['cpu_usage', 'system_uptime'])
+        self.controller.refresh_from_db()
+        self.assertEqual(self.controller.cpu_usage, '75.0%')
+
+    def test_rolled_back_writes_are_not_remembered(self):
+        reports = [(timezone.now(), self._sample(0, 50.0))]
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            ingest_health(self.controller, reports)
+            raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            updated, _ = ingest_health(self.controller, reports)
+        self.assertIn('cpu_usage', updated)
+
+    def test_journaled_health_batch_uses_sample_times(self):
+        response = self.client.post(
+            reverse('station-event-batch'),
+            data={'sent_at': 2000.0, 'events': [{
+                'idempotency_key': 'health-batch-1', 'type': 'health', 'occurred_at': 1900.0,
+                'data': {'ip_address': self.controller.ip_address, 'reported_at': 1900.0,
+                         'samples': [self._sample(1840.0, 10.0), self._sample(1870.0, 20.0)]},
+            }]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['results'][0]['status'], 200)
+        times = list(ControllerMetricSample.objects.order_by('recorded_at').values_list('recorded_at', flat=True))
+        self.assertEqual(len(times), 2)
+        # 30 s apart, and the newer one 130 s before the batch reached the backend
+        self.assertAlmostEqual((times[1] - times[0]).total_seconds(), 30.0, places=3)
+        self.assertAlmostEqual((timezone.now() - times[1]).total_seconds(), 130.0, delta=5)
+
+    def test_unknown_controller_and_bad_batches_are_rejected(self):
+        response = self.client.post(
+            reverse('controller-health-batch'),
+            data={'ip_address': '10.0.0.99', 'samples': [self._sample(1.0, 1.0)]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._batch().status_code, 400)
+
+
+@override_settings(STATION_TOKEN='link-secret')
+class StationControlLinkTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.controller = Controller.objects.create(name='Station 1', ip_address='192.168.1.10')
+        PendingSignup.objects.create(
+            party_name='Team Echo', rfid_tag='RFID-555', status='approved',
+            session_minutes=20, approved_at=timezone.now(),
+        )
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def _connect(self, token='link-secret', ip='192.168.1.10'):
+        return WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/station/station1/control/?ip={ip}',
+            headers=[(b'authorization', f'Bearer {token}'.encode())],
+        )
+
+    async def _presence(self):
+        def fetch():
+            self.client.force_login(self.admin)
+            return self.client.get(reverse('controller-presence')).json()
+        return await sync_to_async(fetch)()
+
+    async def test_link_carries_requests_and_tracks_presence(self):
+        communicator = self._connect()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        config = await communicator.receive_json_from()
+        self.assertEqual(config['type'], 'config')
+        self.assertEqual(config['config']['controller_id'], self.controller.id)
+        self.assertTrue((await self._presence())[0]['online'])
+
+        await communicator.send_json_to({'type': 'heartbeat'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'heartbeat_ack')
+
+        # controller_ip comes from the link
+        await communicator.send_json_to({
+            'type': 'scan', 'id': 'req-1', 'data': {'rfid': 'RFID-555', 'station_mode': 'ready'},
+        })
+        response = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(response['id'], 'req-1')
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(response['body']['action'], 'start')
+        self.assertEqual(response['body']['result']['party_name'], 'Team Echo')
+
+        # A station can't report as another controller
+        await sync_to_async(Controller.objects.create)(name='Station 2', ip_address='192.168.1.11')
+        await communicator.send_json_to({
+            'type': 'health', 'id': 'req-2', 'data': {'ip_address': '192.168.1.11', 'cpu_usage': '45%'},
+        })
+        response = await communicator.receive_json_from(timeout=2)
+        self.assertEqual((response['status'], response['body']['controller']), (200, 'Station 1'))
+
+        # Config changes are pushed down the link
+        def rename():
+            self.controller.name = 'Station One'
+            self.controller.save()
+        await sync_to_async(rename)()
+        pushed = await communicator.receive_json_from(timeout=2)
+        self.assertEqual((pushed['type'], pushed['config']['name']), ('config', 'Station One'))
+
+        await communicator.disconnect()
+        self.assertFalse((await self._presence())[0]['online'])
+
+    async def test_slow_requests_do_not_hold_up_later_ones(self):
+        release = threading.Event()
+
+        def slow_events(data, request):
+            release.wait(5)
+            return {'results': []}, 200
+
+        communicator = self._connect()
+        await communicator.connect()
+        await communicator.receive_json_from()  # config
+        with mock.patch.dict(STATION_LINK_HANDLERS, {'events': slow_events}):
+            await communicator.send_json_to({'type': 'events', 'id': 'batch', 'data': {'events': []}})
+            await communicator.send_json_to({
+                'type': 'scan', 'id': 'scan', 'data': {'rfid': 'RFID-555', 'station_mode': 'ready'},
+            })
+            first = await communicator.receive_json_from(timeout=2)
+            release.set()
+            second = await communicator.receive_json_from(timeout=2)
+        self.assertEqual((first['id'], second['id']), ('scan', 'batch'))
+        await communicator.disconnect()
+
+    async def test_bad_token_and_unknown_station_are_refused(self):
+        for communicator, code in (
+            (self._connect(token='wrong'), 4401),
+            (WebsocketCommunicator(  # Not accepted in the URL
+                URLRouter(websocket_urlpatterns), '/ws/station/station1/control/?token=link-secret&ip=192.168.1.10',
+            ), 4401),
+            (self._connect(ip='10.9.9.9'), 4404),
+        ):
+            await communicator.connect()
+            self.assertEqual((await communicator.receive_output())['code'], code)
+        self.assertFalse((await self._presence())[0]['online'])
+
+
+class AuditWriterTests(TestCase):
+    def _entry(self, n):
+        return AuditLog(action='controller_updated', target_type='Controller', target_id=n,
+                        description=f'Change {n}')
+
+    def test_writes_synchronously_until_started(self):
+        writer = AuditWriter()
+        writer.record(self._entry(1))
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_started_writer_batches_committed_entries_and_flushes_on_stop(self):
+        writer = AuditWriter(flush_interval=3600, batch_size=1000)
+        writer.start()
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                for n in range(5):
+                    writer.record(self._entry(n))
+            # Queued, not yet written
+            self.assertEqual(AuditLog.objects.count(), 0)
+        finally:
+            with CaptureQueriesContext(connection) as queries:
+                writer.stop()
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sorted(AuditLog.objects.values_list('target_id', flat=True)), [0, 1, 2, 3, 4])
+
+    def test_rolled_back_actions_are_not_audited(self):
+        writer = AuditWriter(flush_interval=3600)
+        writer.start()
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        writer.record(self._entry(1))
+                        raise RuntimeError('action failed')
+                except RuntimeError:
+                    pass
+        finally:
+            writer.stop()
+        self.assertFalse(AuditLog.objects.exists())
+
+
+class AuditLogQueryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.client.force_login(self.admin)
+        base = timezone.now() - timedelta(days=2)
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.admin, action='session_points_updated', target_type='PendingSignup',
+                     target_id=7, description=f'Points for Team Rocket set to {10 * i}',
+                     metadata={'points': 10 * i}, created_at=base + timedelta(hours=i))
+            for i in range(4)
+        ] + [
+            AuditLog(action='controller_updated', target_type='Controller', target_id=1,
+                     description='Updated Gate', metadata={'changed': ['station_minutes']},
+                     created_at=base + timedelta(hours=5)),
+        ])
+
+    def _page(self, **params):
+        response = self.client.get(reverse('audit-log-list'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_filters(self):
+        self.assertEqual(len(self._page(action='session_points_updated')), 4)
+        self.assertEqual(len(self._page(action='session_points_updated,controller_updated')), 5)
+        self.assertEqual(len(self._page(user='admin')), 4)
+        self.assertEqual([row['action'] for row in self._page(user='System')], ['controller_updated'])
+        self.assertEqual(len(self._page(target_type='PendingSignup', target_id=7)), 4)
+        self.assertEqual(self._page(date_from=timezone.localdate().isoformat()), [])
+
+    def test_keyset_pages_cover_the_log_once_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            body = self._page(page_size=2, **({'cursor': cursor} if cursor else {}))
+            ids += [row['id'] for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        expected = list(AuditLog.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_full_text_search_over_description_and_metadata(self):
+        self.assertEqual(len(self._page(q='rocket')), 4)
+        self.assertEqual(len(self._page(q='Team Rock')), 4)  # Words match as prefixes
+        self.assertEqual([row['description'] for row in self._page(q='station_minutes')], ['Updated Gate'])
+        self.assertEqual(self._page(q='rocket gate'), [])
+        # FTS5 syntax in the input is treated as text
+        self.assertEqual(len(self._page(q='"rocket" (set* ^')), 4)
+
+    def test_search_index_follows_edits_and_deletes(self):
+        entry = AuditLog.objects.get(action='controller_updated')
+        entry.description = 'Renamed Vault'
+        entry.save()
+        self.assertEqual(self._page(q='gate'), [])
+        self.assertEqual(len(self._page(q='vault')), 1)
+        entry.delete()
+        self.assertEqual(self._page(q='vault'), [])
+
+    def test_filtered_page_uses_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are SQLite-specific.')
+        queryset = AuditLog.objects.filter(action='session_points_updated').order_by('-created_at', '-id')[:50]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('audit_action_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_malformed_parameters_are_rejected(self):
+        for params in ({'target_id': 'x'}, {'limit': 'all'}, {'cursor': 'bad'}):
+            response = self.client.get(reverse('audit-log-list'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class AuditArchiveTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.client.force_login(self.admin)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(
+            AUDIT_ARCHIVE_DIR=archive_dir.name,
+            AUDIT_RETENTION_DAYS=30,
+            AUDIT_RETENTION_BY_ACTION={'session_points_updated': 7, 'settings_updated': 0},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        now = timezone.now()
+        self.entries = {}
+        for name, action, days in (
+            ('recent', 'controller_updated', 1),
+            ('old', 'controller_updated', 40),
+            ('older', 'controller_updated', 70),
+            ('points', 'session_points_updated', 10),
+            ('settings', 'settings_updated', 400),
+        ):
+            self.entries[name] = AuditLog.objects.create(
+                user=self.admin, action=action, description=f'Entry {name}',
+                metadata={'name': name}, created_at=now - timedelta(days=days),
+            )
+
+    def test_entries_past_retention_move_to_monthly_archives(self):
+        archived, done = archive_audit_log()
+        self.assertEqual((archived, done), (3, True))
+        self.assertCountEqual(
+            AuditLog.objects.values_list('description', flat=True), ['Entry recent', 'Entry settings'],
+        )
+        months = archive_months()
+        self.assertTrue(months)
+        archived_names = [r['metadata']['name'] for month in months for r in read_month(month)]
+        self.assertCountEqual(archived_names, ['old', 'older', 'points'])
+        # Archived rows left the full-text index with the table
+        response = self.client.get(reverse('audit-log-list'), {'q': 'older'})
+        self.assertEqual(response.json(), [])
+
+    def test_archives_are_queryable_through_the_api(self):
+        archive_audit_log()
+        response = self.client.get(reverse('audit-log-list'), {'source': 'archive', 'q': 'older'})
+        [entry] = response.json()
+        self.assertEqual(entry['id'], self.entries['older'].id)
+        self.assertTrue(entry['archived'])
+        self.assertEqual(entry['action_display'], 'Controller Updated')
+
+        ids, cursor = [], None
+        while True:
+            params = {'source': 'archive', 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.client.get(reverse('audit-log-list'), params).json()
+            ids += [row['id'] for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, [self.entries[n].id for n in ('points', 'old', 'older')])
+
+        archives = self.client.get(reverse('audit-log-archives')).json()
+        self.assertEqual([a['month'] for a in archives], archive_months())
+        download = self.client.get(reverse('audit-log-archive-download', args=[archives[0]['month']]))
+        self.assertEqual(download['Content-Type'], 'application/gzip')
+        missing = self.client.get(reverse('audit-log-archive-download', args=['1999-01']))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_passes_are_bounded_and_replays_are_deduplicated(self):
+        self.assertEqual(archive_audit_log(batch_size=1, max_batches=2), (2, False))
+        self.assertEqual(archive_audit_log(batch_size=1), (1, True))
+        # A crash between writing and deleting leaves a batch in both places.
+        month = archive_months()[0]
+        with open(archive_path(month), 'rb') as f:
+            data = f.read()
+        with open(archive_path(month), 'ab') as f:
+            f.write(data)
+        ids = [r['id'] for r in read_month(month)]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_months_are_streamed_newest_first_and_read_only_as_far_as_needed(self):
+        def record(entry_id, day):
+            return {'id': entry_id, 'user': 'admin', 'action': 'controller_updated', 'target_type': '',
+                    'target_id': None, 'description': f'Entry {entry_id}', 'metadata': {},
+                    'created_at': f'2020-01-{day:02d}T12:00:00+00:00'}
+
+        # Batches arrive in roughly time order; a later action-specific expiry can overlap earlier ones.
+        audit_archive._append('2020-01', [record(1, 1), record(2, 3)])
+        audit_archive._append('2020-01', [record(3, 2), record(4, 5)])
+        audit_archive._append('2020-01', [record(5, 10), record(6, 12)])
+        self.assertEqual([r['id'] for r in read_month('2020-01')], [6, 5, 4, 2, 3, 1])
+
+        with mock.patch.object(audit_archive, '_read_member', wraps=audit_archive._read_member) as read:
+            filters = {'actions': [], 'user': '', 'target_type': '', 'target_id': None,
+                       'start': None, 'end': None, 'q': ''}
+            page = audit_archive.search_archive(filters, 2)
+            self.assertEqual([r['id'] for r in page], [6, 5])
+            self.assertEqual(read.call_count, 1)
+            read.reset_mock()
+            page = audit_archive.search_archive(filters, 2, after=audit_archive.archive_sort_key(page[-1]))
+            self.assertEqual([r['id'] for r in page], [4, 2])
+            self.assertEqual(read.call_count, 2)
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123',
+        )
+        self.client.force_login(self.admin)
+        self.storyline = Storyline.objects.create(title='Lost Temple')
+        controllers = [
+            Controller.objects.create(name=f'Station {i}', ip_address=f'10.0.0.{i}') for i in range(1, 3)
+        ]
+        for i in range(3):
+            session = PendingSignup.objects.create(
+                party_name=f'Team {i}', email=f'team{i}@example.com', receive_offers=i != 1,
+                status='ended', storyline=self.storyline, points=10 * i,
+                approved_at=timezone.now() - timedelta(hours=2),
+                ended_at=timezone.now() - timedelta(hours=1, minutes=i),
+            )
+            for controller in controllers[:i]:
+                Checkpoint.objects.create(session=session, controller=controller,
+                                          elapsed_seconds=95, points_earned=25)
+
+    def _csv(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+
+    def test_subscribers_export_streams_filtered_rows(self):
+        rows = self._csv(self.client.get(reverse('email-subscribers-csv')))
+        self.assertEqual(rows[0][:2], ['Party Name', 'Email'])
+        self.assertEqual([row[0] for row in rows[1:]], ['Team 2', 'Team 0'])
+        rows = self._csv(self.client.get(reverse('email-subscribers-csv'), {'q': 'team 2'}))
+        self.assertEqual(len(rows), 2)
+
+    def test_ended_sessions_export_includes_checkpoints_in_two_queries(self):
+        response = self.client.get(reverse('ended-sessions-csv'))
+        with CaptureQueriesContext(connection) as queries:
+            rows = self._csv(response)
+        # Sessions (with storyline), then one checkpoint prefetch per chunk
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual(rows[1][0], 'Team 0')
+        team_2 = rows[3]
+        self.assertEqual(team_2[3], 'Lost Temple')
+        self.assertEqual(team_2[8], '2')
+        self.assertEqual(team_2[9], 'Station 1 (1:35, 25 pts); Station 2 (1:35, 25 pts)')
+
+    def test_header_is_sent_before_the_query_runs(self):
+        response = self.client.get(reverse('audit-log-csv'))
+        with CaptureQueriesContext(connection) as queries:
+            header = next(iter(response.streaming_content))
+        self.assertTrue(header.startswith(b'Date,User,Action'))
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_audit_log_export_applies_filters(self):
+        AuditLog.objects.create(user=self.admin, action='settings_updated', description='Changed theme',
+                                metadata={'field': 'theme'})
+        AuditLog.objects.create(action='controller_updated', description='Updated Gate')
+        rows = self._csv(self.client.get(reverse('audit-log-csv'), {'action': 'settings_updated'}))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1:3], ['admin', 'settings_updated'])
+        self.assertEqual(json.loads(rows[1][6]), {'field': 'theme'})
+
+    def test_asgi_requests_get_an_async_stream(self):
+        request = AsyncRequestFactory().get('/export/')
+        response = streaming_csv_response(request, 'rows.csv', ['n'], ([n] for n in range(3)))
+        self.assertTrue(response.is_async)
+
+        async def consume():
+            return b''.join([chunk async for chunk in response])
+
+        self.assertEqual(async_to_sync(consume)().decode('utf-8').split(), ['n', '0', '1', '2'])
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Keep serializers from queueing work on the process-wide pool.
+        lazy_schedule = mock.patch('accounts.images.schedule_derivatives')
+        self.lazy_schedule = lazy_schedule.start()
+        self.addCleanup(lazy_schedule.stop)
+
+    def _upload(self, name='photo.jpg', size=(2000, 1500), mode='RGB', fmt='JPEG'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 40, 40, 128)[:len(mode)]).save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+    def _dimensions(self, name):
+        with default_storage.open(name, 'rb') as f:
+            return Image.open(f).size
+
+    def test_upload_queues_derivatives_after_commit(self):
+        with mock.patch('accounts.signals.schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('public-signup'), {
+                    'party_name': 'Team Photo', 'profile_photo': self._upload(),
+                })
+            self.assertEqual(response.status_code, 201)
+            signup = PendingSignup.objects.get(party_name='Team Photo')
+            schedule.assert_called_once()
+            self.assertEqual(schedule.call_args[0][0], signup.profile_photo.name)
+
+            # Saves that don't upload a new image queue nothing.
+            schedule.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                signup.points = 10
+                signup.save()
+            schedule.assert_not_called()
+
+    def test_sizes_are_resized_without_upscaling(self):
+        name = default_storage.save('signups/photo.jpg', self._upload())
+        generate_derivatives(name)
+        # Sized by the short side, since clients crop them into squares.
+        self.assertEqual(self._dimensions(derivative_name(name, 'medium', 'webp')), (1067, 800))
+        self.assertEqual(self._dimensions(derivative_name(name, 'thumb', 'jpeg')), (171, 128))
+
+        small = default_storage.save('signups/small.png', self._upload('small.png', (100, 50), 'RGBA', 'PNG'))
+        generate_derivatives(small)
+        # Transparent PNGs keep alpha in WebP and are flattened for JPEG.
+        with default_storage.open(derivative_name(small, 'medium', 'jpeg'), 'rb') as f:
+            image = Image.open(f)
+            self.assertEqual((image.size, image.mode), ((100, 50), 'RGB'))
+
+    def test_serializers_expose_sizes_once_generated(self):
+        storyline = Storyline.objects.create(title='Lost Temple', image=self._upload('temple.jpg'))
+        pool = DerivativePool(workers=1)
+        with mock.patch('accounts.images.derivative_pool', pool):
+            self.assertEqual(image_sizes(storyline.image), {})
+            self.lazy_schedule.assert_called_once()
+            pool._generate(storyline.image.name)
+            sizes = image_sizes(storyline.image)
+        self.assertEqual(set(sizes), {'thumb', 'small', 'medium'})
+        self.assertTrue(sizes['thumb']['webp'].endswith('/derivatives/temple_thumb.webp'))
+        self.assertTrue(sizes['thumb']['jpeg'].endswith('/derivatives/temple_thumb.jpg'))
+
+    def test_pool_generates_each_image_once_and_skips_unreadable_ones(self):
+        name = default_storage.save('storylines/temple.jpg', self._upload())
+        broken = default_storage.save('storylines/broken.jpg', SimpleUploadedFile('broken.jpg', b'not an image'))
+        done = []
+        pool = DerivativePool(workers=1)
+        future = pool.submit(name, on_done=lambda: done.append(name))
+        future.result(timeout=30)
+        self.assertEqual(done, [name])
+        self.assertTrue(pool.is_ready(name))
+
+        pool.submit(broken).result(timeout=30)
+        self.assertFalse(pool.is_ready(broken))
+        self.assertIsNone(pool.submit(broken))  # Not retried until the backoff passes
+
+        later = time.monotonic() + 61
+        with mock.patch('accounts.images.time.monotonic', return_value=later):
+            pool.submit(broken).result(timeout=30)
+        # The second failure backs off twice as long.
+        with mock.patch('accounts.images.time.monotonic', return_value=later + 61):
+            self.assertIsNone(pool.submit(broken))
+        with mock.patch('accounts.images.time.monotonic', return_value=later + 121):
+            self.assertIsNotNone(pool.submit(broken))
+
+    def test_missing_derivatives_are_not_looked_up_again_within_the_ttl(self):
+        name = 'storylines/pending.jpg'
+        pool = DerivativePool(workers=1)
+        storage = mock.Mock(exists=mock.Mock(return_value=False))
+        now = time.monotonic()
+        with mock.patch('accounts.images.time.monotonic', return_value=now):
+            self.assertFalse(pool.is_ready(name, storage))
+            self.assertFalse(pool.is_ready(name, storage))
+        self.assertEqual(storage.exists.call_count, 1)
+        with mock.patch('accounts.images.time.monotonic', return_value=now + 31):
+            storage.exists.return_value = True
+            self.assertTrue(pool.is_ready(name, storage))
+        self.assertEqual(storage.exists.call_count, 2)
+
+    def test_pool_runs_callbacks_once_per_drain(self):
+        release = threading.Event()
+        changed = mock.Mock()
+        pool = DerivativePool(workers=1)
+        with mock.patch('accounts.images.generate_derivatives', side_effect=lambda name: release.wait(30)):
+            futures = [pool.submit(f'signups/team{i}.jpg', on_done=changed) for i in range(3)]
+            self.assertIsNone(pool.submit('signups/team0.jpg', on_done=changed))
+            changed.assert_not_called()
+            release.set()
+            for future in futures:
+                future.result(timeout=30)
+        changed.assert_called_once_with()
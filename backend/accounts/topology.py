@@ -0,0 +1,92 @@
+"""
+Process-local cache of the arena's controller layout.
+
+The controller set changes rarely (a station is added or re-addressed),
+but every RFID scan needs it to resolve the scanning station by IP and to
+work out per-station time. ``get_topology()`` serves an immutable snapshot
+built from the ``Controller`` table; ``accounts.signals`` invalidates it
+whenever a routing-relevant field is saved or a controller is deleted, so
+scans run without any controller queries.
+
+The cached ``Controller`` instances are shared between requests: read them,
+never modify or save them.
+"""
+import threading
+import time
+
+from .models import Controller
+
+# Controller fields that affect scan routing or what stations display.
+# Saves that touch none of these (health reports) keep the cached topology.
+ROUTING_FIELDS = frozenset({
+    'name', 'ip_address', 'station_host', 'station_port',
+    'station_minutes', 'is_start', 'is_end', 'hint_audio',
+})
+
+
+class ArenaTopology:
+    """Immutable view of all controllers, indexed for scan-time lookups."""
+
+    def __init__(self, controllers, version):
+        self.version = version
+        self.controllers = tuple(controllers)
+        self.by_id = {c.id: c for c in self.controllers}
+        self.by_ip = {c.ip_address: c for c in self.controllers}
+        self.start_ids = frozenset(c.id for c in self.controllers if c.is_start)
+        self.end_ids = frozenset(c.id for c in self.controllers if c.is_end)
+
+    @property
+    def count(self):
+        return len(self.controllers)
+
+    def get(self, pk):
+        """Return the controller with this id, or None."""
+        try:
+            return self.by_id.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def for_ip(self, ip_address):
+        """Return the controller registered at this IP, or None."""
+        if not ip_address:
+            return None
+        return self.by_ip.get(ip_address)
+
+    def station_seconds(self, session, controller=None):
+        """Return station duration in seconds for a specific controller."""
+        if controller and getattr(controller, 'station_minutes', None):
+            return max(1, int(controller.station_minutes) * 60)
+        return max(1, (session.session_minutes * 60) // (self.count or 1))
+
+
+_lock = threading.Lock()
+_topology = None
+# Seeded from the clock so versions never repeat across restarts.
+_version = time.time_ns()
+
+
+def get_topology():
+    """Return the current topology, building it on first use after a change."""
+    global _topology
+    topology = _topology
+    if topology is not None:
+        return topology
+
+    with _lock:
+        if _topology is not None:
+            return _topology
+        version = _version
+    topology = ArenaTopology(Controller.objects.order_by('id'), version)
+    with _lock:
+        # Only publish it if nothing was invalidated while we were querying.
+        if version == _version:
+            _topology = topology
+    return topology
+
+
+def invalidate_topology():
+    """Drop the cached topology; the next lookup rebuilds it."""
+    global _topology, _version
+    with _lock:
+        _version += 1
+        _topology = None
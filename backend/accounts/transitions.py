@@ -0,0 +1,249 @@
+"""
+Transactional session state transitions driven by RFID scans.
+
+Start, stop, checkpoint and end each run in one transaction that locks the
+session row first (``select_for_update``), so a double-tapped button or a
+retried request from a station is serialized behind the first one and sees
+its result instead of repeating it. Counters are changed with ``F()``
+expressions in a single conditional UPDATE rather than read-modify-save,
+and the unique (session, controller) constraint decides which request
+records a checkpoint.
+
+``QuerySet.update()`` sends no model signals, so every transition that
+changes what the leaderboard shows schedules ``leaderboard_changed``
+itself.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status
+
+from .leaderboard import leaderboard_changed
+from .models import Checkpoint, PendingSignup
+from .topology import get_topology
+
+
+class TransitionError(Exception):
+    """A scan that cannot be applied; carries the API error response."""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST, **extra):
+        super().__init__(message)
+        self.status_code = status_code
+        self.data = {'error': message, **extra}
+
+
+def _lock_active_session(rfid, not_found_message):
+    try:
+        return (
+            PendingSignup.objects
+            .select_for_update(of=('self',))
+            .select_related('storyline')
+            .get(rfid_tag=rfid, status='approved')
+        )
+    except PendingSignup.DoesNotExist:
+        raise TransitionError(not_found_message, status.HTTP_404_NOT_FOUND)
+
+
+def _record_checkpoint(session, controller, elapsed_seconds, points_earned, cleared_at):
+    """Insert the checkpoint; return it, or None if the station was already cleared."""
+    try:
+        with transaction.atomic():
+            return Checkpoint.objects.create(
+                session=session,
+                controller=controller,
+                cleared_at=cleared_at,
+                elapsed_seconds=elapsed_seconds,
+                points_earned=points_earned,
+            )
+    except IntegrityError:
+        return None
+
+
+def start_session(rfid, controller=None, now=None):
+    """Start or resume the session timer at a station.
+
+    Returns the session with its timer fields updated in memory.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        p = _lock_active_session(rfid, 'No approved session found for this RFID tag.')
+        identity = {'session_id': p.id, 'party_name': p.party_name}
+
+        if p.get_remaining_seconds() <= 0:
+            raise TransitionError('Session time has expired.', **identity)
+
+        # Prevent a session from being started at another station while it is
+        # already active somewhere else. A station must be completed (stop) first.
+        if p.is_playing:
+            raise TransitionError(
+                'Session is already active at another station. Complete the current station before starting a new one.',
+                error_code='session_already_active', **identity,
+            )
+
+        # Prevent replaying a station already completed in this session.
+        if controller and Checkpoint.objects.filter(session=p, controller=controller).exists():
+            raise TransitionError(
+                f'Station "{controller.name}" already completed for this session. Go to a new station.',
+                error_code='station_already_completed',
+                controller_name=controller.name,
+                controller_ip=controller.ip_address,
+                **identity,
+            )
+
+        PendingSignup.objects.filter(pk=p.pk, is_playing=False).update(
+            started_at=Coalesce(F('started_at'), Value(now)),
+            last_started_at=now,
+            is_playing=True,
+        )
+        p.started_at = p.started_at or now
+        p.last_started_at = now
+        p.is_playing = True
+    return p
+
+
+def stop_session(rfid, controller=None, now=None):
+    """Pause the timer at a station, record its checkpoint and award its points.
+
+    Points for the station are the seconds left on its countdown. The
+    session ends once every controller has a checkpoint. Returns a dict
+    describing the outcome; the session's fields are updated in memory.
+    """
+    now = now or timezone.now()
+    topology = get_topology()
+    with transaction.atomic():
+        p = _lock_active_session(rfid, 'No active session found for this RFID tag.')
+
+        station_elapsed = 0
+        if p.is_playing and p.last_started_at:
+            station_elapsed = max(0, int((now - p.last_started_at).total_seconds()))
+
+        total_controllers = topology.count or 1
+        per_station_seconds = topology.station_seconds(p, controller)
+        station_remaining = max(0, per_station_seconds - station_elapsed)
+        # 1 second remaining equals 1 point.
+        station_points = station_remaining
+
+        checkpoint = None
+        if controller:
+            checkpoint = _record_checkpoint(p, controller, station_elapsed, station_points, now)
+        points_awarded = station_points if checkpoint else 0
+
+        # Progress is based on unique controllers cleared (not visit order).
+        checkpoints_cleared = Checkpoint.objects.filter(session=p).count()
+        # End only when all stations/controllers are completed.
+        session_ended = total_controllers > 0 and checkpoints_cleared >= total_controllers
+
+        changes = {
+            'total_elapsed_seconds': F('total_elapsed_seconds') + station_elapsed,
+            'points': F('points') + points_awarded,
+            'is_playing': False,
+            'last_started_at': None,
+            'current_controller_index': checkpoints_cleared,
+        }
+        if session_ended:
+            changes.update(status='ended', ended_at=now)
+        PendingSignup.objects.filter(pk=p.pk, status='approved').update(**changes)
+        transaction.on_commit(leaderboard_changed)
+
+    p.total_elapsed_seconds += station_elapsed
+    p.points += points_awarded
+    p.is_playing = False
+    p.last_started_at = None
+    p.current_controller_index = checkpoints_cleared
+    if session_ended:
+        p.status = 'ended'
+        p.ended_at = now
+    return {
+        'session': p,
+        'session_ended': session_ended,
+        'station_elapsed_seconds': station_elapsed,
+        'station_remaining_seconds': station_remaining,
+        'station_points': station_points,
+        'per_station_seconds': per_station_seconds,
+        'total_controllers': total_controllers,
+        'checkpoints_cleared': checkpoints_cleared,
+        'checkpoint_created': checkpoint is not None,
+    }
+
+
+def _award_checkpoint(p, controller, now):
+    # Manual checkpoints get the full station points.
+    points_earned = get_topology().station_seconds(p, controller)
+    checkpoint = _record_checkpoint(p, controller, 0, points_earned, now)
+    if checkpoint is None:
+        return Checkpoint.objects.get(session=p, controller=controller), False
+
+    PendingSignup.objects.filter(pk=p.pk).update(points=F('points') + points_earned)
+    transaction.on_commit(leaderboard_changed)
+    p.points += points_earned
+    return checkpoint, True
+
+
+def clear_checkpoint(rfid, controller, now=None):
+    """Record a cleared station for the active session with this tag.
+
+    Returns ``(session, checkpoint, created)``. An unknown session is
+    reported before an unknown ``controller`` (None).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        p = _lock_active_session(rfid, 'No active session found for this RFID tag.')
+        if controller is None:
+            raise TransitionError('Controller not found for the given IP.', status.HTTP_404_NOT_FOUND)
+        checkpoint, created = _award_checkpoint(p, controller, now)
+    return p, checkpoint, created
+
+
+def add_checkpoint(pk, controller):
+    """Record a cleared station for any session (staff correction).
+
+    Returns ``(session, checkpoint, created)``, or raises
+    ``PendingSignup.DoesNotExist``.
+    """
+    with transaction.atomic():
+        p = PendingSignup.objects.select_for_update().get(pk=pk)
+        checkpoint, created = _award_checkpoint(p, controller, timezone.now())
+    return p, checkpoint, created
+
+
+def remove_checkpoint(checkpoint):
+    """Delete a checkpoint and take back the points it earned.
+
+    Returns the session's new point total.
+    """
+    with transaction.atomic():
+        p = PendingSignup.objects.select_for_update().get(pk=checkpoint.session_id)
+        deducted = min(p.points, checkpoint.points_earned)
+        if deducted:
+            PendingSignup.objects.filter(pk=p.pk).update(points=F('points') - deducted)
+        # The delete's post_delete signal schedules the leaderboard update.
+        checkpoint.delete()
+    return p.points - deducted
+
+
+def end_session(pk, now=None):
+    """End a session now, banking the time of a station in progress.
+
+    Returns the session, or raises ``PendingSignup.DoesNotExist``.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        p = PendingSignup.objects.select_for_update().get(pk=pk)
+        elapsed = 0
+        if p.is_playing and p.last_started_at:
+            elapsed = max(0, int((now - p.last_started_at).total_seconds()))
+        PendingSignup.objects.filter(pk=pk).update(
+            status='ended',
+            ended_at=now,
+            total_elapsed_seconds=F('total_elapsed_seconds') + elapsed,
+            is_playing=False,
+            last_started_at=None,
+        )
+        transaction.on_commit(leaderboard_changed)
+    p.status = 'ended'
+    p.ended_at = now
+    p.total_elapsed_seconds += elapsed
+    p.is_playing = False
+    p.last_started_at = None
+    return p
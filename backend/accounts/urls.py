@@ -16,8 +16,10 @@ urlpatterns = [
     path('dashboard-theme/', views.dashboard_theme_view, name='dashboard-theme'),
     path('app-theme/', views.app_theme_view, name='app-theme'),
     path('controllers/', views.controller_list_create, name='controller-list-create'),
+    path('controllers/presence/', views.controller_presence, name='controller-presence'),
     path('controllers/<int:pk>/', views.controller_detail, name='controller-detail'),
     path('controllers/<int:pk>/restart-service/', views.controller_restart_service, name='controller-restart-service'),
+    path('controllers/<int:pk>/metrics/', views.controller_metrics, name='controller-metrics'),
     path('controller-test/', views.controller_test_page, name='controller-test'),
 
     # Pending Signup
@@ -29,6 +31,7 @@ urlpatterns = [
     # Sessions
     path('sessions/live/', views.live_sessions, name='live-sessions'),
     path('sessions/ended/', views.ended_sessions, name='ended-sessions'),
+    path('sessions/ended/csv/', views.ended_sessions_csv, name='ended-sessions-csv'),
     path('sessions/<int:pk>/end/', views.end_session, name='end-session'),
     path('sessions/<int:pk>/update/', views.update_session, name='update-session'),
     path('sessions/<int:pk>/checkpoints/add/', views.add_checkpoint, name='add-checkpoint'),
@@ -40,11 +43,17 @@ urlpatterns = [
     path('rfid/checkpoint/', views.rfid_checkpoint, name='rfid-checkpoint'),
     path('rfid/status/', views.rfid_status, name='rfid-status'),
     path('rfid/check-staff/', views.rfid_check_staff, name='rfid-check-staff'),
+    path('rfid/staff-tags/', views.rfid_staff_tags, name='rfid-staff-tags'),
+    path('rfid/scan/', views.rfid_scan, name='rfid-scan'),
     path('rfid/station-recent/', views.station_recent_scans, name='station-recent-scans'),
     path('rfid-test/', views.rfid_test_page, name='rfid-test'),
 
     # Station health reporting (called by station hardware)
     path('controllers/health/', views.controller_health_update, name='controller-health-update'),
+    path('controllers/health/batch/', views.controller_health_batch, name='controller-health-batch'),
+
+    # Station offline journal replay (called by station hardware)
+    path('stations/events/', views.station_event_batch, name='station-event-batch'),
 
     # Public leaderboard
     path('public/leaderboard/', views.public_leaderboard, name='public-leaderboard'),
@@ -61,6 +70,9 @@ urlpatterns = [
 
     # Audit log
     path('audit-logs/', views.audit_log_list, name='audit-log-list'),
+    path('audit-logs/csv/', views.audit_log_csv, name='audit-log-csv'),
+    path('audit-logs/archives/', views.audit_log_archives, name='audit-log-archives'),
+    path('audit-logs/archives/<str:month>/', views.audit_log_archive_download, name='audit-log-archive-download'),
 
     # Email subscribers
     path('email-subscribers/', views.email_subscribers, name='email-subscribers'),
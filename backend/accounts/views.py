@@ -1,6 +1,12 @@
+import hashlib
+from functools import wraps
+
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view, permission_classes, parser_classes, authentication_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -8,27 +14,83 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .models import Storyline, GeneralSetting, DashboardTheme, AppTheme, Controller, PendingSignup, Checkpoint, StaffProfile, AuditLog
+from .leaderboard import (
+    CHECKPOINTS_PREFETCH, filter_leaderboard_entries, get_leaderboard_snapshot, leaderboard_sort_key,
+)
+from .audit import audit_writer, filter_audit_log, parse_audit_filters
+from . import audit_archive
+from . import exports
+from .staff_cache import staff_tags_changed
+from .pagination import (
+    InvalidPageRequest, decode_cursor, encode_cursor, filter_queryset, get_page_size, has_list_params,
+    is_paginated, page_data, paginate_list, paginate_queryset,
+)
+from .images import image_sizes
+from .topology import get_topology
+from . import health
+from . import metrics
+from . import station_events
+from . import station_link
+from . import transitions
+from .transitions import TransitionError
 
 
 def _log_action(user, action, target_type='', target_id=None, description='', metadata=None):
-    """Helper to create an audit log entry."""
-    AuditLog.objects.create(
+    """Helper to record an audit log entry (written in batches; see accounts.audit)."""
+    audit_writer.record(AuditLog(
         user=user if user and user.is_authenticated else None,
         action=action,
         target_type=target_type,
         target_id=target_id,
         description=description,
         metadata=metadata or {},
-    )
+    ))
+
+
+def _revalidated(etag_func):
+    """Conditional-GET decorator for endpoints that clients poll.
+
+    Place it below the DRF decorators so authentication and permissions run
+    first. A GET whose If-None-Match matches ``etag_func`` gets a 304 before
+    the view body runs. Responses are marked ``no-cache`` so browsers always
+    revalidate with the server instead of reusing a stale copy.
+    """
+    def safe_etag_func(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return etag_func(request, *args, **kwargs)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=safe_etag_func)(view)
 
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
 
-def _get_station_seconds(session, controller=None):
-    """Return station duration in seconds for a specific controller."""
-    if controller and getattr(controller, 'station_minutes', None):
-        return max(1, int(controller.station_minutes) * 60)
 
-    total_controllers = Controller.objects.count() or 1
-    return max(1, (session.session_minutes * 60) // total_controllers)
+def _etag_from(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _list_response(request, queryset, ordering, serialize, date_field, status_field=None):
+    """Filter and serialize a list endpoint's queryset (see accounts.pagination).
+
+    Returns the whole filtered list unless the client asked for a page.
+    """
+    try:
+        queryset = filter_queryset(queryset, request, date_field, status_field=status_field)
+        if not is_paginated(request):
+            queryset = queryset.order_by(*[f'-{name}' if desc else name for name, desc in ordering])
+            return Response([serialize(obj) for obj in queryset])
+        rows, next_cursor = paginate_queryset(queryset, request, ordering)
+    except InvalidPageRequest as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(page_data([serialize(obj) for obj in rows], next_cursor))
 
 
 @api_view(['GET'])
@@ -92,6 +154,7 @@ def me_view(request):
         'is_superuser': user.is_superuser,
         'is_staff': user.is_staff,
         'profile_picture': profile_picture_url,
+        'profile_picture_sizes': image_sizes(staff_profile.profile_picture, request),
     })
 
 
@@ -115,6 +178,7 @@ def _serialize_user(u, request=None):
         'is_active': u.is_active,
         'rfid_tag': staff_profile.rfid_tag,
         'profile_picture': profile_picture_url,
+        'profile_picture_sizes': image_sizes(staff_profile.profile_picture, request),
     }
 
 
@@ -159,6 +223,8 @@ def staff_list_create(request):
     if profile_picture:
         staff_profile.profile_picture = profile_picture
     staff_profile.save()
+    # Stations may have cached the new tag as "not staff"
+    staff_tags_changed(rfid_tag)
     
     _log_action(request.user, 'staff_created', 'User', user.id, f'Created staff user "{username}"')
     return Response(_serialize_user(user, request), status=status.HTTP_201_CREATED)
@@ -180,6 +246,7 @@ def staff_detail(request, pk):
 
     if request.method == 'PUT':
         data = request.data
+        was_staff = user.is_active and user.is_staff
         user.first_name = data.get('first_name', user.first_name)
         user.last_name = data.get('last_name', user.last_name)
         user.email = data.get('email', user.email)
@@ -193,12 +260,17 @@ def staff_detail(request, pk):
         
         # Update staff profile RFID tag and optional profile picture
         staff_profile, _ = StaffProfile.objects.get_or_create(user=user)
+        old_tag = staff_profile.rfid_tag
         if 'rfid_tag' in data:
             staff_profile.rfid_tag = data.get('rfid_tag', '').strip()
         profile_picture = request.FILES.get('profile_picture')
         if profile_picture:
             staff_profile.profile_picture = profile_picture
         staff_profile.save()
+        if staff_profile.rfid_tag != old_tag:
+            staff_tags_changed(old_tag, staff_profile.rfid_tag)
+        elif (user.is_active and user.is_staff) != was_staff:
+            staff_tags_changed(old_tag)
         
         _log_action(request.user, 'staff_updated', 'User', user.id, f'Updated staff user "{user.username}"')
         return Response(_serialize_user(user, request))
@@ -207,6 +279,9 @@ def staff_detail(request, pk):
         if user.is_superuser:
             return Response({'error': 'Cannot delete a superuser.'}, status=status.HTTP_400_BAD_REQUEST)
         _log_action(request.user, 'staff_deleted', 'User', user.id, f'Deleted staff user "{user.username}"')
+        staff_profile = StaffProfile.objects.filter(user=user).first()
+        if staff_profile:
+            staff_tags_changed(staff_profile.rfid_tag)
         user.delete()
         return Response({'message': 'User deleted.'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -224,6 +299,9 @@ def staff_toggle_block(request, pk):
 
     user.is_active = not user.is_active
     user.save()
+    staff_profile = StaffProfile.objects.filter(user=user).first()
+    if staff_profile:
+        staff_tags_changed(staff_profile.rfid_tag)
     action = 'staff_unblocked' if user.is_active else 'staff_blocked'
     label = 'Unblocked' if user.is_active else 'Blocked'
     _log_action(request.user, action, 'User', user.id, f'{label} user "{user.username}"')
@@ -322,6 +400,7 @@ def _serialize_storyline(s, request=None):
         'text': s.text,
         'hint': s.hint,
         'image': image_url,
+        'image_sizes': image_sizes(s.image, request),
     }
 
 
@@ -473,9 +552,15 @@ def _serialize_app_theme(t, request=None):
     }
 
 
+def _app_theme_etag(request):
+    theme = AppTheme.load()
+    return _etag_from(theme.updated_at.isoformat(), request.build_absolute_uri('/'))
+
+
 @api_view(['GET', 'PUT'])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
+@_revalidated(_app_theme_etag)
 def app_theme_view(request):
     theme = AppTheme.load()
 
@@ -537,9 +622,28 @@ def _serialize_controller(c, request=None):
     }
 
 
+# Columns behind _serialize_controller's output
+_CONTROLLER_RENDERED_FIELDS = (
+    'id', 'name', 'ip_address', 'station_minutes', 'is_start', 'is_end', 'hint_audio',
+    'cpu_usage', 'storage_usage', 'cpu_temperature', 'ram_usage', 'system_uptime',
+    'voltage_power_status',
+)
+
+
+def _controllers_etag(request):
+    """Data version for controller lists, from the fields they render.
+
+    Health reports that repeat the shown values, or only touch
+    ``updated_at``, keep the ETag.
+    """
+    rows = Controller.objects.values_list(*_CONTROLLER_RENDERED_FIELDS)
+    return _etag_from(*rows, request.build_absolute_uri('/'))
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
+@_revalidated(_controllers_etag)
 def controller_list_create(request):
     if request.method == 'GET':
         controllers = Controller.objects.all()
@@ -708,7 +812,8 @@ def controller_health_update(request):
     """Update controller health metrics.
 
     Called periodically by station hardware to report system metrics.
-    Matches controller by IP address.
+    Matches controller by IP address. Stations that buffer samples send
+    them to controllers/health/batch/ instead.
 
     Body: {
         "ip_address": "192.168.1.x",
@@ -720,38 +825,181 @@ def controller_health_update(request):
         "voltage_power_status": "OK (no throttling)"
     }
     """
-    ip_address = request.data.get('ip_address', '').strip()
-    if not ip_address:
-        return Response({'error': 'ip_address is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    body, status_code = _apply_health_metrics(request.data)
+    return Response(body, status=status_code)
 
-    try:
-        controller = Controller.objects.get(ip_address=ip_address)
-    except Controller.DoesNotExist:
-        return Response(
-            {'error': f'No controller found with IP {ip_address}.'},
-            status=status.HTTP_404_NOT_FOUND
-        )
 
-    # Update all provided metric fields
-    metric_fields = [
-        'cpu_usage', 'storage_usage', 'cpu_temperature',
-        'ram_usage', 'system_uptime', 'voltage_power_status'
-    ]
-    updated = []
-    for field in metric_fields:
-        value = request.data.get(field)
-        if value is not None:
-            setattr(controller, field, str(value))
-            updated.append(field)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def controller_health_batch(request):
+    """Ingest several health samples from one station in one request.
 
-    if updated:
-        controller.save(update_fields=updated + ['updated_at'])
+    Body: {
+        "ip_address": "192.168.1.x",
+        "reported_at": <station Unix time when the batch was assembled>,
+        "samples": [
+            { "occurred_at": <station Unix time>, "cpu_usage": "45%", "cpu_percent": 45.0, ... },
+            ...
+        ]
+    }
 
-    return Response({
-        'message': 'Health metrics updated.',
+    Samples take the same fields as controllers/health/. All of them are
+    stored in the controller's health history; the controller's display
+    values are updated from the newest one, and only where they changed
+    enough (see ``accounts.health``).
+    """
+    from django.utils import timezone
+
+    body, status_code = _apply_health_batch(request.data, timezone.now())
+    return Response(body, status=status_code)
+
+
+def _health_controller(data):
+    """Resolve the reporting controller; return ``(controller, error_response)``."""
+    ip_address = str(data.get('ip_address') or '').strip()
+    if not ip_address:
+        return None, ({'error': 'ip_address is required.'}, status.HTTP_400_BAD_REQUEST)
+    controller = get_topology().for_ip(ip_address)
+    if controller is None:
+        return None, ({'error': f'No controller found with IP {ip_address}.'}, status.HTTP_404_NOT_FOUND)
+    return controller, None
+
+
+def _ingest_health_reports(controller, reports):
+    from django.db import transaction
+
+    updated, recorded = health.ingest_health(controller, reports)
+    transaction.on_commit(metrics.maybe_maintain_metrics)
+    return {
+        'message': 'Health metrics updated.' if updated else 'Health metrics unchanged.',
         'controller': controller.name,
         'updated_fields': updated,
-    })
+        'samples_recorded': recorded,
+    }, status.HTTP_200_OK
+
+
+def _apply_health_metrics(data, recorded_at=None):
+    """Store a station's health report; return ``(body, status_code)``."""
+    from django.utils import timezone
+
+    controller, error = _health_controller(data)
+    if error:
+        return error
+    return _ingest_health_reports(controller, [(recorded_at or timezone.now(), data)])
+
+
+def _apply_health_batch(data, received_at):
+    """Store a batch of health samples; return ``(body, status_code)``.
+
+    Sample times are taken relative to ``reported_at`` on the station's
+    clock and placed before ``received_at`` on ours.
+    """
+    controller, error = _health_controller(data)
+    if error:
+        return error
+    samples = data.get('samples')
+    if not isinstance(samples, list) or not samples or not all(isinstance(s, dict) for s in samples):
+        return {'error': 'samples must be a non-empty list of objects.'}, status.HTTP_400_BAD_REQUEST
+    if len(samples) > health.MAX_BATCH_SAMPLES:
+        return (
+            {'error': f'At most {health.MAX_BATCH_SAMPLES} samples per batch.'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    reported_at = data.get('reported_at')
+    reports = [
+        (station_events.event_time(sample.get('occurred_at'), reported_at, received_at), sample)
+        for sample in samples
+    ]
+    return _ingest_health_reports(controller, reports)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def controller_metrics(request, pk):
+    """Health history of one controller, as aligned arrays for charting.
+
+    Query params:
+        since:      ISO 8601 start (default: ``hours`` before ``until``;
+                    clipped to the hourly retention)
+        until:      ISO 8601 end (default and latest: now)
+        hours:      range length when ``since`` is omitted (default 6)
+        resolution: raw | minute | hour (default: chosen from the range;
+                    400 if the range needs more than MAX_POINTS at it)
+        fields:     comma-separated subset of cpu_percent, ram_percent,
+                    disk_percent, temperature, uptime_seconds, throttled
+
+    Returns: {
+        "controller_id", "resolution", "interval", "since", "until",
+        "timestamps": [<unix seconds>, ...],
+        "sample_count": [...],
+        "series": {"cpu_percent": [...], ...}
+    }
+    Every array has one entry per timestamp; rollup buckets without
+    samples are null.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    controller = get_topology().get(pk)
+    if controller is None:
+        return Response({'error': 'Controller not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    params = request.query_params
+
+    def parse_time(name):
+        value = params.get(name)
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f'{name} must be an ISO 8601 datetime.')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    try:
+        until = parse_time('until') or timezone.now()
+        since = parse_time('since')
+        if since is None:
+            try:
+                hours = float(params.get('hours', 6))
+            except ValueError:
+                hours = 0
+            if not 0 < hours < float('inf'):
+                raise ValueError('hours must be a positive number.')
+            since = until - timedelta(hours=hours)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except OverflowError:
+        return Response({'error': 'Time range is out of range.'}, status=status.HTTP_400_BAD_REQUEST)
+    if since >= until:
+        return Response({'error': 'since must be before until.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    resolution = params.get('resolution')
+    if resolution:
+        by_name = {name: value for value, name in metrics.RESOLUTION_NAMES.items()}
+        if resolution not in by_name:
+            return Response(
+                {'error': f'resolution must be one of: {", ".join(by_name)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        resolution = by_name[resolution]
+
+    fields = metrics.METRIC_FIELDS
+    if params.get('fields'):
+        fields = tuple(f.strip() for f in params['fields'].split(',') if f.strip())
+        unknown = [f for f in fields if f not in metrics.METRIC_FIELDS]
+        if unknown or not fields:
+            return Response(
+                {'error': f'Unknown metric field(s): {", ".join(unknown) or "none given"}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    try:
+        return Response(metrics.metric_series(controller, since, until, resolution, fields))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 def controller_test_page(request):
@@ -776,6 +1024,7 @@ def _serialize_pending(p, request=None, include_checkpoints=False):
         'storyline_title': p.storyline.title if p.storyline else '',
         'storyline_hint': p.storyline.hint if p.storyline else '',
         'profile_photo': photo_url,
+        'profile_photo_sizes': image_sizes(p.profile_photo, request),
         'avatar_id': p.avatar_id,
         'rfid_tag': p.rfid_tag,
         'session_minutes': p.session_minutes,
@@ -787,8 +1036,8 @@ def _serialize_pending(p, request=None, include_checkpoints=False):
     }
     
     if include_checkpoints:
-        from .models import Checkpoint
-        checkpoints = Checkpoint.objects.filter(session=p).select_related('controller')
+        # Uses the prefetch cache when the caller loaded checkpoints up front.
+        checkpoints = p.checkpoints.all()
         data['checkpoints'] = [
             {
                 'id': cp.id,
@@ -801,7 +1050,7 @@ def _serialize_pending(p, request=None, include_checkpoints=False):
             }
             for cp in checkpoints
         ]
-        data['checkpoints_cleared'] = checkpoints.count()
+        data['checkpoints_cleared'] = len(checkpoints)
     
     return data
 
@@ -845,9 +1094,15 @@ def public_signup(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def pending_list(request):
-    """List all pending signups for dashboard."""
-    signups = PendingSignup.objects.filter(status='pending')
-    return Response([_serialize_pending(p, request) for p in signups])
+    """List pending signups for dashboard, newest first.
+
+    Accepts the list filters and pagination from accounts.pagination.
+    """
+    signups = PendingSignup.objects.filter(status='pending').select_related('storyline')
+    return _list_response(
+        request, signups, [('created_at', True), ('id', True)],
+        lambda p: _serialize_pending(p, request), date_field='created_at',
+    )
 
 
 @api_view(['POST'])
@@ -897,9 +1152,19 @@ def pending_approve(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def live_sessions(request):
-    """Return approved sessions that still have playtime remaining."""
+    """Return approved sessions that still have playtime remaining.
+
+    Overdue sessions are left for the expiry sweeper (accounts.expiry);
+    this endpoint only reads.
+    """
+    from django.db.models import Q
     from django.utils import timezone
-    approved = PendingSignup.objects.filter(status='approved')
+    approved = (
+        PendingSignup.objects.filter(status='approved')
+        .filter(Q(expires_at__gt=timezone.now()) | Q(expires_at__isnull=True))
+        .select_related('storyline')
+        .prefetch_related(CHECKPOINTS_PREFETCH)
+    )
     live = []
     
     for p in approved:
@@ -913,49 +1178,44 @@ def live_sessions(request):
             data['elapsed_seconds'] = p.get_elapsed_seconds()
             data['is_playing'] = p.is_playing
             live.append(data)
-        else:
-            # Auto-end expired sessions
-            if p.is_playing:
-                # Stop the timer first
-                if p.last_started_at:
-                    elapsed = (timezone.now() - p.last_started_at).total_seconds()
-                    p.total_elapsed_seconds += int(elapsed)
-                p.is_playing = False
-                p.last_started_at = None
-            
-            p.status = 'ended'
-            p.ended_at = timezone.now()
-            p.save(update_fields=['status', 'ended_at', 'total_elapsed_seconds', 'is_playing', 'last_started_at'])
     
     return Response(live)
 
 
+def _ended_sessions_queryset(now):
+    """Ended sessions plus overdue ones the sweeper has not reached yet, with checkpoints."""
+    from django.db.models import Q
+    from django.db.models.functions import Coalesce
+    return (
+        PendingSignup.objects
+        .filter(Q(status='ended') | Q(status='approved', expires_at__lte=now))
+        .annotate(ended_sort=Coalesce('ended_at', 'expires_at', 'approved_at', 'created_at'))
+        .select_related('storyline')
+        .prefetch_related(CHECKPOINTS_PREFETCH)
+    )
+
+
+def _show_as_ended(p):
+    if p.status == 'approved':
+        # Overdue but not swept yet — show it the way the sweeper will record it.
+        p.status = 'ended'
+        p.ended_at = p.expires_at
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def ended_sessions(request):
-    """Return ended sessions."""
+    """Return ended sessions, including overdue ones the sweeper has not reached yet.
+
+    Newest first; accepts the list filters and pagination from
+    accounts.pagination, with the date range applied to the end time.
+    """
     from django.utils import timezone
     now = timezone.now()
-    
-    # Check for any approved sessions that have expired
-    for p in PendingSignup.objects.filter(status='approved'):
-        if p.get_remaining_seconds() <= 0:
-            # Stop timer if playing
-            if p.is_playing and p.last_started_at:
-                elapsed = (now - p.last_started_at).total_seconds()
-                p.total_elapsed_seconds += int(elapsed)
-                p.is_playing = False
-                p.last_started_at = None
-            
-            p.status = 'ended'
-            if not p.ended_at:
-                p.ended_at = now
-            p.save(update_fields=['status', 'ended_at', 'total_elapsed_seconds', 'is_playing', 'last_started_at'])
-    
-    ended = PendingSignup.objects.filter(status='ended').order_by('-ended_at', '-approved_at')
-    result = []
-    
-    for p in ended:
+    ended = _ended_sessions_queryset(now)
+
+    def serialize(p):
+        _show_as_ended(p)
         data = _serialize_pending(p, request, include_checkpoints=True)
         
         # Calculate how long ago it ended
@@ -973,10 +1233,60 @@ def ended_sessions(request):
                 data['ended_ago'] = f'{days} day{"s" if days != 1 else ""} ago'
         else:
             data['ended_ago'] = ''
-        
-        result.append(data)
+        return data
     
-    return Response(result)
+    return _list_response(
+        request, ended, [('ended_sort', True), ('id', True)], serialize, date_field='ended_sort',
+    )
+
+
+def _csv_time(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def _mm_ss(seconds):
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ended_sessions_csv(request):
+    """Export ended sessions and their checkpoints as a streamed CSV file.
+
+    Accepts the same ``q`` and date filters as the ended sessions list.
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+    from django.utils import timezone
+    try:
+        ended = filter_queryset(_ended_sessions_queryset(timezone.now()), request, 'ended_sort')
+    except InvalidPageRequest as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def rows():
+        for p in ended.order_by('-ended_sort', '-id').iterator(chunk_size=exports.CHUNK_ROWS):
+            _show_as_ended(p)
+            checkpoints = p.checkpoints.all()
+            yield [
+                p.party_name,
+                p.email,
+                p.team_size,
+                p.storyline.title if p.storyline else '',
+                p.points,
+                _csv_time(p.approved_at),
+                _csv_time(p.ended_at),
+                _mm_ss(p.total_elapsed_seconds),
+                len(checkpoints),
+                '; '.join(
+                    f'{c.controller.name} ({_mm_ss(c.elapsed_seconds)}, {c.points_earned} pts)'
+                    for c in checkpoints
+                ),
+            ]
+
+    return exports.streaming_csv_response(request, 'ended_sessions.csv', [
+        'Party Name', 'Email', 'Team Size', 'Storyline', 'Points', 'Started', 'Ended',
+        'Time Played', 'Checkpoint Count', 'Checkpoints',
+    ], rows())
 
 
 @api_view(['POST'])
@@ -986,22 +1296,11 @@ def end_session(request, pk):
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
     try:
-        p = PendingSignup.objects.get(pk=pk)
+        # Stops the timer if currently playing
+        p = transitions.end_session(pk)
     except PendingSignup.DoesNotExist:
         return Response({'error': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
     
-    from django.utils import timezone
-    
-    # Stop the timer if currently playing
-    if p.is_playing and p.last_started_at:
-        elapsed = (timezone.now() - p.last_started_at).total_seconds()
-        p.total_elapsed_seconds += int(elapsed)
-        p.is_playing = False
-        p.last_started_at = None
-    
-    p.status = 'ended'
-    p.ended_at = timezone.now()
-    p.save(update_fields=['status', 'ended_at', 'total_elapsed_seconds', 'is_playing', 'last_started_at'])
     _log_action(request.user, 'session_ended', 'PendingSignup', p.id,
                 f'Manually ended session "{p.party_name}"')
     return Response({'message': 'Session ended.'})
@@ -1061,76 +1360,58 @@ def toggle_leaderboard_hidden(request, pk):
     return Response({'ok': True, 'leaderboard_hidden': p.leaderboard_hidden})
 
 
+def _leaderboard_etag(request, include_hidden=False):
+    time_filter = request.query_params.get('filter', 'all')
+    snapshot = get_leaderboard_snapshot(time_filter, request, include_hidden=include_hidden)
+    return _leaderboard_list_etag(request, snapshot)
+
+
+def _leaderboard_list_etag(request, snapshot):
+    if has_list_params(request):
+        return _etag_from(snapshot.etag, request.GET.urlencode())
+    return snapshot.etag
+
+
+def _admin_leaderboard_etag(request):
+    if not request.user.is_superuser:
+        return None
+    return _leaderboard_etag(request, include_hidden=True)
+
+
+def _leaderboard_response(request, snapshot):
+    """Serve a leaderboard snapshot, filtered and paged if the client asked.
+
+    The full board is sent as the pre-rendered body; subsets are cut from
+    the snapshot's entries rather than queried again.
+    """
+    if has_list_params(request):
+        try:
+            entries = filter_leaderboard_entries(snapshot.entries, request)
+            if is_paginated(request):
+                entries, next_cursor = paginate_list(entries, request, leaderboard_sort_key)
+                entries = page_data(entries, next_cursor)
+        except InvalidPageRequest as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response(entries)
+    else:
+        response = HttpResponse(snapshot.body, content_type='application/json')
+    # Tag the body actually sent, in case the board changed after the
+    # conditional check computed its ETag.
+    response['ETag'] = f'"{_leaderboard_list_etag(request, snapshot)}"'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@_revalidated(_admin_leaderboard_etag)
 def admin_leaderboard(request):
     """Admin leaderboard — returns all sessions including leaderboard_hidden ones."""
-    from django.utils import timezone
-    from datetime import timedelta
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
-    now = timezone.now()
-    total_controllers = Controller.objects.count()
     time_filter = request.query_params.get('filter', 'all')
-
-    if time_filter == 'active':
-        sessions = PendingSignup.objects.filter(status='approved').order_by('-points', 'created_at')
-    elif time_filter == '7days':
-        seven_days_ago = now - timedelta(days=7)
-        sessions = PendingSignup.objects.filter(
-            status__in=['approved', 'ended'],
-            created_at__gte=seven_days_ago,
-        ).order_by('-points', 'created_at')
-    else:
-        sessions = PendingSignup.objects.filter(
-            status__in=['approved', 'ended']
-        ).order_by('-points', 'created_at')
-
-    result = []
-    for p in sessions:
-        photo_url = ''
-        if p.profile_photo:
-            photo_url = request.build_absolute_uri(p.profile_photo.url)
-        checkpoints = Checkpoint.objects.filter(session=p).select_related('controller')
-        checkpoints_cleared = checkpoints.count()
-        checkpoint_list = [
-            {
-                'controller_id': cp.controller.id,
-                'controller_name': cp.controller.name,
-                'cleared_at': cp.cleared_at.isoformat(),
-            }
-            for cp in checkpoints
-        ]
-        remaining_minutes = 0
-        session_status = p.status
-        if p.status == 'approved':
-            remaining_seconds = p.get_remaining_seconds()
-            if remaining_seconds > 0:
-                remaining_minutes = remaining_seconds // 60
-                session_status = 'live'
-            else:
-                session_status = 'ended'
-        result.append({
-            'id': p.id,
-            'name': p.party_name,
-            'email': p.email,
-            'team_size': p.team_size,
-            'points': p.points,
-            'profile_photo': photo_url,
-            'avatar_id': p.avatar_id,
-            'storyline_title': p.storyline.title if p.storyline else '',
-            'session_minutes': p.session_minutes,
-            'remaining_minutes': remaining_minutes,
-            'session_status': session_status,
-            'checkpoints_cleared': checkpoints_cleared,
-            'total_controllers': total_controllers,
-            'checkpoints': checkpoint_list,
-            'created_at': p.created_at.isoformat() if p.created_at else '',
-            'approved_at': p.approved_at.isoformat() if p.approved_at else '',
-            'leaderboard_hidden': p.leaderboard_hidden,
-        })
-    return Response(result)
+    snapshot = get_leaderboard_snapshot(time_filter, request, include_hidden=True)
+    return _leaderboard_response(request, snapshot)
 
 
 @api_view(['PUT'])
@@ -1243,41 +1524,22 @@ def add_checkpoint(request, pk):
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
     
-    try:
-        session = PendingSignup.objects.get(pk=pk)
-    except PendingSignup.DoesNotExist:
-        return Response({'error': 'Session not found.'}, status=status.HTTP_404_NOT_FOUND)
-    
     controller_id = request.data.get('controller_id')
     if not controller_id:
         return Response({'error': 'controller_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        controller = Controller.objects.get(pk=controller_id)
-    except Controller.DoesNotExist:
+    controller = get_topology().get(controller_id)
+    if controller is None:
         return Response({'error': 'Controller not found.'}, status=status.HTTP_404_NOT_FOUND)
     
-    # Create or get the checkpoint
-    checkpoint, created = Checkpoint.objects.get_or_create(
-        session=session,
-        controller=controller
-    )
+    # Create or get the checkpoint; a new one gets full station points
+    try:
+        session, checkpoint, created = transitions.add_checkpoint(pk, controller)
+    except PendingSignup.DoesNotExist:
+        return Response({'error': 'Session not found.'}, status=status.HTTP_404_NOT_FOUND)
     
     if created:
-        from django.utils import timezone
-        
-        # Per-station points allocation
-        per_station_seconds = _get_station_seconds(session, controller)
-        # Manual checkpoint gets full station points by default.
-        points_earned = per_station_seconds
-        
-        # Store points in checkpoint
-        checkpoint.points_earned = points_earned
-        checkpoint.save(update_fields=['points_earned'])
-        
-        # Add points to session
-        session.points += points_earned
-        session.save(update_fields=['points'])
+        points_earned = checkpoint.points_earned
         
         _log_action(request.user, 'checkpoint_added', 'Checkpoint', checkpoint.id,
                     f'Added checkpoint at "{controller.name}" for "{session.party_name}"',
@@ -1328,20 +1590,16 @@ def remove_checkpoint(request, pk, checkpoint_id):
     except Checkpoint.DoesNotExist:
         return Response({'error': 'Checkpoint not found.'}, status=status.HTTP_404_NOT_FOUND)
     
-    # Subtract the points that were earned for this checkpoint
-    if checkpoint.points_earned > 0:
-        session.points = max(0, session.points - checkpoint.points_earned)
-        session.save(update_fields=['points'])
-    
     _log_action(request.user, 'checkpoint_removed', 'Checkpoint', checkpoint_id,
                 f'Removed checkpoint at "{checkpoint.controller.name}" from "{session.party_name}"',
                 {'controller_id': checkpoint.controller.id, 'points_deducted': checkpoint.points_earned})
     
-    checkpoint.delete()
+    # Subtracts the points that were earned for this checkpoint
+    new_total = transitions.remove_checkpoint(checkpoint)
     return Response({
         'message': 'Checkpoint removed.',
         'points_deducted': checkpoint.points_earned,
-        'new_total': session.points,
+        'new_total': new_total,
     })
 
 
@@ -1364,74 +1622,29 @@ def rfid_start_session(request):
     if not rfid:
         return Response({'error': 'RFID tag is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        p = PendingSignup.objects.get(rfid_tag=rfid, status='approved')
-    except PendingSignup.DoesNotExist:
-        return Response(
-            {'error': 'No approved session found for this RFID tag.'},
-            status=status.HTTP_404_NOT_FOUND,
-        )
-
-    from django.utils import timezone
-    now = timezone.now()
-
-    # Check if session time has already expired
-    remaining = p.get_remaining_seconds()
-    if remaining <= 0:
-        return Response({
-            'error': 'Session time has expired.',
-            'session_id': p.id,
-            'party_name': p.party_name,
-        }, status=status.HTTP_400_BAD_REQUEST)
-
     # Look up the controller (optional — for checking start/end flags)
-    controller = None
-    if controller_ip:
-        try:
-            controller = Controller.objects.get(ip_address=controller_ip)
-        except Controller.DoesNotExist:
-            pass
+    controller = get_topology().for_ip(controller_ip)
 
-    # Prevent a session from being started at another station while it is
-    # already active somewhere else. A station must be completed (stop) first.
-    if p.is_playing:
-        return Response({
-            'error': 'Session is already active at another station. Complete the current station before starting a new one.',
-            'error_code': 'session_already_active',
-            'session_id': p.id,
-            'party_name': p.party_name,
-        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        p = transitions.start_session(rfid, controller)
+    except TransitionError as e:
+        return Response(e.data, status=e.status_code)
+    return Response(_started_data(request, p, controller))
 
-    # Calculate per-station time
-    total_controllers = Controller.objects.count() or 1
-    per_station_seconds = _get_station_seconds(p, controller)
 
-    # Prevent replaying a station already completed in this session.
-    # A checkpoint means this station was already cleared once.
-    if controller and Checkpoint.objects.filter(session=p, controller=controller).exists():
-        return Response({
-            'error': f'Station "{controller.name}" already completed for this session. Go to a new station.',
-            'error_code': 'station_already_completed',
-            'session_id': p.id,
-            'party_name': p.party_name,
-            'controller_name': controller.name,
-            'controller_ip': controller.ip_address,
-        }, status=status.HTTP_400_BAD_REQUEST)
-
-    # If first time starting, set started_at
-    if not p.started_at:
-        p.started_at = now
+def _started_data(request, p, controller):
+    """Response body for a session started or resumed at ``controller``."""
+    topology = get_topology()
 
-    # Resume the timer
-    p.last_started_at = now
-    p.is_playing = True
-    p.save(update_fields=['started_at', 'last_started_at', 'is_playing'])
+    # Calculate per-station time
+    total_controllers = topology.count or 1
+    per_station_seconds = topology.station_seconds(p, controller)
 
     # Remaining seconds for this particular station (per-station countdown)
     # = per_station_seconds (full allocation for this station)
     station_remaining = per_station_seconds
 
-    return Response({
+    return {
         'message': 'Session started.' if p.total_elapsed_seconds == 0 else 'Session resumed.',
         'session_id': p.id,
         'party_name': p.party_name,
@@ -1442,6 +1655,7 @@ def rfid_start_session(request):
         'per_station_seconds': per_station_seconds,
         'total_controllers': total_controllers,
         'current_controller_index': p.current_controller_index,
+        'total_points': p.points,
         'started_at': p.last_started_at.isoformat(),
         'storyline_title': p.storyline.title if p.storyline else '',
         'storyline_hint': p.storyline.hint if p.storyline else '',
@@ -1449,7 +1663,7 @@ def rfid_start_session(request):
         'is_start_controller': controller.is_start if controller else False,
         'controller_name': controller.name if controller else '',
         'hint_audio': request.build_absolute_uri(controller.hint_audio.url) if (controller and controller.hint_audio) else '',
-    })
+    }
 
 
 @api_view(['POST'])
@@ -1473,92 +1687,38 @@ def rfid_stop_session(request):
     if not rfid:
         return Response({'error': 'RFID tag is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    controller = get_topology().for_ip(controller_ip)
     try:
-        p = PendingSignup.objects.get(rfid_tag=rfid, status='approved')
-    except PendingSignup.DoesNotExist:
-        return Response(
-            {'error': 'No active session found for this RFID tag.'},
-            status=status.HTTP_404_NOT_FOUND,
-        )
+        result = transitions.stop_session(rfid, controller)
+    except TransitionError as e:
+        return Response(e.data, status=e.status_code)
+    return Response(_stopped_data(result, controller))
 
-    from django.utils import timezone
-    now = timezone.now()
-
-    # Pause the timer — accumulate elapsed time
-    station_elapsed = 0
-    if p.is_playing and p.last_started_at:
-        station_elapsed = int((now - p.last_started_at).total_seconds())
-        p.total_elapsed_seconds += station_elapsed
-    p.is_playing = False
-    p.last_started_at = None
-
-    # Look up controller and record checkpoint
-    controller = None
-    checkpoint_created = False
-    if controller_ip:
-        try:
-            controller = Controller.objects.get(ip_address=controller_ip)
-        except Controller.DoesNotExist:
-            pass
-
-    # Calculate per-station allocation
-    total_controllers = Controller.objects.count() or 1
-    per_station_seconds = _get_station_seconds(p, controller)
-
-    # Points for this station = remaining time of per-station countdown
-    station_remaining = max(0, per_station_seconds - station_elapsed)
-    # 1 second remaining equals 1 point.
-    station_points = station_remaining
-
-    if controller:
-        checkpoint, created = Checkpoint.objects.get_or_create(
-            session=p, controller=controller
-        )
-        checkpoint_created = created
-        if created:
-            checkpoint.elapsed_seconds = station_elapsed
-            checkpoint.points_earned = station_points
-            checkpoint.save(update_fields=['elapsed_seconds', 'points_earned'])
-            p.points += station_points
-
-    # Progress is based on unique controllers cleared (not visit order).
-    checkpoints_cleared = Checkpoint.objects.filter(session=p).count()
-    p.current_controller_index = checkpoints_cleared
-
-    # End only when all stations/controllers are completed.
-    all_stations_completed = total_controllers > 0 and checkpoints_cleared >= total_controllers
-    session_ended = False
-
-    if all_stations_completed:
-        # End the entire session
-        p.status = 'ended'
-        p.ended_at = now
-        session_ended = True
 
-    p.save(update_fields=[
-        'total_elapsed_seconds', 'is_playing', 'last_started_at',
-        'points', 'current_controller_index',
-    ] + (['status', 'ended_at'] if session_ended else []))
+def _stopped_data(result, controller):
+    """Response body for a station stopped at ``controller``."""
+    p = result['session']
+    session_ended = result['session_ended']
 
-    return Response({
+    return {
         'message': 'Session ended. All stations completed.' if session_ended else 'Station completed. Move to the next station.',
         'session_ended': session_ended,
         'session_id': p.id,
         'party_name': p.party_name,
-        'station_elapsed_seconds': station_elapsed,
-        'station_remaining_seconds': station_remaining,
-        'station_points': station_points,
-        'per_station_seconds': per_station_seconds,
+        'station_elapsed_seconds': result['station_elapsed_seconds'],
+        'station_remaining_seconds': result['station_remaining_seconds'],
+        'station_points': result['station_points'],
+        'per_station_seconds': result['per_station_seconds'],
         'total_elapsed_seconds': p.total_elapsed_seconds,
         'remaining_seconds': p.get_remaining_seconds(),
         'total_points': p.points,
         'current_controller_index': p.current_controller_index,
-        'total_controllers': total_controllers,
-        'checkpoints_cleared': checkpoints_cleared,
+        'total_controllers': result['total_controllers'],
+        'checkpoints_cleared': result['checkpoints_cleared'],
         'controller_name': controller.name if controller else '',
         'is_end_controller': controller.is_end if controller else False,
-        'checkpoint_created': checkpoint_created,
-    })
+        'checkpoint_created': result['checkpoint_created'],
+    }
 
 
 # ── RFID Checkpoint ──
@@ -1584,45 +1744,14 @@ def rfid_checkpoint(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Look up the active session
+    # Default: award full station points if created manually.
+    controller = get_topology().for_ip(controller_ip)
     try:
-        p = PendingSignup.objects.get(rfid_tag=rfid, status='approved')
-    except PendingSignup.DoesNotExist:
-        return Response(
-            {'error': 'No active session found for this RFID tag.'},
-            status=status.HTTP_404_NOT_FOUND,
-        )
-
-    # Look up the controller
-    try:
-        controller = Controller.objects.get(ip_address=controller_ip)
-    except Controller.DoesNotExist:
-        return Response(
-            {'error': 'Controller not found for the given IP.'},
-            status=status.HTTP_404_NOT_FOUND,
-        )
-
-    from django.utils import timezone
-    
-    checkpoint, created = Checkpoint.objects.get_or_create(
-        session=p, controller=controller
-    )
-
-    points_earned = 0
-    
-    if created:
-        # Per-station allocation
-        total_controllers = Controller.objects.count() or 1
-        per_station_seconds = _get_station_seconds(p, controller)
-        
-        # Default: award full station points if created manually.
-        points_earned = per_station_seconds
-        
-        checkpoint.points_earned = points_earned
-        checkpoint.save(update_fields=['points_earned'])
-        
-        p.points += points_earned
-        p.save(update_fields=['points'])
+        # Reports an unknown session before an unknown controller
+        p, checkpoint, created = transitions.clear_checkpoint(rfid, controller)
+    except TransitionError as e:
+        return Response(e.data, status=e.status_code)
+    points_earned = checkpoint.points_earned
 
     return Response({
         'message': 'Checkpoint cleared!' if created else 'Checkpoint already cleared.',
@@ -1659,17 +1788,15 @@ def rfid_status(request):
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    from django.utils import timezone
-    now = timezone.now()
-
     data = _serialize_pending(p, request)
 
     if p.status == 'approved':
         remaining_secs = p.get_remaining_seconds()
         
         # Per-station allocation
-        total_controllers = Controller.objects.count() or 1
-        per_station_seconds = _get_station_seconds(p)
+        topology = get_topology()
+        total_controllers = topology.count or 1
+        per_station_seconds = topology.station_seconds(p)
         
         if remaining_secs > 0:
             data['session_status'] = 'active'
@@ -1681,16 +1808,7 @@ def rfid_status(request):
             data['total_controllers'] = total_controllers
             data['current_controller_index'] = p.current_controller_index
         else:
-            # Timer exceeded — auto-end
-            if p.is_playing and p.last_started_at:
-                elapsed = (now - p.last_started_at).total_seconds()
-                p.total_elapsed_seconds += int(elapsed)
-                p.is_playing = False
-                p.last_started_at = None
-            
-            p.status = 'ended'
-            p.ended_at = now
-            p.save(update_fields=['status', 'ended_at', 'total_elapsed_seconds', 'is_playing', 'last_started_at'])
+            # Timer exceeded — the expiry sweeper records the end
             data['session_status'] = 'expired'
             data['status'] = 'ended'
             data['remaining_seconds'] = 0
@@ -1733,40 +1851,300 @@ def rfid_check_staff(request):
     if not rfid:
         return Response({'error': 'RFID tag is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    user, error = _find_staff(rfid)
+    if error:
+        message, status_code = error
+        return Response({'is_staff': False, 'error': message}, status=status_code)
+    return Response(_staff_data(user))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def rfid_staff_tags(request):
+    """List every active staff member with an RFID tag.
+
+    Stations seed their staff card cache from this list (one query) so
+    staff taps are answered locally; see ``accounts.staff_cache`` for how
+    they are told about changes. Only stations may call it: the request
+    must carry ``Authorization: Bearer <STATION_TOKEN>``.
+
+    Returns: { "staff": [ { "rfid_tag", "staff_id", "username" }, ... ] }
+    """
+    if not station_link.token_valid(station_link.bearer_token(request.headers.get('Authorization'))):
+        return Response({'error': 'Invalid station token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    profiles = (
+        StaffProfile.objects
+        .select_related('user')
+        .filter(user__is_active=True, user__is_staff=True)
+        .exclude(rfid_tag='')
+        .order_by('id')
+    )
+    return Response({
+        'staff': [
+            {'rfid_tag': p.rfid_tag, 'staff_id': p.user.id, 'username': p.user.username}
+            for p in profiles
+        ],
+    })
+
+
+def _find_staff(rfid):
+    """Return ``(user, None)`` for an active staff tag, else ``(None, (message, status))``."""
     try:
         # Look up staff profile by RFID tag
         staff_profile = StaffProfile.objects.select_related('user').get(rfid_tag=rfid)
-        user = staff_profile.user
-        
-        # Check if the user is active and is staff
-        if not user.is_active:
-            return Response({
-                'is_staff': False,
-                'error': 'Staff account is inactive.'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        if not user.is_staff:
-            return Response({
-                'is_staff': False,
-                'error': 'User is not a staff member.'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Return staff info
-        return Response({
-            'is_staff': True,
-            'staff_id': user.id,
-            'username': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email,
-            'is_superuser': user.is_superuser,
-        })
-        
     except StaffProfile.DoesNotExist:
-        return Response({
-            'is_staff': False,
-            'error': 'No staff member found with this RFID tag.'
-        }, status=status.HTTP_404_NOT_FOUND)
+        return None, ('No staff member found with this RFID tag.', status.HTTP_404_NOT_FOUND)
+
+    user = staff_profile.user
+    # Check if the user is active and is staff
+    if not user.is_active:
+        return None, ('Staff account is inactive.', status.HTTP_403_FORBIDDEN)
+    if not user.is_staff:
+        return None, ('User is not a staff member.', status.HTTP_403_FORBIDDEN)
+    return user, None
+
+
+def _staff_data(user):
+    return {
+        'is_staff': True,
+        'staff_id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'is_superuser': user.is_superuser,
+    }
+
+
+# ── RFID Scan (single round trip) ──
+
+SCAN_MODES = ('ready', 'active', 'result')
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def rfid_scan(request):
+    """Handle a station RFID scan in one request and one transaction.
+
+    Body: {
+        "rfid": "<tag>",
+        "controller_ip": "<ip>",
+        "station_mode": "ready" | "active" | "result",
+        "session_rfid": "<tag of the session playing here>"  (active mode)
+    }
+
+    Resolves staff vs. player cards and applies the transition the
+    station's mode calls for, replacing check-staff followed by start/stop:
+
+    - ready:  staff card -> "staff"; player card -> starts the session
+              ("start", with the rfid/start/ body as "result")
+    - active: staff card -> stops the session playing here
+              ("stop", with the rfid/stop/ body as "result")
+    - result: staff card -> "reset"
+    - anything else -> "ignored"
+
+    A failed start returns the same error body and status as rfid/start/.
+    """
+    body, status_code = _scan(request.data, request)
+    return Response(body, status=status_code)
+
+
+def _scan(data, request):
+    """Apply a station scan; return ``(body, status_code)`` (see ``rfid_scan``).
+
+    ``request`` only needs ``build_absolute_uri`` (for photo URLs).
+    """
+    from django.db import transaction
+
+    rfid = str(data.get('rfid') or '').strip()
+    controller_ip = str(data.get('controller_ip') or '').strip()
+    station_mode = data.get('station_mode', 'ready')
+    if not rfid:
+        return {'error': 'RFID tag is required.'}, status.HTTP_400_BAD_REQUEST
+    if station_mode not in SCAN_MODES:
+        return (
+            {'error': f'station_mode must be one of: {", ".join(SCAN_MODES)}.'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    controller = get_topology().for_ip(controller_ip)
+    user, _ = _find_staff(rfid)
+    # Errors carry these too: stations tell a failed staff stop from a player card by them
+    staff = {'is_staff': user is not None, 'staff': _staff_data(user) if user else None}
+    body = dict(staff)
+    try:
+        with transaction.atomic():
+            if station_mode == 'ready' and user is None:
+                p = transitions.start_session(rfid, controller)
+                body.update(action='start', result=_started_data(request, p, controller))
+            elif station_mode == 'ready':
+                body['action'] = 'staff'
+            elif station_mode == 'active' and user is not None:
+                session_rfid = str(data.get('session_rfid') or '').strip()
+                if not session_rfid:
+                    return (
+                        {'error': 'session_rfid is required to stop a session.', **staff},
+                        status.HTTP_400_BAD_REQUEST,
+                    )
+                result = transitions.stop_session(session_rfid, controller)
+                body.update(action='stop', result=_stopped_data(result, controller))
+            elif station_mode == 'result' and user is not None:
+                body['action'] = 'reset'
+            else:
+                body['action'] = 'ignored'
+    except TransitionError as e:
+        return {**e.data, **staff}, e.status_code
+    return body, status.HTTP_200_OK
+
+
+# ── Station event journal replay ──
+
+def _stop_event(data, occurred_at):
+    rfid = str(data.get('rfid') or '').strip()
+    if not rfid:
+        return {'error': 'RFID tag is required.'}, status.HTTP_400_BAD_REQUEST
+    controller = get_topology().for_ip(str(data.get('controller_ip') or '').strip())
+    try:
+        result = transitions.stop_session(rfid, controller, now=occurred_at)
+    except TransitionError as e:
+        return e.data, e.status_code
+    return _stopped_data(result, controller), status.HTTP_200_OK
+
+
+def _checkpoint_event(data, occurred_at):
+    rfid = str(data.get('rfid') or '').strip()
+    controller = get_topology().for_ip(str(data.get('controller_ip') or '').strip())
+    if not rfid or controller is None:
+        return {'error': 'A known controller_ip and rfid are required.'}, status.HTTP_400_BAD_REQUEST
+    try:
+        p, checkpoint, created = transitions.clear_checkpoint(rfid, controller, now=occurred_at)
+    except TransitionError as e:
+        return e.data, e.status_code
+    return {
+        'message': 'Checkpoint cleared!' if created else 'Checkpoint already cleared.',
+        'checkpoint_id': checkpoint.id,
+        'session_id': p.id,
+        'points_earned': checkpoint.points_earned,
+        'total_points': p.points,
+    }, status.HTTP_200_OK
+
+
+def _health_event(data, occurred_at):
+    if 'samples' in data:
+        return _apply_health_batch(data, occurred_at)
+    return _apply_health_metrics(data, recorded_at=occurred_at)
+
+
+STATION_EVENT_HANDLERS = {
+    'stop': _stop_event,
+    'checkpoint': _checkpoint_event,
+    'health': _health_event,
+}
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def station_event_batch(request):
+    """Apply a batch of journaled station events, in order, each at most once.
+
+    Body: {
+        "sent_at": <station Unix time when the batch was sent>,
+        "events": [
+            {
+                "idempotency_key": "<uuid>",
+                "type": "stop" | "checkpoint" | "health",
+                "occurred_at": <station Unix time of the event>,
+                "data": { ... same body as rfid/stop/, rfid/checkpoint/,
+                          controllers/health/ or controllers/health/batch/ }
+            },
+            ...
+        ]
+    }
+
+    Returns one result per event, in order:
+    { "results": [ { "idempotency_key", "status", "duplicate", "body" }, ... ] }
+
+    A result with a status below 500 is final: the station drops the event
+    from its journal. See ``accounts.station_events``.
+    """
+    body, status_code = _apply_event_batch(request.data)
+    return Response(body, status=status_code)
+
+
+def _apply_event_batch(data):
+    """Apply a batch of station events; return ``(body, status_code)``."""
+    from django.db import transaction
+    from django.utils import timezone
+
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return {'error': 'events must be a non-empty list.'}, status.HTTP_400_BAD_REQUEST
+    if len(events) > station_events.MAX_BATCH_SIZE:
+        return (
+            {'error': f'At most {station_events.MAX_BATCH_SIZE} events per batch.'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    sent_at = data.get('sent_at')
+    now = timezone.now()
+    results = []
+    for event in events:
+        if not isinstance(event, dict):
+            event = {}
+        try:
+            body, status_code, duplicate = station_events.apply_event(
+                event, STATION_EVENT_HANDLERS, sent_at, now=now,
+            )
+        except station_events.InvalidEvent as e:
+            body, status_code, duplicate = {'error': str(e)}, status.HTTP_400_BAD_REQUEST, False
+        results.append({
+            'idempotency_key': event.get('idempotency_key'),
+            'status': status_code,
+            'duplicate': duplicate,
+            'body': body,
+        })
+    transaction.on_commit(station_events.maybe_prune_receipts)
+    return {'results': results}, status.HTTP_200_OK
+
+
+# ── Station control link (see accounts.station_link) ──
+
+def _link_events(data, _request):
+    return _apply_event_batch(data)
+
+
+def _link_health(data, _request):
+    from django.utils import timezone
+
+    if 'samples' in data:
+        return _apply_health_batch(data, timezone.now())
+    return _apply_health_metrics(data)
+
+
+# Requests a station may send over its control link, by message type. Each
+# takes the HTTP endpoint's body and the link's URI builder (only scans build
+# URLs) and returns ``(body, status_code)``.
+STATION_LINK_HANDLERS = {
+    'scan': _scan,
+    'events': _link_events,
+    'health': _link_health,
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def controller_presence(request):
+    """Which stations hold an open control link right now.
+
+    Returns: [ { "controller_id", "name", "online", "connected_at", "last_seen" }, ... ]
+    """
+    controllers = get_topology().controllers
+    presence = station_link.presence([c.id for c in controllers])
+    return Response([
+        {'controller_id': c.id, 'name': c.name, **presence[c.id]}
+        for c in controllers
+    ])
 
 
 def rfid_test_page(request):
@@ -1794,14 +2172,10 @@ def station_recent_scans(request):
     if not controller_id:
         return Response({'error': 'controller_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        controller = Controller.objects.get(pk=controller_id)
-    except Controller.DoesNotExist:
+    controller = get_topology().get(controller_id)
+    if controller is None:
         return Response({'error': 'Controller not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-    from django.db.models import Q
-    from django.utils import timezone
-
     # Fetch sessions that actually played at THIS specific station
     # by looking at checkpoints for this controller.
     checkpoint_sessions = (
@@ -1821,6 +2195,7 @@ def station_recent_scans(request):
             'points': p.points,
             'avatar_id': p.avatar_id,
             'profile_photo': request.build_absolute_uri(p.profile_photo.url) if p.profile_photo else '',
+            'profile_photo_sizes': image_sizes(p.profile_photo, request),
             'played_at': cp.cleared_at.isoformat() if cp.cleared_at else '',
             'points_earned': cp.points_earned,
         })
@@ -1836,94 +2211,31 @@ def station_recent_scans(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@_revalidated(_leaderboard_etag)
 def public_leaderboard(request):
     """Return leaderboard data for all approved (live) and ended sessions,
-    sorted by points descending. Includes checkpoint progress."""
-    from django.utils import timezone
-    from datetime import timedelta
-
-    now = timezone.now()
-    total_controllers = Controller.objects.count()
+    sorted by points descending. Includes checkpoint progress.
 
+    Served from the precomputed snapshot for the filter; it is only rebuilt
+    after a write that affects the board (see accounts.leaderboard). The
+    list filters and pagination from accounts.pagination cut a subset out
+    of the snapshot."""
     # Filter parameter: 'active', '7days', 'all' (default: all)
     time_filter = request.query_params.get('filter', 'all')
+    snapshot = get_leaderboard_snapshot(time_filter, request)
+    return _leaderboard_response(request, snapshot)
 
-    if time_filter == 'active':
-        sessions = PendingSignup.objects.filter(
-            status='approved',
-            leaderboard_hidden=False,
-        ).order_by('-points', 'created_at')
-    elif time_filter == '7days':
-        seven_days_ago = now - timedelta(days=7)
-        sessions = PendingSignup.objects.filter(
-            status__in=['approved', 'ended'],
-            created_at__gte=seven_days_ago,
-            leaderboard_hidden=False,
-        ).order_by('-points', 'created_at')
-    else:
-        # 'all' — include both live and ended
-        sessions = PendingSignup.objects.filter(
-            status__in=['approved', 'ended'],
-            leaderboard_hidden=False,
-        ).order_by('-points', 'created_at')
-
-    result = []
-    for p in sessions:
-        # Build photo / avatar info
-        photo_url = ''
-        if p.profile_photo:
-            photo_url = request.build_absolute_uri(p.profile_photo.url)
-
-        # Count checkpoints cleared
-        checkpoints = Checkpoint.objects.filter(session=p).select_related('controller')
-        checkpoints_cleared = checkpoints.count()
-        checkpoint_list = [
-            {
-                'controller_id': cp.controller.id,
-                'controller_name': cp.controller.name,
-                'cleared_at': cp.cleared_at.isoformat(),
-            }
-            for cp in checkpoints
-        ]
-
-        # Calculate remaining time for live sessions
-        remaining_minutes = 0
-        session_status = p.status
-        if p.status == 'approved':
-            remaining_seconds = p.get_remaining_seconds()
-            if remaining_seconds > 0:
-                remaining_minutes = remaining_seconds // 60
-                session_status = 'live'
-            else:
-                session_status = 'ended'
-
-        result.append({
-            'id': p.id,
-            'name': p.party_name,
-            'email': p.email,
-            'team_size': p.team_size,
-            'points': p.points,
-            'profile_photo': photo_url,
-            'avatar_id': p.avatar_id,
-            'storyline_title': p.storyline.title if p.storyline else '',
-            'session_minutes': p.session_minutes,
-            'remaining_minutes': remaining_minutes,
-            'session_status': session_status,
-            'checkpoints_cleared': checkpoints_cleared,
-            'total_controllers': total_controllers,
-            'checkpoints': checkpoint_list,
-            'created_at': p.created_at.isoformat() if p.created_at else '',
-            'approved_at': p.approved_at.isoformat() if p.approved_at else '',
-        })
 
-    return Response(result)
+def _public_controllers_etag(request):
+    return _etag_from(get_topology().version, request.build_absolute_uri('/'))
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@_revalidated(_public_controllers_etag)
 def public_controllers(request):
     """Return the list of controllers/checkpoints (public, for leaderboard circles)."""
-    controllers = Controller.objects.all()
+    controllers = get_topology().controllers
     return Response([
         {
             'id': c.id,
@@ -2037,27 +2349,128 @@ def leaderboard_test_page(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def audit_log_list(request):
-    """Return the audit log entries, newest first."""
+    """Return audit log entries, newest first.
+
+    Filters: ``action``, ``user``, ``target_type``, ``target_id``,
+    ``date_from``/``date_to`` and full-text ``q`` (see
+    accounts.audit.parse_audit_filters). With ``page_size`` or ``cursor``
+    the response is one keyset-paginated page; otherwise a plain list of at
+    most ``limit`` entries. ``source=archive`` searches the monthly archives
+    of entries past their retention instead of the database.
+    """
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
-    limit = int(request.query_params.get('limit', 100))
-    logs = AuditLog.objects.select_related('user').order_by('-created_at')[:limit]
+    try:
+        filters = parse_audit_filters(request)
+        if not is_paginated(request):
+            try:
+                limit = max(0, int(request.query_params.get('limit', 100)))
+            except ValueError:
+                raise InvalidPageRequest('limit must be an integer.')
+        if request.query_params.get('source') == 'archive':
+            return _archived_audit_log(request, filters, None if is_paginated(request) else limit)
+
+        audit_writer.flush()  # Include entries still waiting in the writer's queue
+        logs = filter_audit_log(AuditLog.objects.select_related('user'), filters)
+        if not is_paginated(request):
+            logs = logs.order_by('-created_at', '-id')[:limit]
+            return Response([_audit_entry(log) for log in logs])
+        rows, next_cursor = paginate_queryset(logs, request, [('created_at', True), ('id', True)])
+    except InvalidPageRequest as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(page_data([_audit_entry(log) for log in rows], next_cursor))
 
-    return Response([
-        {
-            'id': log.id,
-            'user': log.user.username if log.user else 'System',
-            'action': log.action,
-            'action_display': log.get_action_display(),
-            'target_type': log.target_type,
-            'target_id': log.target_id,
-            'description': log.description,
-            'metadata': log.metadata,
-            'created_at': log.created_at.isoformat(),
-        }
-        for log in logs
-    ])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def audit_log_csv(request):
+    """Export audit log entries as a streamed CSV file, newest first.
+
+    Accepts the same filters as ``audit_log_list``.
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+    import json
+    from django.core.serializers.json import DjangoJSONEncoder
+    try:
+        logs = filter_audit_log(AuditLog.objects.select_related('user'), parse_audit_filters(request))
+    except InvalidPageRequest as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    audit_writer.flush()
+
+    def rows():
+        for log in logs.order_by('-created_at', '-id').iterator(chunk_size=exports.CHUNK_ROWS):
+            yield [
+                log.created_at.isoformat(),
+                log.user.username if log.user else 'System',
+                log.action,
+                log.target_type,
+                log.target_id if log.target_id is not None else '',
+                log.description,
+                json.dumps(log.metadata, cls=DjangoJSONEncoder) if log.metadata else '',
+            ]
+
+    return exports.streaming_csv_response(request, 'audit_log.csv', [
+        'Date', 'User', 'Action', 'Target Type', 'Target ID', 'Description', 'Metadata',
+    ], rows())
+
+
+def _archived_audit_log(request, filters, limit):
+    """Serve ``audit_log_list`` from the archives (a plain list when ``limit`` is given)."""
+    if limit is not None:
+        return Response(audit_archive.search_archive(filters, limit))
+    size = get_page_size(request)
+    token = request.query_params.get('cursor')
+    after = tuple(decode_cursor(token, 2)) if token else None
+    if after and not all(isinstance(v, (int, float)) for v in after):
+        raise InvalidPageRequest('Invalid cursor.')
+    entries = audit_archive.search_archive(filters, size + 1, after=after)
+    next_cursor = None
+    if len(entries) > size:
+        entries = entries[:size]
+        next_cursor = encode_cursor(audit_archive.archive_sort_key(entries[-1]))
+    return Response(page_data(entries, next_cursor))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def audit_log_archives(request):
+    """List the monthly audit log archives, newest first."""
+    if not request.user.is_superuser:
+        return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+    archives = []
+    for month in audit_archive.archive_months():
+        path = audit_archive.archive_path(month)
+        archives.append({'month': month, 'size_bytes': path.stat().st_size})
+    return Response(archives)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def audit_log_archive_download(request, month):
+    """Download one month's archive (gzip-compressed JSON Lines)."""
+    if not request.user.is_superuser:
+        return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+    path = audit_archive.archive_path(month)
+    if month not in audit_archive.archive_months():
+        return Response({'error': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name,
+                        content_type='application/gzip')
+
+
+def _audit_entry(log):
+    return {
+        'id': log.id,
+        'user': log.user.username if log.user else 'System',
+        'action': log.action,
+        'action_display': log.get_action_display(),
+        'target_type': log.target_type,
+        'target_id': log.target_id,
+        'description': log.description,
+        'metadata': log.metadata,
+        'created_at': log.created_at.isoformat(),
+    }
 
 
 # ── Email Subscribers ──
@@ -2065,25 +2478,29 @@ def audit_log_list(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def email_subscribers(request):
-    """Return all signups that opted in to receive offers."""
+    """Return signups that opted in to receive offers, newest first.
+
+    Accepts the list filters and pagination from accounts.pagination.
+    """
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
     signups = PendingSignup.objects.filter(
         receive_offers=True,
-    ).exclude(email='').order_by('-created_at')
+    ).exclude(email='')
 
-    return Response([
-        {
+    return _list_response(
+        request, signups, [('created_at', True), ('id', True)],
+        lambda s: {
             'id': s.id,
             'party_name': s.party_name,
             'email': s.email,
             'team_size': s.team_size,
             'status': s.status,
             'created_at': s.created_at.isoformat() if s.created_at else '',
-        }
-        for s in signups
-    ])
+        },
+        date_field='created_at', status_field='status',
+    )
 
 
 @api_view(['DELETE'])
@@ -2123,29 +2540,28 @@ def email_subscribers_bulk_delete(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def email_subscribers_csv(request):
-    """Export email subscribers as a CSV file."""
+    """Export email subscribers as a streamed CSV file.
+
+    Accepts the same filters as the subscriber list.
+    """
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
-    import csv
-    from django.http import HttpResponse
-
     signups = PendingSignup.objects.filter(
         receive_offers=True,
-    ).exclude(email='').order_by('-created_at')
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="email_subscribers.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Party Name', 'Email', 'Team Size', 'Status', 'Signed Up'])
-    for s in signups:
-        writer.writerow([
-            s.party_name,
-            s.email,
-            s.team_size,
-            s.status,
-            s.created_at.strftime('%Y-%m-%d %H:%M') if s.created_at else '',
-        ])
-
-    return response
+    ).exclude(email='')
+    try:
+        signups = filter_queryset(signups, request, 'created_at', status_field='status')
+    except InvalidPageRequest as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def rows():
+        fields = ('party_name', 'email', 'team_size', 'status', 'created_at')
+        for party_name, email, team_size, signup_status, created_at in (
+            signups.order_by('-created_at', '-id').values_list(*fields).iterator(chunk_size=exports.CHUNK_ROWS)
+        ):
+            yield [party_name, email, team_size, signup_status, _csv_time(created_at)]
+
+    return exports.streaming_csv_response(
+        request, 'email_subscribers.csv', ['Party Name', 'Email', 'Team Size', 'Status', 'Signed Up'], rows(),
+    )
@@ -62,6 +62,30 @@ def broadcast_leaderboard_update(leaderboard_data: list):
         logger.error(f"Failed to broadcast leaderboard: {e}")
 
 
+def notify_leaderboard_changed():
+    """
+    Tell connected leaderboard clients that the board has changed.
+    
+    The message carries no data: each LeaderboardConsumer coalesces these
+    notifications and then sends its client the current snapshot.
+    """
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        logger.warning("Channel layer not configured")
+        return
+    
+    try:
+        async_to_sync(channel_layer.group_send)(
+            'leaderboard',
+            {
+                'type': 'leaderboard_changed'
+            }
+        )
+        logger.debug("Notified leaderboard change")
+    except Exception as e:
+        logger.error(f"Failed to notify leaderboard change: {e}")
+
+
 def notify_rfid_scan(station_id: str, rfid_tag: str, session_data: dict = None):
     """
     Notify about an RFID scan event.
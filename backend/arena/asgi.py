@@ -19,6 +19,13 @@ django_asgi_app = get_asgi_application()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from accounts.routing import websocket_urlpatterns
+from accounts.audit import start_audit_writer
+from accounts.expiry import start_sweeper
+
+# End overdue sessions in the background instead of inside GET handlers.
+start_sweeper()
+# Write audit entries in batches off the request path.
+start_audit_writer()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -94,6 +94,23 @@ CHANNEL_LAYERS = {
 # }
 
 
+# Cache — holds the shared leaderboard data version (see accounts.leaderboard).
+# Point this at Redis when running more than one server process so that a
+# write in one process invalidates the snapshots held by the others.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# For production with Redis:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+
+
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
@@ -167,6 +184,25 @@ CORS_ALLOW_CREDENTIALS = True
 WATCHDOG_TOKEN = config('WATCHDOG_TOKEN', default='')
 WATCHDOG_PORT = config('WATCHDOG_PORT', default=8002, cast=int)
 
+# Station control links — shared secret stations present on ws/station/<id>/control/
+# (links are refused while it is empty; stations then use HTTP only)
+STATION_TOKEN = config('STATION_TOKEN', default='')
+
+# Threads generating resized copies of uploaded photos (accounts.images)
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+
+# Audit log retention — entries older than their retention move to per-month
+# gzip JSONL files in AUDIT_ARCHIVE_DIR. Off by default: 0 days keeps them in
+# the database.
+# AUDIT_RETENTION_BY_ACTION overrides the default per action, e.g.
+# "settings_updated=365,session_points_updated=30".
+AUDIT_ARCHIVE_DIR = config('AUDIT_ARCHIVE_DIR', default=str(BASE_DIR / 'audit_archive'))
+AUDIT_RETENTION_DAYS = config('AUDIT_RETENTION_DAYS', default=0, cast=int)
+AUDIT_RETENTION_BY_ACTION = config(
+    'AUDIT_RETENTION_BY_ACTION', default='',
+    cast=lambda v: {k.strip(): int(d) for k, d in (p.split('=', 1) for p in v.split(',') if p.strip())},
+)
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
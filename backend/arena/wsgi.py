@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'arena.settings')
 
 application = get_wsgi_application()
+
+from accounts.audit import start_audit_writer  # noqa: E402
+from accounts.expiry import start_sweeper  # noqa: E402
+
+# End overdue sessions in the background instead of inside GET handlers.
+start_sweeper()
+# Write audit entries in batches off the request path.
+start_audit_writer()
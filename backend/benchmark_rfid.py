@@ -0,0 +1,85 @@
+"""
+RFID Scan Latency Benchmark
+Measures start/stop scan latency as the number of historical sessions grows.
+Runs against a throwaway in-memory test database, never db.sqlite3.
+Run:  python benchmark_rfid.py [max_sessions]   (default 100000)
+"""
+import os, sys, time, statistics
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'arena.settings')
+django.setup()
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from accounts.models import Checkpoint, Controller, PendingSignup
+
+MAX_SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LEVELS = [level for level in (0, 1000, 10000, 100000) if level <= MAX_SESSIONS]
+SCANS_PER_LEVEL = 50
+BATCH_SIZE = 5000
+
+
+def add_history(count, controllers):
+    """Create ended sessions (each with one checkpoint) to simulate a past season."""
+    created = 0
+    while created < count:
+        batch = min(BATCH_SIZE, count - created)
+        start = PendingSignup.objects.count()
+        sessions = PendingSignup.objects.bulk_create([
+            PendingSignup(
+                party_name='History %d' % (start + i),
+                rfid_tag='HIST-%d' % ((start + i) % 500),  # tags get reused across the season
+                status='ended',
+                approved_at=timezone.now(),
+                ended_at=timezone.now(),
+                points=(start + i) % 1200,
+            )
+            for i in range(batch)
+        ])
+        Checkpoint.objects.bulk_create([
+            Checkpoint(session=s, controller=controllers[i % len(controllers)])
+            for i, s in enumerate(sessions)
+        ])
+        created += batch
+
+
+def time_scans(client, controllers):
+    """Time start + stop scans for fresh approved sessions; return per-request ms."""
+    samples = []
+    for i in range(SCANS_PER_LEVEL):
+        tag = 'BENCH-%d-%d' % (PendingSignup.objects.count(), i)
+        PendingSignup.objects.create(
+            party_name='Bench %s' % tag, rfid_tag=tag,
+            status='approved', approved_at=timezone.now(), session_minutes=60,
+        )
+        ip = controllers[0].ip_address
+        for url in ('/api/rfid/start/', '/api/rfid/stop/'):
+            t0 = time.perf_counter()
+            res = client.post(url, {'rfid': tag, 'controller_ip': ip}, content_type='application/json')
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert res.status_code == 200, res.content
+    return samples
+
+
+setup_test_environment()
+old_name = connection.creation.create_test_db(verbosity=0)
+try:
+    controllers = [
+        Controller.objects.create(name='Bench %d' % i, ip_address='10.99.0.%d' % i)
+        for i in range(1, 6)
+    ]
+    client = Client()
+    print('History sessions | median ms | p95 ms')
+    print('-----------------+-----------+-------')
+    existing = 0
+    for level in LEVELS:
+        add_history(level - existing, controllers)
+        existing = level
+        samples = sorted(time_scans(client, controllers))
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print('%16d | %9.2f | %6.2f' % (level, statistics.median(samples), p95))
+finally:
+    connection.creation.destroy_test_db(old_name, verbosity=0)
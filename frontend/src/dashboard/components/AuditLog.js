@@ -1,10 +1,22 @@
-import React, { useState, useEffect } from 'react';
-import { Search, ChevronLeft, ChevronRight, ChevronDown } from 'lucide-react';
+import React, { useState, useEffect, useCallback } from 'react';
+import { Search, ChevronDown, Download } from 'lucide-react';
 import { useTheme } from '../../context/ThemeContext';
 import { useAuth } from '../../context/AuthContext';
 
 const defaultApiBase = `http://${window.location.hostname}:8000/api`;
 const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
+const PAGE_SIZE = 50;
+
+/* Actions behind each filter option */
+const ACTION_GROUPS = {
+  signup: ['signup_approved', 'signup_rejected'],
+  session: ['session_ended', 'session_time_added', 'session_time_reduced', 'session_points_updated'],
+  staff: ['staff_created', 'staff_updated', 'staff_deleted', 'staff_blocked', 'staff_unblocked'],
+  controller: ['controller_created', 'controller_updated', 'controller_deleted'],
+  storyline: ['storyline_created', 'storyline_updated', 'storyline_deleted'],
+  settings: ['settings_updated'],
+  checkpoint: ['checkpoint_added', 'checkpoint_removed'],
+};
 
 const AuditLog = () => {
   const { theme } = useTheme();
@@ -14,41 +26,64 @@ const AuditLog = () => {
   const primaryColor = theme.primary_color || '#CB30E0';
 
   const [logs, setLogs] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [query, setQuery] = useState('');
   const [actionFilter, setActionFilter] = useState('all');
-  const [currentPage, setCurrentPage] = useState(1);
-  const itemsPerPage = 15;
+  const [source, setSource] = useState('recent');
+
+  /* One page of entries, filtered and searched server-side */
+  const logsUrl = useCallback((pageCursor) => {
+    const params = new URLSearchParams({ page_size: PAGE_SIZE });
+    if (actionFilter !== 'all') params.set('action', ACTION_GROUPS[actionFilter].join(','));
+    if (query.trim()) params.set('q', query.trim());
+    if (source === 'archive') params.set('source', 'archive');
+    if (pageCursor) params.set('cursor', pageCursor);
+    return `${API_BASE}/audit-logs/?${params}`;
+  }, [actionFilter, query, source]);
 
   useEffect(() => {
-    fetchLogs();
-  }, []);
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const page = await apiFetch(logsUrl());
+        if (cancelled) return;
+        setLogs(page.results || []);
+        setCursor(page.next_cursor);
+      } catch (err) {
+        console.error('Error fetching audit logs:', err);
+      } finally {
+        if (!cancelled) setLoading(false);
+      }
+    }, query ? 300 : 0);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [logsUrl]); // eslint-disable-line react-hooks/exhaustive-deps
+
+  /* Stream the filtered log as CSV (database entries only) */
+  const handleExportCSV = () => {
+    const params = new URLSearchParams();
+    if (actionFilter !== 'all') params.set('action', ACTION_GROUPS[actionFilter].join(','));
+    if (query.trim()) params.set('q', query.trim());
+    const a = document.createElement('a');
+    a.href = `${API_BASE}/audit-logs/csv/?${params}`;
+    a.setAttribute('download', 'audit_log.csv');
+    a.click();
+  };
 
-  const fetchLogs = async () => {
+  const loadMore = async () => {
+    if (!cursor) return;
+    setLoadingMore(true);
     try {
-      const data = await apiFetch(`${API_BASE}/audit-logs/?limit=500`);
-      setLogs(data || []);
+      const page = await apiFetch(logsUrl(cursor));
+      setLogs((prev) => [...prev, ...page.results]);
+      setCursor(page.next_cursor);
     } catch (err) {
       console.error('Error fetching audit logs:', err);
-    } finally {
-      setLoading(false);
     }
+    setLoadingMore(false);
   };
 
-  const filtered = logs.filter((log) => {
-    const matchesQuery = `${log.user} ${log.description} ${log.action_display}`
-      .toLowerCase()
-      .includes(query.toLowerCase());
-    const matchesAction = actionFilter === 'all' || log.action.startsWith(actionFilter);
-    return matchesQuery && matchesAction;
-  });
-
-  const totalPages = Math.ceil(filtered.length / itemsPerPage);
-  const startIndex = (currentPage - 1) * itemsPerPage;
-  const paginatedLogs = filtered.slice(startIndex, startIndex + itemsPerPage);
-
-  useEffect(() => { setCurrentPage(1); }, [query, actionFilter]);
-
   const formatDate = (isoStr) => {
     if (!isoStr) return '—';
     const d = new Date(isoStr);
@@ -89,9 +124,21 @@ const AuditLog = () => {
         <h1 className="text-2xl font-semibold" style={{ color: theme.sidebar_active_text, fontFamily: headingFont }}>
           Audit Log
         </h1>
-        <span className="text-sm" style={{ color: theme.sidebar_text }}>
-          {filtered.length} entries
-        </span>
+        <div className="flex items-center gap-4">
+          <span className="text-sm" style={{ color: theme.sidebar_text }}>
+            {logs.length}{cursor ? '+' : ''} entries
+          </span>
+          {source === 'recent' && (
+            <button
+              onClick={handleExportCSV}
+              className="flex items-center gap-2 px-4 py-2.5 rounded-lg text-sm font-medium text-white"
+              style={{ backgroundColor: primaryColor }}
+            >
+              <Download size={16} />
+              Export CSV
+            </button>
+          )}
+        </div>
       </div>
 
       <div className="rounded-lg border overflow-hidden" style={{ backgroundColor: theme.sidebar_bg, borderColor: theme.sidebar_active_bg }}>
@@ -111,6 +158,18 @@ const AuditLog = () => {
                 style={{ backgroundColor: theme.sidebar_bg, borderColor: theme.sidebar_active_bg, color: theme.sidebar_active_text }}
               />
             </div>
+            <div className="relative">
+              <select
+                value={source}
+                onChange={(e) => setSource(e.target.value)}
+                className="appearance-none pl-4 pr-10 py-2.5 border rounded-lg focus:outline-none text-sm"
+                style={{ backgroundColor: theme.sidebar_bg, borderColor: theme.sidebar_active_bg, color: theme.sidebar_active_text }}
+              >
+                <option value="recent">Recent</option>
+                <option value="archive">Archived</option>
+              </select>
+              <ChevronDown className="absolute right-3 top-1/2 transform -translate-y-1/2 pointer-events-none" size={18} style={{ color: theme.sidebar_text }} />
+            </div>
             <div className="relative">
               <select
                 value={actionFilter}
@@ -140,12 +199,12 @@ const AuditLog = () => {
         </div>
 
         <div>
-          {paginatedLogs.length === 0 ? (
+          {logs.length === 0 ? (
             <div className="p-8 text-center" style={{ color: theme.sidebar_text }}>
               No audit log entries found.
             </div>
           ) : (
-            paginatedLogs.map((log) => {
+            logs.map((log) => {
               const colors = actionColors[log.action] || { bg: '#f3f4f6', text: '#374151' };
               return (
                 <div key={log.id} className="grid grid-cols-12 gap-4 px-6 py-3.5 border-b items-center" style={{ borderColor: theme.sidebar_active_bg + '66' }}>
@@ -169,26 +228,15 @@ const AuditLog = () => {
           )}
         </div>
 
-        {totalPages > 1 && (
-          <div className="px-6 py-4 flex items-center justify-between border-t" style={{ borderColor: theme.sidebar_active_bg }}>
-            <button
-              onClick={() => setCurrentPage(p => Math.max(1, p - 1))}
-              disabled={currentPage === 1}
-              className="flex items-center gap-1 px-3 py-2 text-sm rounded border disabled:opacity-50 disabled:cursor-not-allowed"
-              style={{ borderColor: theme.sidebar_active_bg, color: theme.sidebar_text }}
-            >
-              <ChevronLeft size={16} /> Previous
-            </button>
-            <span className="text-sm" style={{ color: theme.sidebar_text }}>
-              Page {currentPage} of {totalPages}
-            </span>
+        {cursor && (
+          <div className="px-6 py-4 flex justify-center border-t" style={{ borderColor: theme.sidebar_active_bg }}>
             <button
-              onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))}
-              disabled={currentPage === totalPages}
-              className="flex items-center gap-1 px-3 py-2 text-sm rounded border disabled:opacity-50 disabled:cursor-not-allowed"
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="px-4 py-2 text-sm rounded border disabled:opacity-50 disabled:cursor-not-allowed"
               style={{ borderColor: theme.sidebar_active_bg, color: theme.sidebar_text }}
             >
-              Next <ChevronRight size={16} />
+              {loadingMore ? 'Loading…' : 'Load more'}
             </button>
           </div>
         )}
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import { Search, Trash2, CheckCircle, Minus, Plus } from 'lucide-react';
 import { useTheme } from '../../context/ThemeContext';
 import { useAuth } from '../../context/AuthContext';
+import { sizedImage } from '../../imageSizes';
 
 const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
 const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
@@ -24,7 +25,7 @@ const AVATARS = {
 
 const AvatarCircle = ({ item, size = 40 }) => {
   if (item.profile_photo) {
-    return <img src={item.profile_photo} alt={item.party_name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
+    return <img src={sizedImage(item.profile_photo, item.profile_photo_sizes, size)} alt={item.party_name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
   }
   const av = AVATARS[item.avatar_id];
   if (av) {
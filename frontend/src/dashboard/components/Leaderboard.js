@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Search, ChevronLeft, ChevronRight, Eye, Edit, EyeOff, ChevronDown, Trash2 } from 'lucide-react';
 import { useTheme } from '../../context/ThemeContext';
 import { useAuth } from '../../context/AuthContext';
+import { sizedImage } from '../../imageSizes';
 
 const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
 const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
@@ -19,7 +20,7 @@ const AVATARS = {
 
 const AvatarCircle = ({ item, size = 40 }) => {
   if (item.profile_photo) {
-    return <img src={item.profile_photo} alt={item.name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
+    return <img src={sizedImage(item.profile_photo, item.profile_photo_sizes, size)} alt={item.name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
   }
   const av = AVATARS[item.avatar_id];
   if (av) {
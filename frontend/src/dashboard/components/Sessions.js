@@ -1,9 +1,24 @@
 import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Search, ChevronDown, MoreVertical, Clock, Pencil, Minus, Plus } from 'lucide-react';
 import { useTheme } from '../../context/ThemeContext';
+import { sizedImage } from '../../imageSizes';
 
 const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
 const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
+const ENDED_PAGE_SIZE = 50;
+
+/* Map the ended-tab time filter to the API's date_from/date_to (local dates) */
+const isoDay = (d) => `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+const dateRangeParams = (timeFilter) => {
+  const daysAgo = (n) => { const d = new Date(); d.setDate(d.getDate() - n); return isoDay(d); };
+  switch (timeFilter) {
+    case 'today': return { date_from: daysAgo(0) };
+    case 'yesterday': return { date_from: daysAgo(1), date_to: daysAgo(1) };
+    case 'last7days': return { date_from: daysAgo(6) };
+    case 'last30days': return { date_from: daysAgo(29) };
+    default: return {};
+  }
+};
 
 /* Pre-built avatars (must match signup page) */
 const AVATARS = {
@@ -23,7 +38,7 @@ const AVATARS = {
 
 const AvatarCircle = ({ item, size = 40 }) => {
   if (item.profile_photo) {
-    return <img src={item.profile_photo} alt={item.party_name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
+    return <img src={sizedImage(item.profile_photo, item.profile_photo_sizes, size)} alt={item.party_name} className="rounded-full object-cover" style={{ width: size, height: size }} />;
   }
   const av = AVATARS[item.avatar_id];
   if (av) {
@@ -65,6 +80,8 @@ const Sessions = () => {
 
   const [liveSessions, setLiveSessions] = useState([]);
   const [endedSessions, setEndedSessions] = useState([]);
+  const [endedCursor, setEndedCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
 
   /* Controllers (for edit modal circles) */
@@ -113,13 +130,49 @@ const Sessions = () => {
     } catch { /* ignore */ }
   }, []);
 
-  /* Fetch ended sessions */
+  /* Fetch one page of ended sessions (filtered server-side) */
+  const endedUrl = useCallback((cursor) => {
+    const params = new URLSearchParams({ page_size: ENDED_PAGE_SIZE, ...dateRangeParams(timeFilter) });
+    if (query.trim()) params.set('q', query.trim());
+    if (cursor) params.set('cursor', cursor);
+    return `${API_BASE}/sessions/ended/?${params}`;
+  }, [timeFilter, query]);
+
+  /* Refresh the first page, keeping any older pages already loaded */
   const fetchEnded = useCallback(async () => {
     try {
-      const res = await fetch(`${API_BASE}/sessions/ended/`, { credentials: 'include' });
-      if (res.ok) setEndedSessions(await res.json());
+      const res = await fetch(endedUrl(), { credentials: 'include' });
+      if (!res.ok) return;
+      const page = await res.json();
+      setEndedSessions((prev) => {
+        if (prev.length <= ENDED_PAGE_SIZE) return page.results;
+        const ids = new Set(page.results.map((s) => s.id));
+        return [...page.results, ...prev.slice(ENDED_PAGE_SIZE).filter((s) => !ids.has(s.id))];
+      });
+      setEndedCursor((prev) => (prev && page.next_cursor ? prev : page.next_cursor));
     } catch { /* ignore */ }
-  }, []);
+  }, [endedUrl]);
+
+  /* Append the next page of ended sessions */
+  const loadMoreEnded = async () => {
+    if (!endedCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(endedUrl(endedCursor), { credentials: 'include' });
+      if (res.ok) {
+        const page = await res.json();
+        setEndedSessions((prev) => [...prev, ...page.results]);
+        setEndedCursor(page.next_cursor);
+      }
+    } catch { /* ignore */ }
+    setLoadingMore(false);
+  };
+
+  /* Start from the first page whenever the ended-tab filters change */
+  useEffect(() => {
+    setEndedSessions([]);
+    setEndedCursor(null);
+  }, [timeFilter, query]);
 
   /* Poll every 5 seconds */
   useEffect(() => {
@@ -299,7 +352,8 @@ const Sessions = () => {
 
   const currentSessions = activeTab === 'live' ? liveSessions : endedSessions;
 
-  const filteredSessions = currentSessions.filter((s) =>
+  /* Ended sessions are already filtered by the server */
+  const filteredSessions = activeTab === 'ended' ? currentSessions : currentSessions.filter((s) =>
     `${s.party_name} ${s.storyline_title} ${s.rfid_tag} ${s.email}`.toLowerCase().includes(query.toLowerCase())
   );
 
@@ -452,22 +506,23 @@ const Sessions = () => {
         </div>
 
         {/* Sessions pagination */}
-        <div className="px-6 py-4 flex items-center justify-between border-t" style={{ borderColor: theme.sidebar_active_bg }}>
-          <div>
-            <button className="flex items-center gap-2 px-3 py-2 border rounded text-sm" style={{ borderColor: theme.sidebar_active_bg, color: theme.sidebar_text }}>‹ Previous</button>
-          </div>
-
-          <div className="flex items-center gap-2 text-sm" style={{ color: theme.sidebar_text }}>
-            <button className="px-2 py-1 rounded border text-white" style={{ backgroundColor: primaryColor, borderColor: primaryColor }}>1</button>
-            <button className="px-2 py-1 rounded">2</button>
-            <button className="px-2 py-1 rounded">3</button>
-            <button className="px-2 py-1 rounded">10</button>
-          </div>
-
-          <div>
-            <button className="flex items-center gap-2 px-3 py-2 border rounded text-sm" style={{ borderColor: theme.sidebar_active_bg, color: theme.sidebar_text }}>Next ›</button>
+        {activeTab === 'ended' && endedSessions.length > 0 && (
+          <div className="px-6 py-4 flex items-center justify-between border-t" style={{ borderColor: theme.sidebar_active_bg }}>
+            <span className="text-sm" style={{ color: theme.sidebar_text }}>
+              Showing {endedSessions.length} session{endedSessions.length !== 1 ? 's' : ''}
+            </span>
+            {endedCursor && (
+              <button
+                onClick={loadMoreEnded}
+                disabled={loadingMore}
+                className="px-3 py-2 border rounded text-sm disabled:opacity-50"
+                style={{ borderColor: theme.sidebar_active_bg, color: theme.sidebar_text }}
+              >
+                {loadingMore ? 'Loading…' : 'Load more'}
+              </button>
+            )}
           </div>
-        </div>
+        )}
       </div>
 
       {/* ─── Edit Session Modal ─── */}
@@ -500,7 +555,7 @@ const Sessions = () => {
                 {/* Profile photo — left side */}
                 <div className="flex-shrink-0">
                   {editItem.profile_photo ? (
-                    <img src={editItem.profile_photo} alt={editItem.party_name} className="w-24 h-24 rounded-full object-cover" />
+                    <img src={sizedImage(editItem.profile_photo, editItem.profile_photo_sizes, 96)} alt={editItem.party_name} className="w-24 h-24 rounded-full object-cover" />
                   ) : editItem.avatar_id && AVATARS[editItem.avatar_id] ? (
                     <svg viewBox="0 0 80 80" width={96} height={96}>
                       <rect width="80" height="80" rx="40" fill={AVATARS[editItem.avatar_id].bg} />
@@ -0,0 +1,13 @@
+/* Pick the smallest resized copy of an upload (generated by the backend's
+   accounts/images.py) that covers a `px` CSS pixel square; fall back to the
+   original. Photos are shown as object-cover squares, so sizes are measured
+   on the image's short side. */
+const SHORT_SIDE_PIXELS = { thumb: 128, small: 320, medium: 800 };
+
+export const sizedImage = (url, sizes, px) => {
+  if (!sizes) return url;
+  const needed = px * (window.devicePixelRatio || 1);
+  const names = Object.keys(SHORT_SIDE_PIXELS).filter((name) => sizes[name]);
+  const name = names.find((n) => SHORT_SIDE_PIXELS[n] >= needed) || names[names.length - 1];
+  return name ? sizes[name].webp : url;
+};
@@ -1,5 +1,7 @@
 import React, { useState, useEffect, useCallback, useRef } from "react";
 import { motion, AnimatePresence, useMotionValue, useTransform, animate } from "framer-motion";
+import useLeaderboardFeed from "./useLeaderboardFeed";
+import { sizedImage } from "../imageSizes";
 
 // Automatically detect host IP/hostname for the backend API
 const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
@@ -42,7 +44,7 @@ const TeamAvatar = ({ team, size = 64 }) => {
   if (team.profile_photo) {
     return (
       <img
-        src={team.profile_photo}
+        src={sizedImage(team.profile_photo, team.profile_photo_sizes, size)}
         alt={team.name}
         className="rounded-full object-cover"
         style={{ width: size, height: size }}
@@ -102,7 +104,7 @@ const GroupAvatars = ({ team, size = 80 }) => {
         style={{ border: "3px solid #00BFFF", width: size, height: size }}
       >
         <img
-          src={team.profile_photo}
+          src={sizedImage(team.profile_photo, team.profile_photo_sizes, size)}
           alt={team.name}
           className="w-full h-full object-cover"
         />
@@ -224,38 +226,35 @@ export default function LeaderboardPage() {
       .catch(() => {});
   }, []);
 
-  const fetchData = useCallback(() => {
-    Promise.all([
-      fetch(`${API_BASE}/public/leaderboard/?filter=${filter}`).then((r) => r.json()).catch(() => []),
-      fetch(`${API_BASE}/public/controllers/`).then((r) => r.json()).catch(() => []),
-    ]).then(([leaderboardData, controllerData]) => {
-      if (Array.isArray(leaderboardData)) {
-        // Detect score increases
-        const newlyScored = new Set();
-        leaderboardData.forEach((team) => {
-          const prev = prevScoresRef.current[team.id];
-          if (prev !== undefined && team.points > prev) {
-            newlyScored.add(team.id);
-          }
-          prevScoresRef.current[team.id] = team.points;
-        });
-        if (newlyScored.size > 0) {
-          setScoredIds(newlyScored);
-          setTimeout(() => setScoredIds(new Set()), 2000);
-        }
-        setTeams(leaderboardData);
+  const fetchControllers = useCallback(() => {
+    fetch(`${API_BASE}/public/controllers/`)
+      .then((r) => r.json())
+      .then((controllerData) => { if (Array.isArray(controllerData)) setControllers(controllerData); })
+      .catch(() => {});
+  }, []);
+
+  const applyLeaderboard = useCallback((leaderboardData) => {
+    // Detect score increases
+    const newlyScored = new Set();
+    leaderboardData.forEach((team) => {
+      const prev = prevScoresRef.current[team.id];
+      if (prev !== undefined && team.points > prev) {
+        newlyScored.add(team.id);
       }
-      if (Array.isArray(controllerData)) setControllers(controllerData);
-      setLoading(false);
+      prevScoresRef.current[team.id] = team.points;
     });
-  }, [filter]);
+    if (newlyScored.size > 0) {
+      setScoredIds(newlyScored);
+      setTimeout(() => setScoredIds(new Set()), 2000);
+    }
+    setTeams(leaderboardData);
+    // Checkpoint totals depend on the controller list; it is revalidated cheaply (ETag)
+    fetchControllers();
+    setLoading(false);
+  }, [fetchControllers]);
 
-  /* Poll every 5 seconds for live updates */
-  useEffect(() => {
-    fetchData();
-    const interval = setInterval(fetchData, 5000);
-    return () => clearInterval(interval);
-  }, [fetchData]);
+  /* Live updates pushed over the leaderboard websocket (HTTP polling fallback) */
+  useLeaderboardFeed(filter, applyLeaderboard);
 
   useEffect(() => {
     if (!autoRotate) return undefined;
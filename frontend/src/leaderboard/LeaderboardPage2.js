@@ -1,5 +1,7 @@
 import React, { useState, useEffect, useCallback, useRef } from "react";
 import { motion, AnimatePresence, useMotionValue, useTransform, animate } from "framer-motion";
+import useLeaderboardFeed from "./useLeaderboardFeed";
+import { sizedImage } from "../imageSizes";
 
 const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
 const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
@@ -41,7 +43,7 @@ const TeamAvatar = ({ team, size = 56 }) => {
   if (team.profile_photo) {
     return (
       <img
-        src={team.profile_photo}
+        src={sizedImage(team.profile_photo, team.profile_photo_sizes, size)}
         alt={team.name}
         className="rounded-full object-cover"
         style={{ width: size, height: size }}
@@ -171,36 +173,25 @@ export default function LeaderboardPage2() {
       .catch(() => {});
   }, []);
 
-  const fetchLeaderboard = useCallback(() => {
-    fetch(`${API_BASE}/public/leaderboard/?filter=${filter}`)
-      .then((res) => res.json())
-      .then((data) => {
-        if (Array.isArray(data)) {
-          const newlyScored = new Set();
-          data.forEach((team) => {
-            const prev = prevScoresRef.current[team.id];
-            if (prev !== undefined && team.points > prev) {
-              newlyScored.add(team.id);
-            }
-            prevScoresRef.current[team.id] = team.points;
-          });
-          if (newlyScored.size > 0) {
-            setScoredIds(newlyScored);
-            setTimeout(() => setScoredIds(new Set()), 2000);
-          }
-          setTeams(data);
-        }
-      })
-      .catch(() => {})
-      .finally(() => setLoading(false));
-  }, [filter]);
+  const applyLeaderboard = useCallback((data) => {
+    const newlyScored = new Set();
+    data.forEach((team) => {
+      const prev = prevScoresRef.current[team.id];
+      if (prev !== undefined && team.points > prev) {
+        newlyScored.add(team.id);
+      }
+      prevScoresRef.current[team.id] = team.points;
+    });
+    if (newlyScored.size > 0) {
+      setScoredIds(newlyScored);
+      setTimeout(() => setScoredIds(new Set()), 2000);
+    }
+    setTeams(data);
+    setLoading(false);
+  }, []);
 
-  /* Poll every 5 seconds for live updates */
-  useEffect(() => {
-    fetchLeaderboard();
-    const interval = setInterval(fetchLeaderboard, 5000);
-    return () => clearInterval(interval);
-  }, [fetchLeaderboard]);
+  /* Live updates pushed over the leaderboard websocket (HTTP polling fallback) */
+  useLeaderboardFeed(filter, applyLeaderboard);
 
   useEffect(() => {
     if (!autoRotate) return undefined;
@@ -0,0 +1,115 @@
+import { useEffect, useRef } from "react";
+
+const defaultApiBase = `http://${window.location.hostname}:8000/api/auth`;
+const API_BASE = process.env.REACT_APP_API_BASE || defaultApiBase;
+// ws://host:8000/ws/leaderboard/ derived from the API base
+const WS_BASE = API_BASE.replace(/^http/, "ws").replace(/\/api\/auth\/?$/, "");
+
+const POLL_MS = 5000;
+const MAX_RECONNECT_MS = 30000;
+
+/* Same order as the server: points desc, then signup time, then id */
+const compareRows = (a, b) =>
+  (b.points - a.points) || a.created_at.localeCompare(b.created_at) || (a.id - b.id);
+
+const applyDelta = (rows, delta) => {
+  const updates = new Map([...delta.changed, ...delta.inserted].map((row) => [row.id, row]));
+  const removed = new Set(delta.removed);
+  const next = rows
+    .filter((row) => !removed.has(row.id))
+    .map((row) => updates.get(row.id) || row);
+  delta.inserted.forEach((row) => next.push(row));
+  return next.sort(compareRows);
+};
+
+/*
+ * Subscribe to the live leaderboard for a filter.
+ *
+ * Updates are pushed over ws/leaderboard/ as soon as the board changes:
+ * the whole board once, then deltas that are applied locally. A delta that
+ * does not follow the board we hold (sequence gap or server restart)
+ * triggers a resync. While the socket is down the board is polled over
+ * HTTP instead, and the socket is reconnected with backoff.
+ */
+export default function useLeaderboardFeed(filter, onBoard) {
+  const onBoardRef = useRef(onBoard);
+  onBoardRef.current = onBoard;
+
+  useEffect(() => {
+    let ws = null;
+    let pollTimer = null;
+    let reconnectTimer = null;
+    let reconnectMs = 1000;
+    let closed = false;
+    // Board held from the socket: { epoch, seq, rows }
+    let board = null;
+    let resyncing = false;
+
+    const poll = () => {
+      fetch(`${API_BASE}/public/leaderboard/?filter=${filter}`)
+        .then((r) => r.json())
+        .then((data) => { if (Array.isArray(data)) onBoardRef.current(data); })
+        .catch(() => {});
+    };
+
+    const startPolling = () => {
+      if (pollTimer) return;
+      poll();
+      pollTimer = setInterval(poll, POLL_MS);
+    };
+
+    const stopPolling = () => {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    };
+
+    const connect = () => {
+      try {
+        ws = new WebSocket(`${WS_BASE}/ws/leaderboard/?filter=${filter}`);
+      } catch {
+        startPolling();
+        return;
+      }
+      ws.onopen = () => {
+        reconnectMs = 1000;
+        stopPolling();
+      };
+      ws.onmessage = (event) => {
+        try {
+          const payload = JSON.parse(event.data);
+          if (payload.type === "leaderboard_update" && Array.isArray(payload.leaderboard)) {
+            board = { epoch: payload.epoch, seq: payload.seq, rows: payload.leaderboard };
+            resyncing = false;
+            onBoardRef.current(board.rows);
+          } else if (payload.type === "leaderboard_delta") {
+            if (!board || payload.epoch !== board.epoch || payload.base_seq !== board.seq) {
+              // Ask once; later deltas are ignored until the whole board arrives
+              if (board !== null || !resyncing) ws.send(JSON.stringify({ type: "resync" }));
+              board = null;
+              resyncing = true;
+              return;
+            }
+            board = { epoch: payload.epoch, seq: payload.seq, rows: applyDelta(board.rows, payload) };
+            onBoardRef.current(board.rows);
+          }
+        } catch { /* ignore */ }
+      };
+      ws.onclose = () => {
+        board = null;
+        resyncing = false;
+        if (closed) return;
+        startPolling();
+        reconnectTimer = setTimeout(connect, reconnectMs);
+        reconnectMs = Math.min(reconnectMs * 2, MAX_RECONNECT_MS);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      stopPolling();
+      clearTimeout(reconnectTimer);
+      if (ws) ws.close();
+    };
+  }, [filter]);
+}
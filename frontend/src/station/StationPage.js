@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useLocation, useNavigate, useParams, useSearchParams } from 'react-router-dom';
+import { sizedImage } from '../imageSizes';
 
 // Inject CSS animation for pulse effect
 if (typeof document !== 'undefined' && !document.getElementById('station-pulse-css')) {
@@ -99,7 +100,7 @@ const AVATARS = {
 const RecentAvatar = ({ scan }) => {
   const size = 28;
   if (scan.profile_photo) {
-    return <img src={scan.profile_photo} alt="" style={{ width: size, height: size, borderRadius: '50%', objectFit: 'cover', flexShrink: 0 }} />;
+    return <img src={sizedImage(scan.profile_photo, scan.profile_photo_sizes, size)} alt="" style={{ width: size, height: size, borderRadius: '50%', objectFit: 'cover', flexShrink: 0 }} />;
   }
   const av = AVATARS[scan.avatar_id];
   if (av) {
@@ -1,61 +1,152 @@
 """API client for communicating with the Django backend."""
-import httpx
 import logging
+import time
 from typing import Optional, Dict, Any
 
+from control_link import ControlLink, LinkUnavailable
+from staff_cache import StaffCache
+from transport import BackendTransport, CircuitBreaker, EndpointPolicy
+
 logger = logging.getLogger(__name__)
 
+# Timeouts and retry safety per endpoint. Scans are user-facing and must
+# fail fast; calls the backend deduplicates (or that only read) may be
+# retried after an ambiguous failure.
+ENDPOINT_POLICIES = {
+    'rfid/scan/': EndpointPolicy(connect_timeout=1.0, read_timeout=3.0, retries=1),
+    'rfid/start/': EndpointPolicy(connect_timeout=1.0, read_timeout=3.0, retries=1),
+    'rfid/stop/': EndpointPolicy(connect_timeout=1.0, read_timeout=3.0, retries=1),
+    'rfid/checkpoint/': EndpointPolicy(connect_timeout=1.0, read_timeout=3.0, idempotent=True),
+    'rfid/check-staff/': EndpointPolicy(connect_timeout=1.0, read_timeout=2.0, idempotent=True),
+    'rfid/staff-tags/': EndpointPolicy(read_timeout=10.0, idempotent=True),
+    'stations/events/': EndpointPolicy(read_timeout=10.0, idempotent=True),
+    'controllers/health/': EndpointPolicy(read_timeout=5.0, idempotent=True, retries=0),
+}
+
 
 class BackendAPIClient:
     """Client for communicating with the Arena backend API."""
     
-    def __init__(self, base_url: str, station_id: str):
+    def __init__(self, base_url: str, station_id: str, staff_cache: Optional[StaffCache] = None,
+                 http2: bool = False, max_connections: int = 10, keepalive_expiry: float = 120.0,
+                 breaker: Optional[CircuitBreaker] = None, station_token: str = ""):
         self.base_url = base_url.rstrip('/')
         self.station_id = station_id
-        self.client = httpx.AsyncClient(timeout=10.0)
+        # Shared STATION_TOKEN; sent to endpoints that only stations may call
+        self.station_token = station_token
+        # Staff answers from scan/check-staff responses are remembered here
+        self.staff_cache = staff_cache
+        # Control link to the backend; preferred over HTTP while connected
+        self.link: Optional[ControlLink] = None
+        self.transport = BackendTransport(
+            self.base_url,
+            policies=ENDPOINT_POLICIES,
+            http2=http2,
+            max_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+            breaker=breaker,
+        )
         logger.info(f"API Client initialized: {base_url}")
     
     async def close(self):
         """Close the HTTP client."""
-        await self.client.aclose()
-    
-    async def _post(self, endpoint: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Make a POST request to the backend."""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        try:
-            logger.debug(f"POST {url} - {data}")
-            response = await self.client.post(url, json=data)
-            result = response.json()
-            logger.debug(f"Response ({response.status_code}): {result}")
-            if response.status_code >= 400:
-                # Return the error response so callers can see error messages
-                return {'error': result.get('error', f'HTTP {response.status_code}'), '_status': response.status_code}
-            return result
-        except Exception as e:
-            logger.error(f"Request failed: {e}")
-            return None
+        await self.transport.close()
     
-    async def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-        """Make a GET request to the backend."""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        try:
-            logger.debug(f"GET {url} - {params}")
-            response = await self.client.get(url, params=params)
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Response: {result}")
-            return result
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error {e.response.status_code}: {e.response.text}")
-            return None
-        except Exception as e:
-            logger.error(f"Request failed: {e}")
+    @property
+    def backend_state(self) -> str:
+        """Circuit breaker state: 'closed' (healthy), 'open' or 'half-open'."""
+        return self.transport.breaker.state
+    
+    async def warm(self):
+        """Open a backend connection ahead of the next scan."""
+        await self.transport.warm('rfid/scan/')
+    
+    async def _post(self, endpoint: str, data: Dict[str, Any],
+                    timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Make a POST request to the backend.
+        
+        Returns the response body, the body plus 'error'/'_status' for 4xx
+        responses, or None if the backend could not answer.
+        """
+        return await self.transport.request('POST', endpoint, json=data, timeout=timeout)
+    
+    async def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                   headers: Optional[Dict[str, str]] = None) -> Any:
+        """Make a GET request to the backend (same results as _post)."""
+        return await self.transport.request('GET', endpoint, params=params, headers=headers)
+    
+    async def _send(self, endpoint: str, link_type: str, data: Dict[str, Any],
+                    timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Send a request over the control link if it is up, else POST it.
+        
+        Same results as _post. A request the link could not send falls back
+        to HTTP; one that was sent but not answered in time returns None,
+        as an HTTP read timeout would.
+        """
+        if self.link is not None and self.link.connected:
+            policy = self.transport.policy_for(endpoint)
+            wait = policy.read_timeout if timeout is None else min(timeout, policy.read_timeout)
+            try:
+                reply = await self.link.request(link_type, data, wait)
+            except LinkUnavailable:
+                pass
+            else:
+                return self._link_result(reply)
+        return await self._post(endpoint, data, timeout=timeout)
+    
+    @staticmethod
+    def _link_result(reply: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Shape a control link response like BackendTransport.request does."""
+        if not reply or reply.get('status', 500) >= 500:
             return None
+        body = reply.get('body')
+        if reply['status'] >= 400:
+            body = body if isinstance(body, dict) else {}
+            return {**body, 'error': body.get('error', f"HTTP {reply['status']}"), '_status': reply['status']}
+        return body
     
     # ========================================================================
     # RFID Session Endpoints
     # ========================================================================
     
+    async def scan(self, rfid_tag: str, station_mode: str, controller_ip: str = '',
+                   session_rfid: str = '') -> Optional[Dict[str, Any]]:
+        """Handle an RFID scan in one round trip.
+        
+        The backend resolves staff vs. player card and applies the transition
+        for the station mode in a single transaction.
+        
+        Args:
+            rfid_tag: The scanned RFID tag.
+            station_mode: 'ready', 'active' or 'result'.
+            controller_ip: IP of the controller station.
+            session_rfid: Tag of the session playing here (ACTIVE mode), so a
+                staff card can stop it.
+        
+        Returns a dict with:
+        - action: 'start', 'stop', 'staff', 'reset' or 'ignored'
+        - is_staff / staff: the staff member for staff cards
+        - result: the start_session / stop_session body for 'start' / 'stop'
+        
+        Or error dict with 'error' key if a start failed (same fields as
+        start_session errors).
+        """
+        data = {'rfid': rfid_tag, 'station_mode': station_mode}
+        if controller_ip:
+            data['controller_ip'] = controller_ip
+        if session_rfid:
+            data['session_rfid'] = session_rfid
+        result = await self._send('rfid/scan/', 'scan', data)
+        if self.staff_cache is not None:
+            self.staff_cache.record_scan(rfid_tag, result)
+        if result and not result.get('error'):
+            logger.info(f"✅ Scan {rfid_tag} ({station_mode}): {result.get('action')}")
+        elif result and result.get('error'):
+            logger.warning(f"❌ Scan error for {rfid_tag}: {result.get('error')}")
+        else:
+            logger.warning(f"❌ Failed to process scan for {rfid_tag} (no response)")
+        return result
+    
     async def start_session(self, rfid_tag: str, controller_ip: str = '') -> Optional[Dict[str, Any]]:
         """Start a game session for the given RFID tag.
         
@@ -152,14 +243,34 @@ class BackendAPIClient:
     async def check_staff(self, rfid_tag: str) -> Optional[Dict[str, Any]]:
         """Check if an RFID tag belongs to a staff member.
         
-        Returns staff info if valid, None otherwise.
+        Returns staff info if valid, None otherwise. Answers come from the
+        staff cache when it holds the tag.
         """
+        if self.staff_cache is not None:
+            hit, staff = self.staff_cache.lookup(rfid_tag)
+            if hit:
+                return staff
         result = await self._post('rfid/check-staff/', {'rfid': rfid_tag})
+        # 404/403 mean "not staff"; no answer is not cached
+        if self.staff_cache is not None and result is not None:
+            self.staff_cache.put(rfid_tag, result if result.get('is_staff') else None)
         # Only return a truthy result if it's actually a staff member
         if result and result.get('is_staff'):
             return result
         return None
     
+    async def get_staff_tags(self) -> Optional[list]:
+        """Get every active staff member with an RFID tag (for the staff cache).
+        
+        Returns a list of {rfid_tag, staff_id, username} entries, or None if
+        the backend could not be reached or refused the station token.
+        """
+        result = await self._get('rfid/staff-tags/',
+                                 headers={'Authorization': f'Bearer {self.station_token}'})
+        if result is None or result.get('error'):
+            return None
+        return result.get('staff', [])
+    
     async def get_station_recent_scans(self, station_ip: str, limit: int = 10) -> Optional[list]:
         """Get recent RFID scans for a station.
         
@@ -169,7 +280,22 @@ class BackendAPIClient:
             'station_ip': station_ip,
             'limit': limit
         })
-        return result if result else []
+        return result if isinstance(result, list) else []
+    
+    # ========================================================================
+    # Offline Journal
+    # ========================================================================
+    
+    async def send_events(self, events: list, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Send a batch of journaled events (see journal.py).
+        
+        Returns {'results': [...]} with one result per event, in order, or
+        None if the backend could not be reached in time.
+        """
+        return await self._send('stations/events/', 'events', {
+            'sent_at': time.time(),
+            'events': events,
+        }, timeout=timeout)
     
     # ========================================================================
     # Public Endpoints
@@ -178,12 +304,12 @@ class BackendAPIClient:
     async def get_storylines(self) -> Optional[list]:
         """Get all available storylines."""
         result = await self._get('public/storylines/')
-        return result if result else []
+        return result if isinstance(result, list) else []
     
     async def get_leaderboard(self) -> Optional[list]:
         """Get public leaderboard."""
         result = await self._get('public/leaderboard/')
-        return result if result else []
+        return result if isinstance(result, list) else []
     
     # ========================================================================
     # Health Reporting
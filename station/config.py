@@ -14,6 +14,13 @@ class Settings(BaseSettings):
     backend_url: str = "http://192.168.50.10:8000"
     api_base_url: Optional[str] = None
     
+    # Backend HTTP transport
+    http2_enabled: bool = False  # Needs the h2 package and an https BACKEND_URL
+    http_max_connections: int = 10
+    http_keepalive_expiry: float = 120.0  # Seconds an idle pooled connection is kept
+    circuit_failure_threshold: int = 3  # Consecutive failures before failing fast
+    circuit_reset_timeout: float = 10.0  # Seconds before a trial call is let through
+    
     # Hardware GPIO pins (BCM numbering)
     stop_button_pin: int = 17
     hint_button_pin: int = 27
@@ -23,15 +30,41 @@ class Settings(BaseSettings):
     
     # NFC/RFID
     nfc_enabled: bool = True
+    nfc_irq_pin: Optional[int] = None  # PN532 IRQ line (BCM); polling mode if not set
+    nfc_active_interval: float = 0.02  # Seconds between polls right after a card was seen
+    nfc_idle_interval: float = 0.25  # Seconds between polls once the reader is idle
+    nfc_idle_after: float = 10.0  # Seconds without a card before polling reaches the idle interval
+    nfc_removal_debounce: float = 0.3  # Seconds without a read before a card counts as removed
+    
+    # Staff card cache (seconds); the backend pushes invalidations
+    staff_cache_ttl: int = 900
+    staff_cache_negative_ttl: int = 60
+    staff_cache_refresh_interval: int = 300
+    
+    # Offline journal (store-and-forward of stops and health reports)
+    journal_path: Optional[str] = None  # Defaults to journal.db in the station directory
+    journal_batch_size: int = 50
+    journal_live_timeout: float = 1.0  # Seconds to wait for the backend before showing a provisional result
     
     # Station server
     station_port: int = 8001
     station_host: str = "0.0.0.0"
     station_ip: Optional[str] = None  # Explicit IP (e.g. Ethernet IP); auto-detected if not set
     
+    # Health metrics
+    health_sample_interval: float = 5.0  # Seconds between samples on the sampler thread
+    health_report_interval: float = 15.0  # Seconds between buffered health samples
+    health_flush_interval: float = 60.0  # Seconds between health batches sent to the backend
+    health_buffer_size: int = 100  # Samples kept while batches cannot be queued
+    
+    # Control link to the backend (ws/station/<id>/control/); off while no token is set
+    station_token: str = ""  # Must match STATION_TOKEN in the backend settings
+    
     # WebSocket
-    ws_reconnect_delay: int = 5
-    ws_heartbeat_interval: int = 30
+    ws_reconnect_delay: int = 5  # Control link: first reconnect delay (seconds)
+    ws_heartbeat_interval: int = 30  # Control link: seconds between heartbeats
+    ws_queue_size: int = 64  # Messages queued per screen before it is dropped
+    ws_send_timeout: float = 2.0  # Seconds one send may take before the screen is dropped
     
     # Debug
     debug: bool = False
@@ -0,0 +1,175 @@
+"""Persistent control link between the station and the Django backend.
+
+One authenticated websocket to ``ws/station/<station_id>/control/`` carries:
+
+- heartbeats, which give the dashboard live presence for the station,
+- scans, journal batches and health samples as id-tagged requests,
+  answered on the same socket (no connection setup per call),
+- pushes from the backend: config changes and staff cache invalidations.
+
+The link reconnects on its own with jittered backoff. Callers never
+depend on it: ``request()`` raises LinkUnavailable while it is down and
+the API client falls back to HTTP (see api_client.py).
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlencode, urlsplit
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# Close codes the backend uses to refuse a link
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_UNKNOWN_STATION = 4404
+
+
+class LinkUnavailable(Exception):
+    """Raised when a request cannot be sent over the link."""
+
+
+def control_url(backend_url: str, station_id: str, station_ip: str) -> str:
+    """Build the control link URL from the backend's HTTP URL (the token goes in a header)."""
+    parts = urlsplit(backend_url)
+    scheme = 'wss' if parts.scheme == 'https' else 'ws'
+    route_id = re.sub(r'\W', '_', station_id) or 'station'
+    query = urlencode({'ip': station_ip})
+    return f"{scheme}://{parts.netloc}/ws/station/{route_id}/control/?{query}"
+
+
+class ControlLink:
+    """Reconnecting websocket with request/response and push handlers."""
+
+    def __init__(self, url: str, token: str = '',
+                 handlers: Optional[Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]]] = None,
+                 heartbeat_interval: float = 30.0, reconnect_delay: float = 5.0,
+                 max_reconnect_delay: float = 60.0):
+        self.url = url
+        self.token = token
+        self.handlers = handlers or {}
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected_at: Optional[float] = None
+        self.last_error: str = ''
+        self._ws = None
+        self._last_received = 0.0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    async def run(self):
+        """Keep the link open until cancelled."""
+        delay = self.reconnect_delay
+        while True:
+            close_code = None
+            try:
+                async with websockets.connect(self.url, open_timeout=5, ping_interval=None,
+                                              close_timeout=2, max_size=2 ** 22,
+                                              extra_headers={'Authorization': f'Bearer {self.token}'}) as ws:
+                    self._ws = ws
+                    self.connected_at = time.time()
+                    self._last_received = time.monotonic()
+                    self.last_error = ''
+                    delay = self.reconnect_delay
+                    logger.info("🔗 Control link to backend connected")
+                    heartbeat = asyncio.create_task(self._heartbeat(ws))
+                    try:
+                        async for text in ws:
+                            await self._dispatch(text)
+                    finally:
+                        heartbeat.cancel()
+            except asyncio.CancelledError:
+                self._ws = None  # Shutting down, not lost
+                raise
+            except websockets.ConnectionClosed as e:
+                close_code = getattr(e.rcvd, 'code', None)
+                self.last_error = f'closed ({close_code})'
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+            finally:
+                if self._ws is not None:
+                    logger.warning(f"🔗 Control link lost: {self.last_error or 'closed'}")
+                self._ws = None
+                self.connected_at = None
+                self._fail_pending()
+
+            if close_code in (CLOSE_UNAUTHORIZED, CLOSE_UNKNOWN_STATION):
+                reason = 'invalid STATION_TOKEN' if close_code == CLOSE_UNAUTHORIZED else 'unknown station IP'
+                logger.error(f"🔗 Backend refused the control link: {reason}")
+                delay = self.max_reconnect_delay
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _heartbeat(self, ws):
+        """Send heartbeats; drop the connection if the backend goes quiet."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if time.monotonic() - self._last_received > self.heartbeat_interval * 2.5:
+                logger.warning("🔗 No heartbeat acknowledgement from backend — reconnecting")
+                await ws.close()
+                return
+            try:
+                await ws.send(json.dumps({'type': 'heartbeat'}))
+            except websockets.ConnectionClosed:
+                return
+
+    async def _dispatch(self, text: str):
+        self._last_received = time.monotonic()
+        try:
+            message = json.loads(text)
+        except ValueError:
+            logger.warning("Invalid JSON on control link")
+            return
+        message_type = message.get('type')
+        if message_type == 'response':
+            future = self._pending.pop(message.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        elif message_type in self.handlers:
+            try:
+                await self.handlers[message_type](message)
+            except Exception as e:
+                logger.warning(f"Control link {message_type} handler failed: {e}")
+        elif message_type not in ('heartbeat_ack', 'pong'):
+            logger.debug(f"Unhandled control link message: {message_type}")
+
+    def _fail_pending(self):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(None)
+        self._pending.clear()
+
+    async def request(self, message_type: str, data: Dict[str, Any],
+                      timeout: float) -> Optional[Dict[str, Any]]:
+        """Send a request and wait for its response.
+
+        Returns {'status', 'body'}, or None if no answer arrived in time (the
+        backend may still have applied it). Raises LinkUnavailable if the
+        request could not be sent at all.
+        """
+        ws = self._ws
+        if ws is None:
+            raise LinkUnavailable()
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            try:
+                await ws.send(json.dumps({'type': message_type, 'id': request_id, 'data': data}))
+            except websockets.ConnectionClosed:
+                raise LinkUnavailable()
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                return None
+        finally:
+            self._pending.pop(request_id, None)
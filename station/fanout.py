@@ -0,0 +1,101 @@
+"""Bounded, concurrent fan-out to the station's websocket clients.
+
+Each connected screen gets its own outbound queue and writer task, so a
+broadcast only serializes the message once and enqueues it; one stalled
+browser tab can no longer hold up ``session_started`` for the others.
+
+Slow clients are handled in two steps: a client whose queue is more than
+half full is marked lagging, and a client whose queue overflows or whose
+send does not finish within the send timeout is disconnected. Dropping
+(rather than skipping messages) keeps screens consistent: on reconnect
+the client receives the full station state in its ``connection`` message.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close code 1013: "Try Again Later"
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def encode(message: Dict[str, Any]) -> str:
+    """Serialize a message the way ``WebSocket.send_json`` does."""
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+
+class FanoutClient:
+    """One websocket client with a bounded outbound queue."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int = 64, send_timeout: float = 2.0):
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.lagging = False
+        self.closed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def offer(self, text: str) -> bool:
+        """Queue an encoded message; returns False if the client was dropped."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.drop('outbound queue full')
+            return False
+        lagging = self.queue.qsize() > self.queue.maxsize // 2
+        if lagging and not self.lagging:
+            logger.warning(f"🐢 WebSocket client lagging ({self.queue.qsize()} queued)")
+        self.lagging = lagging
+        return True
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        return self.offer(encode(message))
+
+    async def _write_loop(self):
+        while True:
+            text = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.drop(f'send took longer than {self.send_timeout}s')
+                return
+            except Exception as e:
+                self.drop(f'send failed: {e}')
+                return
+            if self.lagging and self.queue.qsize() <= self.queue.maxsize // 2:
+                self.lagging = False
+
+    def drop(self, reason: str):
+        """Disconnect a slow or broken client without waiting on it."""
+        if self.closed:
+            return
+        self.closed = True
+        logger.warning(f"❌ Dropping WebSocket client: {reason}")
+        asyncio.create_task(self._close_socket())
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=CLOSE_TRY_AGAIN_LATER), self.send_timeout)
+        except Exception:
+            pass
+
+    async def stop(self):
+        """Stop the writer once the client has disconnected."""
+        self.closed = True
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -2,6 +2,8 @@
 import asyncio
 import logging
 import os
+import threading
+import time
 from typing import Callable, Optional
 from abc import ABC, abstractmethod
 
@@ -19,8 +21,9 @@ class NFCReader(ABC):
     """Abstract NFC/RFID reader interface."""
     
     @abstractmethod
-    async def start(self, on_card_detected: Callable[[str], None]):
-        """Start reading cards and call callback when detected."""
+    async def start(self, on_card_detected: Callable[[str], None],
+                    on_card_removed: Optional[Callable[[str], None]] = None):
+        """Start reading cards and call the callbacks when a card arrives or leaves."""
         pass
     
     @abstractmethod
@@ -79,7 +82,8 @@ class SimulatedNFCReader(NFCReader):
         self.task = None
         self.on_card_detected = None
     
-    async def start(self, on_card_detected: Callable[[str], None]):
+    async def start(self, on_card_detected: Callable[[str], None],
+                    on_card_removed: Optional[Callable[[str], None]] = None):
         """Start simulated reader."""
         self.on_card_detected = on_card_detected
         self.running = True
@@ -156,9 +160,32 @@ class SimulatedRelay(Relay):
 # ============================================================================
 
 class RaspberryPiNFCReader(NFCReader):
-    """Real NFC reader using PN532."""
-    
-    def __init__(self):
+    """Real NFC reader using PN532.
+    
+    All I2C traffic runs on one dedicated I/O thread that owns the bus, so
+    reads never compete for (or permanently occupy) the event loop's
+    default thread pool. Detected cards are handed to the event loop with
+    call_soon_threadsafe.
+    
+    Two ways of waiting for a card:
+    - IRQ mode (irq_pin set): the reader is armed with
+      listen_for_passive_target and the thread sleeps on the PN532 IRQ
+      line (active low) until a card answers, so an idle station does no
+      I2C traffic at all.
+    - Polling mode: short read_passive_target calls at an adaptive
+      interval — fast right after activity, backing off to idle_interval
+      once no card has been seen for idle_after seconds.
+    
+    While a card is on the reader it is polled for presence; it only
+    counts as removed after removal_debounce seconds without a read, so a
+    single missed read can no longer report the same tap twice.
+    """
+    
+    READ_TIMEOUT = 0.1  # Seconds per read_passive_target call in polling mode
+    
+    def __init__(self, irq_pin: Optional[int] = None, active_interval: float = 0.02,
+                 idle_interval: float = 0.25, idle_after: float = 10.0,
+                 removal_debounce: float = 0.3, reinit_after: float = 300.0):
         try:
             import board
             import busio
@@ -170,93 +197,124 @@ class RaspberryPiNFCReader(NFCReader):
             # Create PN532 object (SAM_configuration called in start() after all hardware is ready)
             self.pn532 = PN532_I2C(i2c, debug=False)
             
+            self.irq = None
+            if irq_pin is not None:
+                from gpiozero import DigitalInputDevice
+                # IRQ is active low: with the pull-up, "active" means a card answered
+                self.irq = DigitalInputDevice(irq_pin, pull_up=True)
+            
+            self.active_interval = active_interval
+            self.idle_interval = idle_interval
+            self.idle_after = idle_after
+            self.removal_debounce = removal_debounce
+            self.reinit_after = reinit_after
+            
             self.running = False
-            self.task = None
+            self.thread = None
+            self._loop = None
             self.on_card_detected = None
-            logger.info("✅ PN532 NFC reader initialized (SAM config pending start)")
+            self.on_card_removed = None
+            mode = f"IRQ on GPIO{irq_pin}" if irq_pin is not None else "polling"
+            logger.info(f"✅ PN532 NFC reader initialized ({mode}, SAM config pending start)")
         except Exception as e:
             logger.error(f"❌ Failed to initialize NFC reader: {e}")
             raise
     
-    async def start(self, on_card_detected: Callable[[str], None]):
+    async def start(self, on_card_detected: Callable[[str], None],
+                    on_card_removed: Optional[Callable[[str], None]] = None):
         """Start reading cards."""
         self.on_card_detected = on_card_detected
+        self.on_card_removed = on_card_removed
+        self._loop = asyncio.get_running_loop()
         self.running = True
-        # Configure PN532 here (after all other hardware is initialized) so GPIO
-        # relay/button setup can't disrupt the PN532 state before first read.
-        self.pn532.SAM_configuration()
-        logger.info("✅ PN532 SAM_configuration applied")
-        self.task = asyncio.create_task(self._read_loop())
-        # Log if the task crashes so silent failures are visible
-        self.task.add_done_callback(self._on_task_done)
+        # SAM_configuration runs first on the I/O thread (after all other
+        # hardware is initialized) so GPIO relay/button setup can't disrupt
+        # the PN532 state before the first read.
+        self.thread = threading.Thread(target=self._io_loop, name='nfc-io', daemon=True)
+        self.thread.start()
         logger.info("📡 NFC reader started, waiting for cards...")
     
-    def _on_task_done(self, task):
-        """Called when _read_loop task finishes — logs any unexpected crash."""
-        if not task.cancelled():
-            exc = task.exception()
-            if exc:
-                logger.error(f"❌ NFC read loop crashed: {exc}", exc_info=exc)
-    
     async def stop(self):
         """Stop reading cards."""
         self.running = False
-        if self.task:
-            self.task.cancel()
+        if self.thread and self.thread.is_alive():
+            await asyncio.get_running_loop().run_in_executor(None, self.thread.join, 2.0)
+        if self.irq:
+            self.irq.close()
         logger.info("🛑 NFC reader stopped")
     
-    def _blocking_read(self):
-        """Blocking NFC read — runs in a thread executor."""
-        return self.pn532.read_passive_target(timeout=0.5)
-
-    def _blocking_reinit(self):
-        """Re-run SAM_configuration in a thread executor (recovery)."""
-        self.pn532.SAM_configuration()
-
-    async def _read_loop(self):
-        """Continuously read for NFC cards."""
-        last_uid = None
-        none_count = 0  # consecutive no-card reads
-        poll_count = 0
-        loop = asyncio.get_running_loop()
-        logger.info("🔄 NFC read loop running")
+    def _emit(self, callback, uid_str: str):
+        if callback and self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(callback, uid_str)
+    
+    def _wait_for_card(self, listening: bool):
+        """Wait for a card in IRQ mode; returns (uid or None, still listening)."""
+        if not listening:
+            self.pn532.listen_for_passive_target()
+        # Wake up regularly to notice stop() and the re-init timer
+        if not self.irq.wait_for_active(timeout=1.0):
+            return None, True
+        return self.pn532.get_passive_target(timeout=self.READ_TIMEOUT), False
+    
+    def _poll_interval(self, idle_seconds: float) -> float:
+        """Pause between polls: ramps from active_interval to idle_interval."""
+        ramp = min(1.0, idle_seconds / self.idle_after) if self.idle_after > 0 else 1.0
+        return self.active_interval + ramp * (self.idle_interval - self.active_interval)
+    
+    def _io_loop(self):
+        """Owns the I2C bus: configure the PN532, then read cards until stopped."""
+        present_uid = None  # Card currently on the reader (debounced)
+        last_seen = 0.0  # When present_uid was last read
+        last_activity = time.monotonic()
+        last_reinit = time.monotonic()
+        listening = False
+        configured = False
+        logger.info("🔄 NFC I/O thread running")
         while self.running:
             try:
-                # Run blocking I2C read in a thread so it doesn't block the event loop
-                uid = await loop.run_in_executor(None, self._blocking_read)
-                poll_count += 1
+                if not configured:
+                    self.pn532.SAM_configuration()
+                    configured = True
+                    last_reinit = time.monotonic()
+                    logger.info("✅ PN532 SAM_configuration applied")
+                
+                if present_uid is None and self.irq is not None:
+                    uid, listening = self._wait_for_card(listening)
+                else:
+                    uid = self.pn532.read_passive_target(timeout=self.READ_TIMEOUT)
+                now = time.monotonic()
                 
                 if uid is not None:
-                    none_count = 0
-                    
                     # Convert UID to USB format (decimal number, little-endian)
                     uid_bytes = bytes(uid)
                     uid_str = str(int.from_bytes(uid_bytes, byteorder="little"))
-                    hex_uid = uid_bytes.hex().upper()
-                    
-                    # Avoid duplicate reads
-                    if uid_str != last_uid:
-                        logger.info(f"🎫 Card detected: {uid_str} (HEX: {hex_uid})")
-                        if self.on_card_detected:
-                            self.on_card_detected(uid_str)
-                        last_uid = uid_str
-                else:
-                    last_uid = None
-                    none_count += 1
-                    # Heartbeat: confirm loop is alive every ~30 seconds
-                    if poll_count % 50 == 0:
-                        logger.debug(f"📡 NFC polling alive (polls={poll_count}, no-card streak={none_count})")
-                    # Auto-recovery: re-apply SAM_configuration if PN532 seems unresponsive
-                    # (500 consecutive None reads ≈ 5 minutes with no card, triggers re-init)
-                    if none_count > 0 and none_count % 500 == 0:
-                        logger.warning(f"⚠️ NFC: {none_count} consecutive no-card reads — re-applying SAM_configuration")
-                        await loop.run_in_executor(None, self._blocking_reinit)
-                        logger.info("✅ NFC SAM_configuration re-applied")
+                    last_seen = last_activity = now
+                    if uid_str != present_uid:
+                        if present_uid is not None:
+                            self._emit(self.on_card_removed, present_uid)
+                        present_uid = uid_str
+                        logger.info(f"🎫 Card detected: {uid_str} (HEX: {uid_bytes.hex().upper()})")
+                        self._emit(self.on_card_detected, uid_str)
+                elif present_uid is not None and now - last_seen >= self.removal_debounce:
+                    logger.debug(f"🎫 Card removed: {present_uid}")
+                    self._emit(self.on_card_removed, present_uid)
+                    present_uid = None
+                
+                # Auto-recovery: re-apply SAM_configuration if nothing has been
+                # read for a long time, in case the PN532 stopped responding
+                if present_uid is None and now - max(last_activity, last_reinit) >= self.reinit_after:
+                    logger.warning(f"⚠️ NFC: no card for {self.reinit_after:.0f}s — re-applying SAM_configuration")
+                    configured = listening = False
+                    continue
                 
-                await asyncio.sleep(0.1)
+                if present_uid is not None:
+                    time.sleep(self.active_interval)
+                elif self.irq is None:
+                    time.sleep(self._poll_interval(now - last_activity))
             except Exception as e:
                 logger.error(f"❌ NFC read error: {e}", exc_info=True)
-                await asyncio.sleep(1)
+                configured = listening = False
+                time.sleep(1)
 
 
 class RaspberryPiButton(Button):
@@ -384,12 +442,12 @@ class HardwareManager:
         
         logger.info(f"Hardware Manager initialized (simulate={simulate})")
     
-    def init_nfc_reader(self) -> NFCReader:
-        """Initialize NFC reader."""
+    def init_nfc_reader(self, **options) -> NFCReader:
+        """Initialize NFC reader (options are passed to RaspberryPiNFCReader)."""
         if self.simulate:
             self.nfc_reader = SimulatedNFCReader()
         else:
-            self.nfc_reader = RaspberryPiNFCReader()
+            self.nfc_reader = RaspberryPiNFCReader(**options)
         return self.nfc_reader
     
     def init_buttons(self, stop_pin: int, hint_pin: int):
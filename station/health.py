@@ -0,0 +1,227 @@
+"""Background sampler for station health metrics.
+
+Sampling used to run on the event loop: ``psutil.cpu_percent(interval=0.5)``
+blocked NFC handling and websocket broadcasts for half a second every
+report, and ``vcgencmd`` ran synchronously when psutil was missing. The
+HealthSampler thread takes a sample every few seconds and keeps a rolling
+window; the health reporter only reads the cached snapshot.
+
+Works with or without psutil: without it, CPU and RAM come from /proc and
+disk usage from shutil. Raspberry Pi specifics (SoC temperature,
+throttling flags from ``vcgencmd get_throttled``) are read when available.
+"""
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+
+
+def _format_uptime(seconds: int, suffix: str = '') -> str:
+    days = seconds // 86400
+    hours = (seconds % 86400) // 3600
+    mins = (seconds % 3600) // 60
+    if days > 0:
+        return f"{days}d {hours}h {mins}m{suffix}"
+    return f"{hours}h {mins}m{suffix}"
+
+
+class HealthSampler:
+    """Samples system health on its own thread and caches a rolling window."""
+
+    def __init__(self, interval: float = 5.0, window: int = 12, throttle_interval: float = 60.0,
+                 disk_path: str = '/'):
+        self.interval = interval
+        self.throttle_interval = throttle_interval
+        self.disk_path = disk_path
+        self.started_at = time.time()
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._proc_cpu: Optional[tuple] = None  # (busy, total) jiffies at the previous sample
+        self._throttled: Optional[str] = None
+        self._throttled_at = 0.0
+
+    def start(self):
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # Prime: the next call measures since now
+        else:
+            self._proc_cpu = self._read_proc_cpu()
+        self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sample = self.sample()
+            except Exception as e:
+                logger.warning(f"Health sample failed: {e}")
+                continue
+            with self._lock:
+                self._samples.append(sample)
+
+    # ── Sampling (sampler thread) ──
+
+    @staticmethod
+    def _read_proc_cpu() -> Optional[tuple]:
+        try:
+            with open('/proc/stat') as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        total = sum(fields)
+        return total - idle, total
+
+    def _cpu_percent(self) -> Optional[float]:
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None)
+        current = self._read_proc_cpu()
+        previous, self._proc_cpu = self._proc_cpu, current
+        if not current or not previous or current[1] == previous[1]:
+            return None
+        return round(100.0 * (current[0] - previous[0]) / (current[1] - previous[1]), 1)
+
+    @staticmethod
+    def _memory() -> Optional[tuple]:
+        """Return (percent, used bytes, total bytes)."""
+        if psutil is not None:
+            ram = psutil.virtual_memory()
+            return ram.percent, ram.used, ram.total
+        try:
+            info = {}
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    name, value = line.split(':', 1)
+                    info[name] = int(value.split()[0]) * 1024
+            total, available = info['MemTotal'], info['MemAvailable']
+        except (OSError, KeyError, ValueError):
+            return None
+        used = total - available
+        return round(100.0 * used / total, 1), used, total
+
+    @staticmethod
+    def _temperature() -> Optional[float]:
+        try:
+            with open(THERMAL_ZONE) as f:
+                return int(f.read().strip()) / 1000.0
+        except (OSError, ValueError):
+            return None
+
+    def _throttle_flags(self) -> Optional[str]:
+        """Output of ``vcgencmd get_throttled``, refreshed every throttle_interval."""
+        now = time.monotonic()
+        if self._throttled_at and now - self._throttled_at < self.throttle_interval:
+            return self._throttled
+        self._throttled_at = now
+        try:
+            result = subprocess.run(['vcgencmd', 'get_throttled'], capture_output=True, text=True, timeout=2)
+            self._throttled = result.stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            self._throttled = None
+        return self._throttled
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one sample of raw numeric values."""
+        sample: Dict[str, Any] = {'time': time.time(), 'cpu_percent': self._cpu_percent()}
+        memory = self._memory()
+        if memory:
+            sample['ram_percent'], sample['ram_used'], sample['ram_total'] = memory
+        try:
+            disk = shutil.disk_usage(self.disk_path)
+            sample['disk_percent'] = round(100.0 * disk.used / disk.total, 1)
+            sample['disk_used'], sample['disk_total'] = disk.used, disk.total
+        except OSError:
+            pass
+        sample['temperature'] = self._temperature()
+        sample['throttled'] = self._throttle_flags()
+        if psutil is not None:
+            sample['uptime'] = int(time.time() - psutil.boot_time())
+        return sample
+
+    # ── Reading (any thread, never blocks on sampling) ──
+
+    def samples(self) -> List[Dict[str, Any]]:
+        """Return the rolling window, oldest first."""
+        with self._lock:
+            return list(self._samples)
+
+    def numeric(self) -> Dict[str, Any]:
+        """Return the latest metrics as numbers, for the backend's time series.
+
+        Uses the same window average for CPU as ``snapshot``.
+        """
+        samples = self.samples()
+        if not samples:
+            return {}
+        latest = samples[-1]
+        cpu = [s['cpu_percent'] for s in samples if s.get('cpu_percent') is not None]
+        values: Dict[str, Any] = {
+            'cpu_percent': round(sum(cpu) / len(cpu), 1) if cpu else None,
+            'ram_percent': latest.get('ram_percent'),
+            'disk_percent': latest.get('disk_percent'),
+            'temperature': latest.get('temperature'),
+            'uptime_seconds': latest.get('uptime'),
+        }
+        throttled = latest.get('throttled')
+        if throttled and '=' in throttled:
+            try:
+                values['throttled'] = int(throttled.split('=', 1)[1], 16) != 0
+            except ValueError:
+                pass
+        return {key: value for key, value in values.items() if value is not None}
+
+    def snapshot(self) -> Dict[str, str]:
+        """Return the latest metrics in the backend's display format.
+
+        CPU usage is averaged over the window; everything else is the
+        latest reading.
+        """
+        samples = self.samples()
+        metrics: Dict[str, str] = {}
+        if not samples:
+            return metrics
+        latest = samples[-1]
+
+        cpu = [s['cpu_percent'] for s in samples if s.get('cpu_percent') is not None]
+        if cpu:
+            metrics['cpu_usage'] = f"{round(sum(cpu) / len(cpu), 1)}%"
+        if 'ram_percent' in latest:
+            metrics['ram_usage'] = (f"{latest['ram_percent']}% ({latest['ram_used'] // (1024*1024)}MB"
+                                    f" / {latest['ram_total'] // (1024*1024)}MB)")
+        if 'disk_percent' in latest:
+            metrics['storage_usage'] = (f"{latest['disk_percent']}% ({latest['disk_used'] // (1024**3)}GB"
+                                        f" / {latest['disk_total'] // (1024**3)}GB)")
+        if 'uptime' in latest:
+            metrics['system_uptime'] = _format_uptime(latest['uptime'])
+        else:
+            metrics['system_uptime'] = _format_uptime(int(time.time() - self.started_at), ' (app)')
+        if latest.get('temperature') is not None:
+            metrics['cpu_temperature'] = f"{latest['temperature']:.1f}°C"
+
+        throttled = latest.get('throttled')
+        if throttled:
+            if '0x0' in throttled:
+                metrics['voltage_power_status'] = 'OK (no throttling)'
+            else:
+                metrics['voltage_power_status'] = f'Warning: {throttled}'
+        elif psutil is None:
+            metrics['voltage_power_status'] = 'OK'
+        return metrics
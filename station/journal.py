@@ -0,0 +1,209 @@
+"""Durable store-and-forward journal for station events.
+
+Stops, checkpoints and health reports are written to a local SQLite
+journal before they are sent, each with a fresh idempotency key. The
+JournalReplayer sends pending events to the backend in order and in
+batches (POST stations/events/) and deletes each one once the backend has
+given a final answer for it, so a stop made while the backend is slow or
+unreachable is applied later instead of being lost. The backend applies
+every key at most once, so an event may safely be sent again after a lost
+response.
+
+Only the newest pending health report is kept: a station that was offline
+for an hour replays one report, not 240.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Event types of which only the newest pending event is worth sending.
+LATEST_ONLY_TYPES = frozenset({'health'})
+
+
+class StationJournal:
+    """SQLite-backed queue of events waiting for the backend."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' idempotency_key TEXT NOT NULL UNIQUE,'
+            ' type TEXT NOT NULL,'
+            ' occurred_at REAL NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' last_error TEXT NOT NULL DEFAULT \'\')'
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def append(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Durably record an event and return it (with its idempotency key)."""
+        event = {
+            'idempotency_key': uuid.uuid4().hex,
+            'type': event_type,
+            'occurred_at': time.time(),
+            'data': data,
+        }
+        with self._lock:
+            with self._db:
+                if event_type in LATEST_ONLY_TYPES:
+                    self._db.execute('DELETE FROM events WHERE type = ?', (event_type,))
+                self._db.execute(
+                    'INSERT INTO events (idempotency_key, type, occurred_at, data) VALUES (?, ?, ?, ?)',
+                    (event['idempotency_key'], event_type, event['occurred_at'], json.dumps(data)),
+                )
+        return event
+
+    def pending(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the oldest pending events, in journal order."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT idempotency_key, type, occurred_at, data FROM events ORDER BY seq LIMIT ?',
+                (limit,),
+            ).fetchall()
+        return [
+            {'idempotency_key': key, 'type': event_type, 'occurred_at': occurred_at, 'data': json.loads(data)}
+            for key, event_type, occurred_at, data in rows
+        ]
+
+    def remove(self, keys: List[str]):
+        if not keys:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany('DELETE FROM events WHERE idempotency_key = ?', [(k,) for k in keys])
+
+    def mark_failed(self, keys: List[str], error: str):
+        if not keys:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'UPDATE events SET attempts = attempts + 1, last_error = ? WHERE idempotency_key = ?',
+                    [(error, k) for k in keys],
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def oldest_occurred_at(self) -> Optional[float]:
+        with self._lock:
+            return self._db.execute('SELECT MIN(occurred_at) FROM events').fetchone()[0]
+
+
+class JournalReplayer:
+    """Sends the journal to the backend in order, one batch at a time.
+
+    The background loop (``run``) does all sending; a lock keeps a single
+    replay in flight so events are never sent out of order. Callers that
+    want an event's outcome right away use ``wait_for``, which gives up
+    after a deadline and leaves the event to the loop.
+    """
+
+    def __init__(self, journal: StationJournal, send_batch: Callable, batch_size: int = 50,
+                 on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Any]] = None):
+        self.journal = journal
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.on_result = on_result
+        self.last_synced_at: Optional[float] = None
+        self.last_error: str = ''
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def wait_for(self, key: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Have the loop send pending events now; wait for this event's result.
+
+        Returns None if the backend has not given a final answer within
+        ``timeout`` seconds; the event then stays in the journal.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        self.wake()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters.pop(key, None)
+
+    async def flush(self, timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Send pending events until the journal is empty or the backend fails.
+
+        Returns the backend's results by idempotency key. A result with a
+        status below 500 is final and its event is removed; anything else
+        stops the replay so later events wait behind it.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        async with self._lock:
+            while True:
+                events = self.journal.pending(self.batch_size)
+                if not events:
+                    return results
+                response = await self.send_batch(events, timeout=timeout)
+                if not response or not isinstance(response.get('results'), list):
+                    self.last_error = (response or {}).get('error') or 'backend unreachable'
+                    self.journal.mark_failed([e['idempotency_key'] for e in events], self.last_error)
+                    return results
+
+                done, failed = [], []
+                for event, result in zip(events, response['results']):
+                    if result.get('status', 500) >= 500:
+                        failed.append(event['idempotency_key'])
+                        break
+                    done.append(event['idempotency_key'])
+                    results[event['idempotency_key']] = result
+                    waiter = self._waiters.get(event['idempotency_key'])
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(result)
+                    if result.get('status', 200) >= 400:
+                        logger.warning(f"Journal event {event['type']} rejected: {result.get('body')}")
+                    if self.on_result:
+                        await self.on_result(event, result)
+                self.journal.remove(done)
+                self.last_synced_at = time.time()
+                if failed or len(done) < len(events):
+                    self.last_error = 'backend error'
+                    self.journal.mark_failed(failed, self.last_error)
+                    return results
+                self.last_error = ''
+
+    async def run(self, retry_interval: float = 5.0, max_retry_interval: float = 60.0):
+        """Replay in the background: on wake-up, and with backoff while failing."""
+        delay = retry_interval
+        while True:
+            # Cleared before flushing: events journaled during the flush wake the next pass.
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Journal replay failed: {e}")
+            if self.journal.count():
+                delay = min(delay * 2, max_retry_interval)
+            else:
+                delay = retry_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
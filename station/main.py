@@ -10,11 +10,13 @@ This application runs on Raspberry Pi stations to handle:
 - Health metrics reporting to dashboard
 """
 import asyncio
+import hmac
 import logging
 import socket
 import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from pathlib import Path
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
@@ -22,6 +24,12 @@ from typing import Optional, Dict, Any, List
 from config import settings
 from hardware import HardwareManager, SimulatedNFCReader, SimulatedButton
 from api_client import BackendAPIClient
+from control_link import ControlLink, control_url
+from transport import CircuitBreaker
+from staff_cache import StaffCache
+from journal import StationJournal, JournalReplayer
+from fanout import FanoutClient, encode
+from health import HealthSampler
 
 # Setup logging
 logging.basicConfig(
@@ -53,10 +61,21 @@ class StationState:
     def __init__(self):
         self.hardware: Optional[HardwareManager] = None
         self.api_client: Optional[BackendAPIClient] = None
+        self.staff_cache = StaffCache(
+            ttl=settings.staff_cache_ttl,
+            negative_ttl=settings.staff_cache_negative_ttl,
+        )
+        self.health_sampler = HealthSampler(interval=settings.health_sample_interval)
+        self.health_buffer: List[Dict[str, Any]] = []  # Samples waiting for the next batch
+        self.health_flushed_at: float = 0  # Monotonic time of the last batch
+        self.journal: Optional[StationJournal] = None
+        self.replayer: Optional[JournalReplayer] = None
+        self.control_link: Optional[ControlLink] = None
+        self.station_config: Dict[str, Any] = {}  # Controller settings pushed by the backend
         self.current_session: Optional[Dict[str, Any]] = None
         self.last_result: Optional[Dict[str, Any]] = None  # Keep result data for RESULT screen
         self.mode: str = StationMode.OFFLINE  # Station state machine
-        self.websocket_clients: List[WebSocket] = []
+        self.websocket_clients: List[FanoutClient] = []
         self.station_ip: str = settings.station_ip if settings.station_ip else self._get_local_ip()
         self.boot_time: float = time.time()
         self.last_hint_time: float = 0  # Cooldown tracking for hint button
@@ -81,25 +100,25 @@ class StationState:
             return "127.0.0.1"
     
     async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast a message to all connected WebSocket clients."""
+        """Broadcast a message to all connected WebSocket clients.
+        
+        The message is serialized once and queued for every client; each
+        client's writer task sends it (see fanout.py), so this never waits
+        on a slow screen.
+        """
         if not self.websocket_clients:
             logger.debug(f"⚠️ No WebSocket clients to broadcast to")
             return
         
         logger.info(f"📢 Broadcasting to {len(self.websocket_clients)} clients: {message.get('type')}")
         
-        disconnected = []
-        for client in self.websocket_clients:
-            try:
-                await client.send_json(message)
-                logger.debug(f"✅ Sent to client")
-            except Exception as e:
-                logger.warning(f"❌ Failed to send to client: {e}")
-                disconnected.append(client)
+        text = encode(message)
+        disconnected = [client for client in self.websocket_clients if not client.offer(text)]
         
-        # Remove disconnected clients
+        # Remove dropped clients
         for client in disconnected:
-            self.websocket_clients.remove(client)
+            if client in self.websocket_clients:
+                self.websocket_clients.remove(client)
             logger.info(f"🔌 Removed disconnected client (remaining: {len(self.websocket_clients)})")
 
 state = StationState()
@@ -121,6 +140,9 @@ async def lifespan(app: FastAPI):
     logger.info("=" * 60)
     
     health_task = None
+    staff_task = None
+    sync_task = None
+    link_task = None
     
     try:
         # Initialize hardware
@@ -129,12 +151,57 @@ async def lifespan(app: FastAPI):
         # Initialize API client
         state.api_client = BackendAPIClient(
             base_url=settings.api_base_url,
-            station_id=settings.station_id
+            station_id=settings.station_id,
+            staff_cache=state.staff_cache,
+            http2=settings.http2_enabled,
+            max_connections=settings.http_max_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+            station_token=settings.station_token,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.circuit_failure_threshold,
+                reset_timeout=settings.circuit_reset_timeout,
+            ),
         )
         
+        # Open the offline journal and replay anything left from before a restart
+        state.journal = StationJournal(settings.journal_path or str(Path(__file__).parent / 'journal.db'))
+        state.replayer = JournalReplayer(
+            state.journal,
+            send_batch=state.api_client.send_events,
+            batch_size=settings.journal_batch_size,
+            on_result=handle_synced_event,
+        )
+        # Persistent control link (scans, journal, health; pushes from the backend)
+        if settings.station_token:
+            state.control_link = ControlLink(
+                control_url(settings.backend_url, settings.station_id, state.station_ip),
+                token=settings.station_token,
+                handlers={
+                    'config': handle_station_config,
+                    'staff_cache_invalidate': handle_staff_cache_push,
+                },
+                heartbeat_interval=settings.ws_heartbeat_interval,
+                reconnect_delay=settings.ws_reconnect_delay,
+            )
+            state.api_client.link = state.control_link
+            link_task = asyncio.create_task(state.control_link.run())
+        else:
+            logger.info("🔗 STATION_TOKEN not set — control link disabled, using HTTP only")
+        
+        sync_task = asyncio.create_task(state.replayer.run())
+        pending = state.journal.count()
+        if pending:
+            logger.info(f"📒 {pending} journaled event(s) waiting to sync")
+        
         # Initialize NFC reader object (SAM_configuration deferred to after all hardware is ready)
         if settings.nfc_enabled:
-            state.nfc_reader = state.hardware.init_nfc_reader()
+            state.nfc_reader = state.hardware.init_nfc_reader(
+                irq_pin=settings.nfc_irq_pin,
+                active_interval=settings.nfc_active_interval,
+                idle_interval=settings.nfc_idle_interval,
+                idle_after=settings.nfc_idle_after,
+                removal_debounce=settings.nfc_removal_debounce,
+            )
         
         # Initialize buttons
         state.stop_button, state.hint_button = state.hardware.init_buttons(
@@ -156,15 +223,20 @@ async def lifespan(app: FastAPI):
         # Set initial state to READY
         state.ready_relay.turn_on()
         state.mode = StationMode.READY
+        asyncio.create_task(state.api_client.warm())
         
         # Start NFC reader AFTER all other hardware is initialized (SAM_configuration
         # is called in start() so relay/button GPIO setup can't disrupt the PN532 state)
         if settings.nfc_enabled and state.nfc_reader:
             await state.nfc_reader.start(on_card_detected=handle_rfid_scan)
         
-        # Start health reporter
+        # Start health sampling (own thread) and reporting
+        state.health_sampler.start()
         health_task = asyncio.create_task(health_reporter_loop())
         
+        # Seed the staff card cache (and keep it fresh) in the background
+        staff_task = asyncio.create_task(staff_cache_refresh_loop())
+        
         logger.info("✅ Station initialized and ready")
         
         yield
@@ -173,125 +245,116 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Startup failed: {e}")
         raise
     finally:
-        # Cancel health reporter
-        if health_task:
-            health_task.cancel()
-            try:
-                await health_task
-            except asyncio.CancelledError:
-                pass
+        # Cancel background loops
+        for task in (health_task, staff_task, sync_task, link_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         # Cleanup
         logger.info("🛑 Shutting down station...")
+        state.health_sampler.stop()
+        if state.journal:
+            flush_health_samples()  # Sent on the next start
         if state.hardware:
             state.hardware.cleanup()
         if state.api_client:
             await state.api_client.close()
+        if state.journal:
+            state.journal.close()
         logger.info("👋 Station shutdown complete")
 
 
+async def handle_station_config(message: Dict[str, Any]):
+    """Store the controller settings pushed over the control link."""
+    state.station_config = message.get('config') or {}
+    logger.info(f"🔗 Station config from backend: {state.station_config.get('name')}")
+
+
+async def handle_staff_cache_push(message: Dict[str, Any]):
+    """Drop staff cache entries the backend says have changed."""
+    tags = message.get('rfid_tags')
+    state.staff_cache.invalidate(tags)
+    logger.info(f"👮 Staff cache invalidated: {tags if tags is not None else 'all'}")
+
+
+async def staff_cache_refresh_loop():
+    """Seed the staff cache from the backend, then refresh it periodically.
+    
+    Retries quickly until the first seed succeeds (the backend may still be
+    starting), then refreshes every staff_cache_refresh_interval seconds.
+    """
+    while True:
+        try:
+            staff = await state.api_client.get_staff_tags()
+        except Exception as e:
+            logger.warning(f"Staff cache refresh failed: {e}")
+            staff = None
+        if staff is not None:
+            state.staff_cache.seed(staff)
+            await asyncio.sleep(settings.staff_cache_refresh_interval)
+        else:
+            await asyncio.sleep(settings.ws_reconnect_delay)
+
+
 async def health_reporter_loop():
-    """Periodically report station health metrics to the Django backend."""
+    """Sample station health periodically and send it to the backend in batches."""
     await asyncio.sleep(5)  # Wait for initial startup
     while True:
         try:
-            await report_health_metrics()
+            buffer_health_sample()
+            if time.monotonic() - state.health_flushed_at >= settings.health_flush_interval:
+                flush_health_samples()
         except Exception as e:
             logger.warning(f"Health report failed: {e}")
-        await asyncio.sleep(15)  # Report every 15 seconds
+        await asyncio.sleep(settings.health_report_interval)
 
 
-async def report_health_metrics():
-    """Collect and send health metrics to the backend."""
+def buffer_health_sample():
+    """Add the current metrics to the in-memory health buffer."""
     metrics = collect_system_metrics()
-    
     if not metrics:
         return
+    state.health_buffer.append({'occurred_at': time.time(), **metrics})
+    # Keep the newest samples if flushing keeps failing
+    del state.health_buffer[:-settings.health_buffer_size]
+
+
+def flush_health_samples():
+    """Queue the buffered samples for the backend as one batch.
+    
+    Batches go through the offline journal, which keeps only the newest
+    unsent batch while the backend is unreachable.
+    """
+    state.health_flushed_at = time.monotonic()
+    if not state.health_buffer:
+        return
     
-    # Send to backend via API
     try:
-        result = await state.api_client.update_controller_metrics(
-            ip_address=state.station_ip,
-            metrics=metrics
-        )
-        if result:
-            logger.debug(f"📊 Health metrics reported: {metrics}")
-        else:
-            logger.debug(f"📊 Health metrics report - no controller found for IP {state.station_ip}")
+        state.journal.append('health', {
+            'ip_address': state.station_ip,
+            'reported_at': time.time(),
+            'samples': state.health_buffer,
+        })
+        state.health_buffer = []
+        state.replayer.wake()
+        logger.debug("📊 Health samples queued")
     except Exception as e:
         logger.warning(f"Failed to report health: {e}")
 
 
-def collect_system_metrics() -> Dict[str, str]:
-    """Collect system metrics (works on Raspberry Pi and simulated)."""
-    metrics = {}
-    
-    try:
-        import psutil
-        
-        # CPU Usage
-        cpu_percent = psutil.cpu_percent(interval=0.5)
-        metrics['cpu_usage'] = f"{cpu_percent}%"
-        
-        # RAM Usage
-        ram = psutil.virtual_memory()
-        metrics['ram_usage'] = f"{ram.percent}% ({ram.used // (1024*1024)}MB / {ram.total // (1024*1024)}MB)"
-        
-        # Storage Usage
-        disk = psutil.disk_usage('/')
-        metrics['storage_usage'] = f"{disk.percent}% ({disk.used // (1024**3)}GB / {disk.total // (1024**3)}GB)"
-        
-        # System Uptime
-        uptime_seconds = int(time.time() - psutil.boot_time())
-        days = uptime_seconds // 86400
-        hours = (uptime_seconds % 86400) // 3600
-        mins = (uptime_seconds % 3600) // 60
-        if days > 0:
-            metrics['system_uptime'] = f"{days}d {hours}h {mins}m"
-        else:
-            metrics['system_uptime'] = f"{hours}h {mins}m"
-        
-    except ImportError:
-        # psutil not installed — use basic approach
-        import os
-        
-        # Station uptime (since app start)
-        uptime = int(time.time() - state.boot_time)
-        hours = uptime // 3600
-        mins = (uptime % 3600) // 60
-        metrics['system_uptime'] = f"{hours}h {mins}m (app)"
-        
-        # Try Raspberry Pi specific metrics
-        try:
-            # CPU temperature (Raspberry Pi)
-            with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                temp = int(f.read().strip()) / 1000.0
-                metrics['cpu_temperature'] = f"{temp:.1f}°C"
-        except:
-            pass
-        
-        try:
-            # Voltage status (Raspberry Pi)
-            import subprocess
-            result = subprocess.run(
-                ['vcgencmd', 'get_throttled'],
-                capture_output=True, text=True, timeout=2
-            )
-            throttled = result.stdout.strip()
-            if '0x0' in throttled:
-                metrics['voltage_power_status'] = 'OK (no throttling)'
-            else:
-                metrics['voltage_power_status'] = f'Warning: {throttled}'
-        except:
-            metrics['voltage_power_status'] = 'OK'
-    
-    # CPU Temperature (try even with psutil)
-    if 'cpu_temperature' not in metrics:
-        try:
-            with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                temp = int(f.read().strip()) / 1000.0
-                metrics['cpu_temperature'] = f"{temp:.1f}°C"
-        except:
-            pass
+def collect_system_metrics() -> Dict[str, Any]:
+    """Return the latest cached system metrics (see health.py); never blocks.
+
+    Display strings for the dashboard plus numeric values for the
+    backend's health history.
+    """
+    metrics: Dict[str, Any] = state.health_sampler.snapshot()
+    if not metrics:
+        return metrics  # No sample yet
+    metrics.update(state.health_sampler.numeric())
     
     # Add station mode
     metrics['station_mode'] = state.mode
@@ -331,13 +394,46 @@ def handle_rfid_scan(rfid_tag: str):
 
 
 async def process_rfid_scan(rfid_tag: str):
-    """Process an RFID scan based on current station mode."""
+    """Process an RFID scan based on current station mode.
+    
+    One backend request resolves staff vs. player card and applies the
+    transition for the current mode (see BackendAPIClient.scan). Taps whose
+    outcome the staff cache already knows (staff resets, player cards on
+    an ACTIVE or RESULT screen, staff cards on READY) skip the backend.
+    """
     try:
+        mode = state.mode
+        if mode not in (StationMode.READY, StationMode.ACTIVE, StationMode.RESULT) or (
+            mode == StationMode.ACTIVE and not state.current_session
+        ):
+            # ── OFFLINE MODE: ignore scans ──
+            logger.warning(f"RFID scanned but station is {mode}")
+            return
+        
+        hit, staff = state.staff_cache.lookup(rfid_tag)
+        # Player cards start sessions and staff cards stop them: those need the backend
+        local = hit and (mode == StationMode.RESULT or (staff is None) == (mode == StationMode.ACTIVE))
+        if local:
+            result = {'is_staff': staff is not None, 'staff': staff}
+            action = {StationMode.READY: 'staff', StationMode.RESULT: 'reset'}.get(mode) if staff else 'ignored'
+            logger.info(f"👮 Staff cache hit for {rfid_tag}: {'staff' if staff else 'not staff'}")
+        else:
+            session_rfid = state.current_session.get('rfid_tag', '') if mode == StationMode.ACTIVE else ''
+            result = await state.api_client.scan(
+                rfid_tag, mode, controller_ip=state.station_ip, session_rfid=session_rfid
+            )
+            action = result.get('action') if result and not result.get('error') else None
+            if result is None and mode == StationMode.RESULT:
+                # Backend unreachable: a recently known staff card may still reset
+                hit, staff = state.staff_cache.lookup(rfid_tag, allow_stale=True)
+                if hit and staff:
+                    result, action = {'is_staff': True, 'staff': staff}, 'reset'
+        staff_name = ((result or {}).get('staff') or {}).get('username')
+        
         # ── RESULT MODE: Only accept staff cards to reset back to READY ──
-        if state.mode == StationMode.RESULT:
-            staff_result = await state.api_client.check_staff(rfid_tag)
-            if staff_result and staff_result.get('is_staff'):
-                logger.info(f"👮 Staff card detected: {staff_result.get('username')} — resetting station")
+        if mode == StationMode.RESULT:
+            if action == 'reset':
+                logger.info(f"👮 Staff card detected: {staff_name} — resetting station")
                 await reset_to_ready()
             else:
                 logger.info(f"❌ Non-staff card scanned on RESULT screen, ignoring")
@@ -348,92 +444,40 @@ async def process_rfid_scan(rfid_tag: str):
             return
         
         # ── ACTIVE MODE: Only accept staff cards to end session ──
-        if state.mode == StationMode.ACTIVE and state.current_session:
-            staff_result = await state.api_client.check_staff(rfid_tag)
-            if staff_result and staff_result.get('is_staff'):
-                logger.info(f"👮 Staff card detected during game: {staff_result.get('username')} — ending session")
+        if mode == StationMode.ACTIVE:
+            if action == 'stop':
+                logger.info(f"👮 Staff card detected during game: {staff_name} — session ended")
+                if state.mode == StationMode.ACTIVE:
+                    await apply_session_stopped(result['result'])
+            elif result is None and state.staff_cache.lookup(rfid_tag, allow_stale=True)[1]:
+                # Backend unreachable: end through the offline journal instead
+                logger.info(f"👮 Known staff card during game (backend unreachable) — ending session")
                 await end_current_session()
-            else:
-                logger.info(f"⚠️ Non-staff card scanned during active session, ignoring")
+            elif result and result.get('is_staff'):
+                logger.warning(f"❌ Failed to end session for {session_rfid}: {result.get('error')}")
                 await state.broadcast({
                     'type': 'error',
-                    'message': 'A game is already in progress. Use STOP button or scan staff card to end.'
+                    'message': 'Failed to end session. Please try again.'
                 })
-            return
-        
-        # ── READY MODE: Try to start a new session ──
-        if state.mode == StationMode.READY:
-            # First check if it's a staff card (staff shouldn't start sessions)
-            staff_result = await state.api_client.check_staff(rfid_tag)
-            if staff_result and staff_result.get('is_staff'):
-                logger.info(f"👮 Staff card scanned on READY screen — no action needed")
-                await state.broadcast({
-                    'type': 'error',
-                    'message': f'Staff card detected ({staff_result.get("username")}). Station is already ready.'
-                })
-                return
-            
-            # Try to start/resume a session (pass controller_ip so backend knows which station)
-            result = await state.api_client.start_session(rfid_tag, controller_ip=state.station_ip)
-            
-            if result and not result.get('error'):
-                state.current_session = {
-                    'session_id': result.get('session_id'),
-                    'party_name': result.get('party_name'),
-                    'rfid_tag': rfid_tag,
-                    'session_minutes': result.get('session_minutes'),
-                    'remaining_seconds': result.get('remaining_seconds'),
-                    'station_remaining_seconds': result.get('station_remaining_seconds'),
-                    'per_station_seconds': result.get('per_station_seconds'),
-                    'total_controllers': result.get('total_controllers'),
-                    'current_controller_index': result.get('current_controller_index'),
-                    'storyline_title': result.get('storyline_title'),
-                    'storyline_hint': result.get('storyline_hint'),
-                    'hint_audio': result.get('hint_audio', ''),
-                    'is_end_controller': result.get('is_end_controller', False),
-                    'is_start_controller': result.get('is_start_controller', False),
-                    'controller_name': result.get('controller_name', ''),
-                }
-                
-                # Switch to ACTIVE mode
-                state.mode = StationMode.ACTIVE
-                state.ready_relay.turn_off()
-                state.game_active_relay.turn_on()
-                
-                # Broadcast to frontend
-                await state.broadcast({
-                    'type': 'session_started',
-                    'session': state.current_session
-                })
-                
-                logger.info(f"✅ Session started: {result.get('party_name')}")
             else:
-                error_msg = 'Invalid RFID tag. No approved session found.'
-                error_code = None
-                error_meta = {}
-                if result and result.get('error'):
-                    error_code = result.get('error_code')
-                    if error_code == 'station_already_completed':
-                        controller_name = result.get('controller_name') or settings.station_name
-                        error_msg = f'Station "{controller_name}" already completed for this session. Move to a new station and scan again.'
-                        error_meta = {
-                            'controller_name': controller_name,
-                            'controller_ip': result.get('controller_ip', ''),
-                        }
-                    else:
-                        error_msg = result.get('error')
-                logger.warning(f"❌ Failed to start session for {rfid_tag}: {error_msg}")
-                
+                logger.info(f"⚠️ Non-staff card scanned during active session, ignoring")
                 await state.broadcast({
                     'type': 'error',
-                    'message': error_msg,
-                    'error_code': error_code,
-                    **error_meta,
+                    'message': 'A game is already in progress. Use STOP button or scan staff card to end.'
                 })
             return
         
-        # ── OFFLINE MODE: ignore scans ──
-        logger.warning(f"RFID scanned but station is {state.mode}")
+        # ── READY MODE: Start a new session (staff cards don't) ──
+        if action == 'staff':
+            logger.info(f"👮 Staff card scanned on READY screen — no action needed")
+            await state.broadcast({
+                'type': 'error',
+                'message': f'Staff card detected ({staff_name}). Station is already ready.'
+            })
+        elif action == 'start':
+            await apply_session_started(rfid_tag, result['result'])
+        else:
+            await broadcast_start_error(rfid_tag, result)
     
     except Exception as e:
         logger.error(f"Error processing RFID scan: {e}")
@@ -443,6 +487,68 @@ async def process_rfid_scan(rfid_tag: str):
         })
 
 
+async def apply_session_started(rfid_tag: str, result: Dict[str, Any]):
+    """Switch to ACTIVE mode for a session the backend has started."""
+    state.current_session = {
+        'session_id': result.get('session_id'),
+        'party_name': result.get('party_name'),
+        'rfid_tag': rfid_tag,
+        'session_minutes': result.get('session_minutes'),
+        'remaining_seconds': result.get('remaining_seconds'),
+        'station_remaining_seconds': result.get('station_remaining_seconds'),
+        'per_station_seconds': result.get('per_station_seconds'),
+        'total_controllers': result.get('total_controllers'),
+        'current_controller_index': result.get('current_controller_index'),
+        'storyline_title': result.get('storyline_title'),
+        'storyline_hint': result.get('storyline_hint'),
+        'hint_audio': result.get('hint_audio', ''),
+        'is_end_controller': result.get('is_end_controller', False),
+        'is_start_controller': result.get('is_start_controller', False),
+        'controller_name': result.get('controller_name', ''),
+        'total_points': result.get('total_points'),
+        'station_started_at': time.time(),  # For a provisional result if the stop has to wait for sync
+    }
+    
+    # Switch to ACTIVE mode
+    state.mode = StationMode.ACTIVE
+    state.ready_relay.turn_off()
+    state.game_active_relay.turn_on()
+    
+    # Broadcast to frontend
+    await state.broadcast({
+        'type': 'session_started',
+        'session': state.current_session
+    })
+    
+    logger.info(f"✅ Session started: {result.get('party_name')}")
+
+
+async def broadcast_start_error(rfid_tag: str, result: Optional[Dict[str, Any]]):
+    """Show why a player card could not start a session."""
+    error_msg = 'Invalid RFID tag. No approved session found.'
+    error_code = None
+    error_meta = {}
+    if result and result.get('error'):
+        error_code = result.get('error_code')
+        if error_code == 'station_already_completed':
+            controller_name = result.get('controller_name') or settings.station_name
+            error_msg = f'Station "{controller_name}" already completed for this session. Move to a new station and scan again.'
+            error_meta = {
+                'controller_name': controller_name,
+                'controller_ip': result.get('controller_ip', ''),
+            }
+        else:
+            error_msg = result.get('error')
+    logger.warning(f"❌ Failed to start session for {rfid_tag}: {error_msg}")
+    
+    await state.broadcast({
+        'type': 'error',
+        'message': error_msg,
+        'error_code': error_code,
+        **error_meta,
+    })
+
+
 def handle_stop_button():
     """Handle stop button press."""
     logger.info(f"🛑 Stop button pressed (station mode: {state.mode})")
@@ -486,54 +592,32 @@ async def end_current_session():
     - Calls stop with controller_ip so backend records the checkpoint
     - If this is the END controller, session is fully ended
     - If not, session is paused — player goes to next station
+    
+    The stop is written to the offline journal first. If the backend has
+    not answered within journal_live_timeout, the RESULT screen shows a
+    provisional result from the local timer; the journal delivers the stop
+    (applied at the time it happened) once the backend is reachable, and
+    the screen is updated with the real result if it is still showing.
     """
     if not state.current_session:
         logger.warning("No active session to end")
         return
     
     try:
-        rfid_tag = state.current_session.get('rfid_tag')
-        result = await state.api_client.stop_session(rfid_tag, controller_ip=state.station_ip)
+        session = state.current_session
+        rfid_tag = session.get('rfid_tag')
+        event = state.journal.append('stop', {'rfid': rfid_tag, 'controller_ip': state.station_ip})
+        outcome = await state.replayer.wait_for(event['idempotency_key'], settings.journal_live_timeout)
         
-        if result:
-            session_ended = result.get('session_ended', True)
-            
-            # Store result for RESULT screen
-            state.last_result = {
-                'party_name': result.get('party_name'),
-                'total_points': result.get('total_points'),
-                'station_points': result.get('station_points'),
-                'station_elapsed_seconds': result.get('station_elapsed_seconds'),
-                'station_remaining_seconds': result.get('station_remaining_seconds'),
-                'per_station_seconds': result.get('per_station_seconds'),
-                'total_elapsed_seconds': result.get('total_elapsed_seconds'),
-                'remaining_seconds': result.get('remaining_seconds'),
-                'current_controller_index': result.get('current_controller_index'),
-                'total_controllers': result.get('total_controllers'),
-                'controller_name': result.get('controller_name'),
-                'session_ended': session_ended,
-                'is_end_controller': result.get('is_end_controller', False),
-            }
-            
-            # Switch to RESULT mode
-            state.mode = StationMode.RESULT
-            state.game_active_relay.turn_off()
-            
-            # Broadcast result to frontend
-            await state.broadcast({
-                'type': 'session_ended',
-                'result': state.last_result
-            })
-            
-            if session_ended:
-                logger.info(f"✅ Session fully ended: {result.get('party_name')} - {result.get('total_points')} points")
-            else:
-                logger.info(f"✅ Station completed: {result.get('party_name')} - +{result.get('station_points')} pts this station")
-            
-            # Clear current session
-            state.current_session = None
+        if outcome is None:
+            logger.warning(f"⏳ Backend not answering — stop for {rfid_tag} queued for sync")
+            if state.current_session is session:
+                await apply_session_stopped(provisional_stop_result(session), event['idempotency_key'])
+        elif outcome.get('status') == 200:
+            if state.current_session is session:
+                await apply_session_stopped(outcome['body'])
         else:
-            logger.warning(f"❌ Failed to end session for {rfid_tag}")
+            logger.warning(f"❌ Failed to end session for {rfid_tag}: {outcome.get('body')}")
             await state.broadcast({
                 'type': 'error',
                 'message': 'Failed to end session. Please try again.'
@@ -543,6 +627,84 @@ async def end_current_session():
         logger.error(f"Error ending session: {e}")
 
 
+def provisional_stop_result(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Estimate a stop result from the local timer while the backend is unreachable."""
+    per_station = session.get('per_station_seconds') or 0
+    elapsed = max(0, int(time.time() - session.get('station_started_at', time.time())))
+    remaining = max(0, (session.get('station_remaining_seconds') or per_station) - elapsed)
+    cleared = (session.get('current_controller_index') or 0) + 1
+    total_controllers = session.get('total_controllers') or 0
+    total_points = session.get('total_points')
+    return {
+        'party_name': session.get('party_name'),
+        'total_points': total_points + remaining if total_points is not None else remaining,
+        'station_points': remaining,
+        'station_elapsed_seconds': elapsed,
+        'station_remaining_seconds': remaining,
+        'per_station_seconds': per_station,
+        'current_controller_index': cleared,
+        'total_controllers': total_controllers,
+        'controller_name': session.get('controller_name'),
+        'session_ended': total_controllers > 0 and cleared >= total_controllers,
+        'is_end_controller': session.get('is_end_controller', False),
+    }
+
+
+async def handle_synced_event(event: Dict[str, Any], outcome: Dict[str, Any]):
+    """Replace a provisional RESULT screen once its stop has been applied."""
+    last = state.last_result
+    if (event['type'] != 'stop' or outcome.get('status') != 200 or state.mode != StationMode.RESULT
+            or not last or last.get('pending_sync') != event['idempotency_key']):
+        return
+    logger.info(f"📒 Stop synced for {outcome['body'].get('party_name')} — showing final result")
+    await apply_session_stopped(outcome['body'])
+
+
+async def apply_session_stopped(result: Dict[str, Any], pending_sync: Optional[str] = None):
+    """Show the RESULT screen for a station the backend has stopped.
+    
+    ``pending_sync`` is the journal key of a stop the backend has not
+    applied yet; the result is then provisional.
+    """
+    session_ended = result.get('session_ended', True)
+    
+    # Store result for RESULT screen
+    state.last_result = {
+        'party_name': result.get('party_name'),
+        'total_points': result.get('total_points'),
+        'station_points': result.get('station_points'),
+        'station_elapsed_seconds': result.get('station_elapsed_seconds'),
+        'station_remaining_seconds': result.get('station_remaining_seconds'),
+        'per_station_seconds': result.get('per_station_seconds'),
+        'total_elapsed_seconds': result.get('total_elapsed_seconds'),
+        'remaining_seconds': result.get('remaining_seconds'),
+        'current_controller_index': result.get('current_controller_index'),
+        'total_controllers': result.get('total_controllers'),
+        'controller_name': result.get('controller_name'),
+        'session_ended': session_ended,
+        'is_end_controller': result.get('is_end_controller', False),
+        'pending_sync': pending_sync,
+    }
+    
+    # Switch to RESULT mode
+    state.mode = StationMode.RESULT
+    state.game_active_relay.turn_off()
+    
+    # Broadcast result to frontend
+    await state.broadcast({
+        'type': 'session_ended',
+        'result': state.last_result
+    })
+    
+    if session_ended:
+        logger.info(f"✅ Session fully ended: {result.get('party_name')} - {result.get('total_points')} points")
+    else:
+        logger.info(f"✅ Station completed: {result.get('party_name')} - +{result.get('station_points')} pts this station")
+    
+    # Clear current session
+    state.current_session = None
+
+
 async def reset_to_ready():
     """Reset station back to READY mode (called after staff scan on RESULT screen)."""
     logger.info("🔄 Resetting station to READY")
@@ -551,6 +713,8 @@ async def reset_to_ready():
     state.current_session = None
     state.last_result = None
     state.mode = StationMode.READY
+    # Have a backend connection open for the next player's scan
+    asyncio.create_task(state.api_client.warm())
     
     # Set hardware relays
     state.game_active_relay.turn_off()
@@ -579,6 +743,13 @@ class StatusResponse(BaseModel):
     current_session: Optional[Dict[str, Any]]
     hardware_mode: str
     station_mode: str
+    pending_sync_events: int
+    oldest_pending_at: Optional[float]
+    last_synced_at: Optional[float]
+    sync_error: str
+    backend_circuit: str
+    control_link: str
+    station_config: Dict[str, Any]
 
 
 @app.get("/", response_model=StatusResponse)
@@ -592,10 +763,40 @@ async def get_status():
         has_active_session=state.current_session is not None,
         current_session=state.current_session,
         hardware_mode="simulated" if settings.simulate_hardware else "real",
-        station_mode=state.mode
+        station_mode=state.mode,
+        pending_sync_events=state.journal.count() if state.journal else 0,
+        oldest_pending_at=state.journal.oldest_occurred_at() if state.journal else None,
+        last_synced_at=state.replayer.last_synced_at if state.replayer else None,
+        sync_error=state.replayer.last_error if state.replayer else '',
+        backend_circuit=state.api_client.backend_state if state.api_client else 'closed',
+        control_link=(
+            'disabled' if state.control_link is None
+            else 'connected' if state.control_link.connected else 'disconnected'
+        ),
+        station_config=state.station_config,
     )
 
 
+class StaffCacheInvalidateRequest(BaseModel):
+    rfid_tags: Optional[List[str]] = None  # None drops every entry
+
+
+@app.post("/staff-cache/invalidate")
+async def invalidate_staff_cache(request: StaffCacheInvalidateRequest,
+                                 authorization: str = Header(default="")):
+    """Drop cached staff answers (pushed by the backend on staff changes).
+    
+    Requires ``Authorization: Bearer <STATION_TOKEN>``; refused while no
+    station token is configured.
+    """
+    provided = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else ""
+    if not settings.station_token or not hmac.compare_digest(provided, settings.station_token):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    state.staff_cache.invalidate(request.rfid_tags)
+    logger.info(f"👮 Staff cache invalidated: {request.rfid_tags if request.rfid_tags is not None else 'all'}")
+    return {"message": "Staff cache invalidated", "staff_count": state.staff_cache.staff_count}
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -664,7 +865,13 @@ async def manual_end_session():
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time updates."""
     await websocket.accept()
-    state.websocket_clients.append(websocket)
+    client = FanoutClient(
+        websocket,
+        queue_size=settings.ws_queue_size,
+        send_timeout=settings.ws_send_timeout,
+    )
+    client.start()
+    state.websocket_clients.append(client)
     
     logger.info(f"🔌 WebSocket client connected (total: {len(state.websocket_clients)})")
     
@@ -680,7 +887,7 @@ async def websocket_endpoint(websocket: WebSocket):
         'last_result': state.last_result,
     }
     logger.info(f"📤 Sending connection message (mode={state.mode})")
-    await websocket.send_json(connection_msg)
+    client.send(connection_msg)
     
     try:
         # Keep connection alive and handle incoming messages
@@ -689,7 +896,7 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # Handle commands from web clients
             if data.get('type') == 'ping':
-                await websocket.send_json({'type': 'pong'})
+                client.send({'type': 'pong'})
             
             elif data.get('type') == 'get_status':
                 status_msg = {
@@ -701,15 +908,16 @@ async def websocket_endpoint(websocket: WebSocket):
                     'has_active_session': state.current_session is not None,
                     'current_session': state.current_session
                 }
-                await websocket.send_json(status_msg)
+                client.send(status_msg)
     
     except WebSocketDisconnect:
         logger.info("🔌 WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        if websocket in state.websocket_clients:
-            state.websocket_clients.remove(websocket)
+        if client in state.websocket_clients:
+            state.websocket_clients.remove(client)
+        await client.stop()
 
 
 # ============================================================================
@@ -0,0 +1,90 @@
+"""Local cache of staff RFID tags.
+
+Staff cards reset the RESULT screen and end games, and every such tap used
+to wait on the backend. The cache keeps the answer for each tag the station
+has seen:
+
+- positive entries (the tag belongs to an active staff member), seeded in
+  bulk from the backend at startup and refreshed periodically;
+- negative entries (player cards and unknown tags), learned from scans and
+  kept for a shorter time so a newly issued staff card works quickly.
+
+The backend pushes invalidations when a staff member's tag or active flag
+changes (POST /staff-cache/invalidate), so entries can live much longer
+than the push delay. Expired positive entries are still returned with
+``allow_stale=True``, which lets staff reset a station while the backend
+is unreachable.
+"""
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StaffCache:
+    """TTL cache mapping RFID tags to staff info (or None for non-staff)."""
+
+    def __init__(self, ttl: float = 900.0, negative_ttl: float = 60.0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # tag -> (expires_at, staff info or None)
+        self._entries: Dict[str, tuple] = {}
+        self.seeded_at: Optional[float] = None
+
+    def lookup(self, rfid_tag: str, allow_stale: bool = False):
+        """Return ``(hit, staff)`` for a tag.
+
+        ``staff`` is the cached staff info, or None for a known non-staff
+        tag. ``hit`` is False when nothing usable is cached. Stale entries
+        are only returned with ``allow_stale`` and only if positive.
+        """
+        entry = self._entries.get(rfid_tag)
+        if entry is None:
+            return False, None
+        expires_at, staff = entry
+        if time.monotonic() < expires_at:
+            return True, staff
+        if allow_stale and staff is not None:
+            return True, staff
+        return False, None
+
+    def put(self, rfid_tag: str, staff: Optional[Dict[str, Any]]):
+        """Remember whether a tag belongs to staff (``staff`` is None if not)."""
+        if not rfid_tag:
+            return
+        ttl = self.ttl if staff is not None else self.negative_ttl
+        self._entries[rfid_tag] = (time.monotonic() + ttl, staff)
+
+    def record_scan(self, rfid_tag: str, result: Optional[Dict[str, Any]]):
+        """Learn from a scan response that reports ``is_staff``."""
+        if not result or 'is_staff' not in result:
+            return
+        self.put(rfid_tag, result.get('staff') if result['is_staff'] else None)
+
+    def seed(self, staff_list: Iterable[Dict[str, Any]]):
+        """Replace the positive entries with the backend's full staff list.
+
+        Negative entries are kept unless the tag is now in the list.
+        """
+        expires_at = time.monotonic() + self.ttl
+        entries = {tag: entry for tag, entry in self._entries.items() if entry[1] is None}
+        for staff in staff_list:
+            tag = staff.get('rfid_tag')
+            if tag:
+                entries[tag] = (expires_at, staff)
+        self._entries = entries
+        self.seeded_at = time.time()
+        logger.info(f"👮 Staff cache seeded with {self.staff_count} staff tags")
+
+    def invalidate(self, rfid_tags: Optional[Iterable[str]] = None):
+        """Drop the given tags, or every entry if ``rfid_tags`` is None."""
+        if rfid_tags is None:
+            self._entries.clear()
+            return
+        for tag in rfid_tags:
+            self._entries.pop(tag, None)
+
+    @property
+    def staff_count(self) -> int:
+        return sum(1 for _, staff in self._entries.values() if staff is not None)
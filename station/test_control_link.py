@@ -0,0 +1,234 @@
+"""Tests for the control link, run against a fake websocket server.
+
+``websockets.connect`` is replaced by a fake that hands out scripted
+sockets, so no backend is needed. Run from the station directory with
+``python -m pytest`` or ``python -m unittest``.
+"""
+import asyncio
+import contextlib
+import json
+import unittest
+from unittest import mock
+
+import websockets
+from websockets.frames import Close
+
+import control_link
+from control_link import CLOSE_UNAUTHORIZED, ControlLink, LinkUnavailable, control_url
+
+
+class FakeSocket:
+    """One connection: ``respond`` answers each sent message like the backend would."""
+
+    def __init__(self, respond=None):
+        self.respond = respond
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.closed = False
+
+    async def send(self, text):
+        if self.closed:
+            raise websockets.ConnectionClosed(None, Close(1000, ''))
+        message = json.loads(text)
+        self.sent.append(message)
+        reply = self.respond(message) if self.respond else None
+        if reply is not None:
+            self.push(reply)
+
+    def push(self, message):
+        self.incoming.put_nowait(json.dumps(message))
+
+    def drop(self, code=1011):
+        """The backend closes the connection with ``code``."""
+        self.incoming.put_nowait(websockets.ConnectionClosed(Close(code, ''), None))
+
+    async def close(self):
+        self.closed = True
+        self.incoming.put_nowait(StopAsyncIteration())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.incoming.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+
+class FakeServer:
+    """Stands in for ``websockets.connect``; each connection takes the next queued socket."""
+
+    def __init__(self):
+        self.sockets = asyncio.Queue()
+        self.connects = []
+
+    @contextlib.asynccontextmanager
+    async def connect(self, url, **options):
+        self.connects.append((url, options))
+        socket = await self.sockets.get()
+        if isinstance(socket, Exception):
+            raise socket
+        yield socket
+
+
+def echo(message):
+    """Answer every request with its own data."""
+    if message.get('id'):
+        return {'type': 'response', 'id': message['id'], 'status': 200, 'body': message['data']}
+    return None
+
+
+async def eventually(predicate, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not reached')
+
+
+class ControlUrlTests(unittest.TestCase):
+    def test_url_follows_the_backend_scheme_and_carries_no_token(self):
+        self.assertEqual(control_url('https://arena.example.com/api', 'Station 1', '10.0.0.5'),
+                         'wss://arena.example.com/ws/station/Station_1/control/?ip=10.0.0.5')
+        self.assertEqual(control_url('http://192.168.1.10:8000', '', '10.0.0.5'),
+                         'ws://192.168.1.10:8000/ws/station/station/control/?ip=10.0.0.5')
+
+
+class ControlLinkTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeServer()
+        patcher = mock.patch.object(control_link.websockets, 'connect', self.server.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Reconnect at once instead of after the jittered delay; remember the delays asked for.
+        self.delays = []
+        patcher = mock.patch.object(control_link.random, 'uniform',
+                                    lambda low, high: self.delays.append(high) or 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start(self, link):
+        task = asyncio.create_task(link.run())
+        self.addAsyncCleanup(self.stop, task)
+        return task
+
+    async def stop(self, task):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def test_requests_are_answered_by_id(self):
+        socket = FakeSocket()
+        self.server.sockets.put_nowait(socket)
+        link = ControlLink('ws://backend/ws/station/1/control/?ip=10.0.0.5', token='secret')
+        self.start(link)
+        await eventually(lambda: link.connected)
+        self.assertEqual(self.server.connects[0][1]['extra_headers'], {'Authorization': 'Bearer secret'})
+
+        first = asyncio.create_task(link.request('scan', {'rfid': '1'}, timeout=2.0))
+        second = asyncio.create_task(link.request('scan', {'rfid': '2'}, timeout=2.0))
+        await eventually(lambda: len(socket.sent) == 2)
+        self.assertEqual([m['type'] for m in socket.sent], ['scan', 'scan'])
+        # Answered out of order: each reply still reaches its own caller.
+        for message in reversed(socket.sent):
+            socket.push(echo(message))
+        self.assertEqual(await first, {'type': 'response', 'id': socket.sent[0]['id'],
+                                       'status': 200, 'body': {'rfid': '1'}})
+        self.assertEqual((await second)['body'], {'rfid': '2'})
+        self.assertEqual(link._pending, {})
+
+    async def test_unanswered_requests_time_out(self):
+        self.server.sockets.put_nowait(FakeSocket())
+        link = ControlLink('ws://backend/')
+        self.start(link)
+        await eventually(lambda: link.connected)
+        self.assertIsNone(await link.request('scan', {'rfid': '1'}, timeout=0.05))
+        self.assertEqual(link._pending, {})
+
+    async def test_requests_fail_fast_while_the_link_is_down(self):
+        link = ControlLink('ws://backend/')
+        with self.assertRaises(LinkUnavailable):
+            await link.request('scan', {'rfid': '1'}, timeout=2.0)
+
+    async def test_pushes_go_to_their_handlers(self):
+        socket = FakeSocket()
+        self.server.sockets.put_nowait(socket)
+        received = []
+
+        async def config_changed(message):
+            received.append(message)
+
+        async def broken(message):
+            raise RuntimeError('boom')
+
+        link = ControlLink('ws://backend/', handlers={'config': config_changed, 'staff_cache': broken})
+        self.start(link)
+        await eventually(lambda: link.connected)
+        with self.assertLogs(control_link.logger, 'WARNING'):
+            socket.push({'type': 'staff_cache', 'tags': ['1']})
+            socket.push({'type': 'config', 'settings': {'hint_penalty': 5}})
+            await eventually(lambda: received)
+        # A failing handler does not take the link down.
+        self.assertEqual(received, [{'type': 'config', 'settings': {'hint_penalty': 5}}])
+        self.assertTrue(link.connected)
+
+    async def test_reconnects_after_the_connection_drops(self):
+        first, second = FakeSocket(), FakeSocket(respond=echo)
+        self.server.sockets.put_nowait(first)
+        link = ControlLink('ws://backend/', reconnect_delay=1.0, max_reconnect_delay=8.0)
+        self.start(link)
+        await eventually(lambda: link.connected)
+
+        # A request in flight when the link drops is answered with None, not left hanging.
+        pending = asyncio.create_task(link.request('events', {'events': []}, timeout=5.0))
+        await eventually(lambda: first.sent)
+        with self.assertLogs(control_link.logger, 'WARNING'):
+            first.drop()
+            self.assertIsNone(await pending)
+        self.assertFalse(link.connected)
+        self.assertEqual(link.last_error, 'closed (1011)')
+
+        self.server.sockets.put_nowait(OSError('connection refused'))
+        self.server.sockets.put_nowait(second)
+        await eventually(lambda: link.connected)
+        # Backoff doubles while reconnecting and resets once connected.
+        self.assertEqual(self.delays, [1.0, 2.0])
+        self.assertEqual(len(self.server.connects), 3)
+        self.assertEqual((await link.request('scan', {'rfid': '1'}, timeout=2.0))['status'], 200)
+
+    async def test_a_refused_token_waits_the_longest_delay(self):
+        socket = FakeSocket()
+        self.server.sockets.put_nowait(socket)
+        link = ControlLink('ws://backend/', token='wrong', reconnect_delay=1.0, max_reconnect_delay=60.0)
+        self.start(link)
+        await eventually(lambda: link.connected)
+        with self.assertLogs(control_link.logger, 'ERROR'):
+            socket.drop(CLOSE_UNAUTHORIZED)
+            await eventually(lambda: self.delays)
+        self.assertEqual(self.delays, [60.0])
+
+    async def test_heartbeats_keep_the_link_alive_until_the_backend_goes_quiet(self):
+        acks = True
+
+        def respond(message):
+            if message['type'] == 'heartbeat' and acks:
+                return {'type': 'heartbeat_ack'}
+            return None
+
+        socket = FakeSocket(respond=respond)
+        self.server.sockets.put_nowait(socket)
+        link = ControlLink('ws://backend/', heartbeat_interval=0.02)
+        self.start(link)
+        await eventually(lambda: len(socket.sent) >= 3)
+        self.assertTrue(link.connected)
+        self.assertFalse(socket.closed)
+
+        acks = False
+        with self.assertLogs(control_link.logger, 'WARNING'):
+            await eventually(lambda: socket.closed)
+            await eventually(lambda: not link.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""Tests for the PN532 reader loop, run against a fake PN532 and a fake clock.
+
+Run from the station directory with ``python -m pytest`` or ``python -m unittest``.
+"""
+import sys
+import types
+import unittest
+from collections import deque
+from unittest import mock
+
+import hardware
+
+CARD = bytes([0x12, 0x34, 0x56, 0x78])
+CARD_ID = str(int.from_bytes(CARD, byteorder="little"))
+OTHER = bytes([0xAA, 0xBB, 0xCC, 0xDD])
+OTHER_ID = str(int.from_bytes(OTHER, byteorder="little"))
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() only advances monotonic()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakePN532:
+    """Answers reads from scripts and stops the reader once they run out."""
+
+    def __init__(self, reads=(), targets=()):
+        self.reads = deque(reads)
+        self.targets = deque(targets)
+        self.reader = None
+        self.configured = 0
+        self.armed = 0
+
+    def _next(self, script):
+        if not script:
+            self.reader.running = False
+            return None
+        step = script.popleft()
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    def SAM_configuration(self):
+        self.configured += 1
+
+    def read_passive_target(self, timeout):
+        return self._next(self.reads)
+
+    def listen_for_passive_target(self):
+        self.armed += 1
+
+    def get_passive_target(self, timeout):
+        return self._next(self.targets)
+
+
+class FakeIRQ:
+    """The PN532 IRQ line: each wait answers the next scripted result."""
+
+    def __init__(self, answers=()):
+        self.answers = deque(answers)
+        self.reader = None
+
+    def wait_for_active(self, timeout):
+        if not self.answers:
+            self.reader.running = False
+            return False
+        return self.answers.popleft()
+
+    def close(self):
+        pass
+
+
+class ImmediateLoop:
+    """Runs callbacks handed over with call_soon_threadsafe right away."""
+
+    def is_closed(self):
+        return False
+
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+class NFCReaderLoopTests(unittest.TestCase):
+    def make_reader(self, pn532, irq=None, **options):
+        modules = {
+            'board': types.SimpleNamespace(SCL='SCL', SDA='SDA'),
+            'busio': types.SimpleNamespace(I2C=lambda scl, sda: object()),
+            'adafruit_pn532': types.ModuleType('adafruit_pn532'),
+            'adafruit_pn532.i2c': types.SimpleNamespace(PN532_I2C=lambda i2c, debug: pn532),
+            'gpiozero': types.SimpleNamespace(DigitalInputDevice=lambda pin, pull_up: irq),
+        }
+        with mock.patch.dict(sys.modules, modules):
+            reader = hardware.RaspberryPiNFCReader(irq_pin=17 if irq else None, **options)
+        pn532.reader = reader
+        if irq:
+            irq.reader = reader
+        self.events = []
+        reader.on_card_detected = lambda uid: self.events.append(('detected', uid))
+        reader.on_card_removed = lambda uid: self.events.append(('removed', uid))
+        reader._loop = ImmediateLoop()
+        return reader
+
+    def run_loop(self, reader):
+        clock = FakeClock()
+        reader.running = True
+        with mock.patch.object(hardware, 'time', clock):
+            reader._io_loop()
+        return clock
+
+    def test_a_missed_read_does_not_report_the_tap_twice(self):
+        # A single missed read in the middle of a tap, then the card leaves.
+        pn532 = FakePN532(reads=[CARD, None, CARD, CARD] + [None] * 20)
+        reader = self.make_reader(pn532)
+        self.run_loop(reader)
+        self.assertEqual(self.events, [('detected', CARD_ID), ('removed', CARD_ID)])
+
+    def test_card_counts_as_removed_only_after_the_debounce(self):
+        pn532 = FakePN532(reads=[CARD] + [None] * 14)
+        reader = self.make_reader(pn532, active_interval=0.02, removal_debounce=0.3)
+        self.run_loop(reader)
+        # 14 misses 20 ms apart are 0.28 s: still on the reader.
+        self.assertEqual(self.events, [('detected', CARD_ID)])
+
+        pn532 = FakePN532(reads=[CARD] + [None] * 15)
+        reader = self.make_reader(pn532, active_interval=0.02, removal_debounce=0.3)
+        self.run_loop(reader)
+        self.assertEqual(self.events, [('detected', CARD_ID), ('removed', CARD_ID)])
+
+    def test_swapping_cards_reports_the_old_one_removed_first(self):
+        pn532 = FakePN532(reads=[CARD, OTHER])
+        reader = self.make_reader(pn532)
+        self.run_loop(reader)
+        self.assertEqual(self.events, [('detected', CARD_ID), ('removed', CARD_ID), ('detected', OTHER_ID)])
+
+    def test_polling_slows_down_when_idle(self):
+        reader = self.make_reader(FakePN532(), active_interval=0.02, idle_interval=0.25, idle_after=10.0)
+        self.assertAlmostEqual(reader._poll_interval(0.0), 0.02)
+        self.assertAlmostEqual(reader._poll_interval(5.0), 0.135)
+        self.assertAlmostEqual(reader._poll_interval(60.0), 0.25)
+
+    def test_irq_mode_arms_once_per_wait_and_rearms_after_a_card(self):
+        # Two idle wake-ups, a card answers, it is polled until it leaves,
+        # then the reader goes back to waiting on the IRQ line.
+        irq = FakeIRQ(answers=[False, False, True, False])
+        pn532 = FakePN532(reads=[CARD] + [None] * 20, targets=[CARD])
+        reader = self.make_reader(pn532, irq=irq)
+        self.run_loop(reader)
+        self.assertEqual(self.events, [('detected', CARD_ID), ('removed', CARD_ID)])
+        # Idle wake-ups keep the armed listen; a read re-arms it.
+        self.assertEqual(pn532.armed, 2)
+        self.assertEqual(pn532.configured, 1)
+
+    def test_irq_mode_does_no_i2c_traffic_while_idle(self):
+        irq = FakeIRQ(answers=[False] * 5)
+        pn532 = FakePN532(reads=[CARD])
+        reader = self.make_reader(pn532, irq=irq)
+        self.run_loop(reader)
+        self.assertEqual(self.events, [])
+        self.assertEqual(pn532.armed, 1)
+        self.assertEqual(list(pn532.reads), [CARD])
+
+    def test_a_read_error_reconfigures_and_rearms(self):
+        irq = FakeIRQ(answers=[True, True])
+        pn532 = FakePN532(targets=[OSError('I2C bus error'), CARD], reads=[None] * 20)
+        reader = self.make_reader(pn532, irq=irq)
+        with self.assertLogs(hardware.logger, 'ERROR'):
+            self.run_loop(reader)
+        self.assertEqual(self.events, [('detected', CARD_ID), ('removed', CARD_ID)])
+        self.assertEqual(pn532.configured, 2)
+        # Armed before the error, after re-configuring, and after the card left.
+        self.assertEqual(pn532.armed, 3)
+
+    def test_a_quiet_reader_is_reconfigured(self):
+        clock = FakeClock()
+
+        class IdleIRQ(FakeIRQ):
+            def wait_for_active(self, timeout):
+                clock.sleep(timeout)  # Nobody taps: every wait runs to its timeout.
+                return super().wait_for_active(timeout)
+
+        irq = IdleIRQ(answers=[False] * 3)
+        pn532 = FakePN532()
+        reader = self.make_reader(pn532, irq=irq, reinit_after=2.0)
+        reader.running = True
+        with mock.patch.object(hardware, 'time', clock):
+            reader._io_loop()
+        # Re-initialised after two quiet seconds, then armed again.
+        self.assertEqual(pn532.configured, 2)
+        self.assertEqual(pn532.armed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
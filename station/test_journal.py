@@ -0,0 +1,160 @@
+"""Tests for the offline journal and its replayer.
+
+Each test uses a journal file in a temporary directory and a fake
+``send_batch``. Run from the station directory with ``python -m pytest``
+or ``python -m unittest``.
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+
+from journal import JournalReplayer, StationJournal
+
+
+class JournalTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'journal.db')
+        self.journal = self.open_journal()
+
+    def open_journal(self):
+        journal = StationJournal(self.path)
+        self.addCleanup(journal.close)
+        return journal
+
+
+class StationJournalTests(JournalTestCase):
+    def test_pending_events_come_back_in_journal_order(self):
+        stops = [self.journal.append('stop', {'rfid': str(i)}) for i in range(3)]
+        self.journal.append('checkpoint', {'rfid': '9'})
+        pending = self.journal.pending(3)
+        self.assertEqual([e['idempotency_key'] for e in pending], [e['idempotency_key'] for e in stops])
+        self.assertEqual(pending[0]['data'], {'rfid': '0'})
+        self.assertEqual(self.journal.oldest_occurred_at(), stops[0]['occurred_at'])
+
+        self.journal.remove([stops[0]['idempotency_key']])
+        self.assertEqual(self.journal.count(), 3)
+        self.assertEqual(self.journal.pending(1)[0]['idempotency_key'], stops[1]['idempotency_key'])
+
+    def test_only_the_newest_health_report_is_kept(self):
+        stop = self.journal.append('stop', {'rfid': '1'})
+        self.journal.append('health', {'cpu_percent': 10})
+        latest = self.journal.append('health', {'cpu_percent': 20})
+        self.assertEqual(
+            [e['idempotency_key'] for e in self.journal.pending(10)],
+            [stop['idempotency_key'], latest['idempotency_key']],
+        )
+
+    def test_events_survive_a_restart(self):
+        event = self.journal.append('stop', {'rfid': '1'})
+        self.journal.close()
+        reopened = self.open_journal()
+        self.assertEqual([e['idempotency_key'] for e in reopened.pending(10)], [event['idempotency_key']])
+
+
+class FakeBackend:
+    """``send_batch`` stand-in: answers each event with ``answer(event)``."""
+
+    def __init__(self, answer=lambda event: {'status': 200, 'body': {'ok': True}}):
+        self.answer = answer
+        self.batches = []
+        self.reachable = True
+
+    async def send_batch(self, events, timeout=None):
+        self.batches.append([e['data']['rfid'] for e in events])
+        if not self.reachable:
+            return None
+        return {'results': [self.answer(event) for event in events]}
+
+
+class JournalReplayerTests(JournalTestCase):
+    def replayer(self, backend, **options):
+        return JournalReplayer(self.journal, backend.send_batch, **options)
+
+    async def test_flush_sends_everything_in_order_and_in_batches(self):
+        for i in range(5):
+            self.journal.append('stop', {'rfid': str(i)})
+        backend = FakeBackend()
+        seen = []
+
+        async def on_result(event, result):
+            seen.append(event['data']['rfid'])
+
+        results = await self.replayer(backend, batch_size=2, on_result=on_result).flush()
+        self.assertEqual(backend.batches, [['0', '1'], ['2', '3'], ['4']])
+        self.assertEqual(seen, ['0', '1', '2', '3', '4'])
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.journal.count(), 0)
+
+    async def test_a_server_error_holds_back_later_events(self):
+        for i in range(3):
+            self.journal.append('stop', {'rfid': str(i)})
+        backend = FakeBackend(lambda event: {'status': 503 if event['data']['rfid'] == '1' else 200})
+        replayer = self.replayer(backend)
+        results = await replayer.flush()
+        # The event before the failure is done; the failed one and the one behind it stay, in order.
+        self.assertEqual(len(results), 1)
+        self.assertEqual([e['data']['rfid'] for e in self.journal.pending(10)], ['1', '2'])
+        self.assertEqual(replayer.last_error, 'backend error')
+
+        backend.answer = lambda event: {'status': 200}
+        await replayer.flush()
+        self.assertEqual(backend.batches[-1], ['1', '2'])
+        self.assertEqual(self.journal.count(), 0)
+        self.assertEqual(replayer.last_error, '')
+
+    async def test_rejected_events_are_final(self):
+        self.journal.append('stop', {'rfid': '1'})
+        backend = FakeBackend(lambda event: {'status': 404, 'body': {'error': 'No active session'}})
+        with self.assertLogs('journal', 'WARNING'):
+            results = await self.replayer(backend).flush()
+        self.assertEqual(list(results.values())[0]['status'], 404)
+        self.assertEqual(self.journal.count(), 0)
+
+    async def test_an_unreachable_backend_keeps_every_event(self):
+        self.journal.append('stop', {'rfid': '1'})
+        backend = FakeBackend()
+        backend.reachable = False
+        replayer = self.replayer(backend)
+        self.assertEqual(await replayer.flush(), {})
+        self.assertEqual(self.journal.count(), 1)
+        self.assertEqual(replayer.last_error, 'backend unreachable')
+
+    async def test_wait_for_returns_the_result_from_the_background_loop(self):
+        backend = FakeBackend(lambda event: {'status': 200, 'body': {'points': 42}})
+        replayer = self.replayer(backend)
+        loop = asyncio.create_task(replayer.run(retry_interval=60.0))
+        self.addCleanup(loop.cancel)
+        await asyncio.sleep(0)  # Let the first (empty) pass finish
+
+        event = self.journal.append('stop', {'rfid': '1'})
+        result = await replayer.wait_for(event['idempotency_key'], timeout=5.0)
+        self.assertEqual(result, {'status': 200, 'body': {'points': 42}})
+        self.assertEqual(self.journal.count(), 0)
+
+    async def test_wait_for_gives_up_and_leaves_the_event_to_the_loop(self):
+        backend = FakeBackend()
+        backend.reachable = False
+        replayer = self.replayer(backend)
+        loop = asyncio.create_task(replayer.run(retry_interval=60.0))
+        self.addCleanup(loop.cancel)
+
+        event = self.journal.append('stop', {'rfid': '1'})
+        self.assertIsNone(await replayer.wait_for(event['idempotency_key'], timeout=0.1))
+        self.assertEqual(self.journal.count(), 1)
+        self.assertEqual(replayer._waiters, {})
+
+        # Once the backend is back, a wake-up sends it.
+        backend.reachable = True
+        replayer.wake()
+        for _ in range(100):
+            if not self.journal.count():
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.journal.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
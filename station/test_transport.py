@@ -0,0 +1,198 @@
+"""Tests for the backend transport: retries, result shapes and the circuit breaker.
+
+Calls go to an ``httpx.MockTransport``, so no backend is needed. Run from
+the station directory with ``python -m pytest`` or ``python -m unittest``.
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+
+import transport
+from transport import BackendTransport, CircuitBreaker, CircuitOpen, EndpointPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(transport.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()  # A success resets the count
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+    def test_half_open_lets_a_single_trial_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 10.0
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+        # A failed trial opens the circuit for another reset_timeout.
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.clock.now += 10.0
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.before_call()
+        self.breaker.before_call()
+
+    def test_a_trial_without_a_verdict_can_be_retried(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 10.0
+        self.breaker.before_call()
+        self.breaker.release_trial()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before_call()
+
+
+class BackendTransportTests(unittest.IsolatedAsyncioTestCase):
+    def make_transport(self, handler, **options):
+        policies = {
+            'rfid/scan/': EndpointPolicy(read_timeout=1.0),
+            'station/events/': EndpointPolicy(idempotent=True),
+        }
+        backend = BackendTransport('http://backend/api/', policies=policies, retry_backoff=0.0, **options)
+        self.calls = []
+
+        def record(request):
+            self.calls.append(request)
+            return handler(request)
+
+        backend.client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        self.addAsyncCleanup(backend.close)
+        return backend
+
+    async def test_success_returns_the_json_body(self):
+        backend = self.make_transport(lambda request: httpx.Response(200, json={'ok': True}))
+        self.assertEqual(await backend.request('POST', '/rfid/scan/', json={'rfid': '1'}), {'ok': True})
+        self.assertEqual(str(self.calls[0].url), 'http://backend/api/rfid/scan/')
+
+    async def test_client_errors_keep_the_body_and_do_not_trip_the_breaker(self):
+        backend = self.make_transport(lambda request: httpx.Response(
+            404, json={'error': 'Unknown card', 'error_code': 'unknown_rfid'}))
+        for _ in range(5):
+            result = await backend.request('POST', 'rfid/scan/', json={})
+        self.assertEqual(result, {'error': 'Unknown card', 'error_code': 'unknown_rfid', '_status': 404})
+        self.assertEqual(backend.breaker.state, 'closed')
+
+        backend = self.make_transport(lambda request: httpx.Response(400, text='Bad request'))
+        self.assertEqual(await backend.request('GET', 'rfid/scan/'), {'error': 'HTTP 400', '_status': 400})
+
+    async def test_connection_failures_are_retried_for_any_call(self):
+        answers = [httpx.ConnectError('refused'), httpx.Response(200, json={'ok': True})]
+
+        def handler(request):
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        backend = self.make_transport(handler)
+        self.assertEqual(await backend.request('POST', 'rfid/scan/', json={}), {'ok': True})
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_read_timeouts_are_retried_only_when_safe(self):
+        def handler(request):
+            raise httpx.ReadTimeout('slow', request=request)
+
+        # A scan may have been applied: sending it again could award points twice.
+        backend = self.make_transport(handler, breaker=CircuitBreaker(failure_threshold=10))
+        self.assertIsNone(await backend.request('POST', 'rfid/scan/', json={}))
+        self.assertEqual(len(self.calls), 1)
+
+        backend = self.make_transport(handler, breaker=CircuitBreaker(failure_threshold=10))
+        self.assertIsNone(await backend.request('POST', 'station/events/', json={}))
+        self.assertEqual(len(self.calls), 3)
+
+    async def test_gateway_errors_are_retried_only_when_safe(self):
+        backend = self.make_transport(lambda request: httpx.Response(503),
+                                      breaker=CircuitBreaker(failure_threshold=10))
+        self.assertIsNone(await backend.request('GET', 'station/config/'))
+        self.assertEqual(len(self.calls), 3)
+
+        backend = self.make_transport(lambda request: httpx.Response(500),
+                                      breaker=CircuitBreaker(failure_threshold=10))
+        self.assertIsNone(await backend.request('GET', 'station/config/'))
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_open_circuit_fails_fast(self):
+        def handler(request):
+            raise httpx.ConnectError('refused')
+
+        backend = self.make_transport(handler)
+        self.assertIsNone(await backend.request('POST', 'rfid/scan/', json={}))
+        self.assertEqual(backend.breaker.state, 'open')
+        self.assertEqual(len(self.calls), 3)
+        self.assertIsNone(await backend.request('POST', 'rfid/scan/', json={}))
+        await backend.warm()
+        self.assertEqual(len(self.calls), 3)
+
+    async def test_a_cancelled_trial_does_not_leave_the_circuit_stuck(self):
+        started = asyncio.Event()
+        hang = True
+
+        async def handler(request):
+            if hang:
+                started.set()
+                await asyncio.Event().wait()
+            return httpx.Response(200, json={'ok': True})
+
+        backend = self.make_transport(handler)
+        clock = FakeClock()
+        with mock.patch.object(transport.time, 'monotonic', clock.monotonic):
+            for _ in range(3):
+                backend.breaker.record_failure()
+            clock.now += 10.0
+            trial = asyncio.create_task(backend.request('POST', 'rfid/scan/', json={}))
+            await started.wait()
+            # Only one trial at a time while it is in flight.
+            self.assertIsNone(await backend.request('POST', 'rfid/scan/', json={}))
+            trial.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await trial
+
+            hang = False
+            self.assertEqual(await backend.request('POST', 'rfid/scan/', json={}), {'ok': True})
+        self.assertEqual(backend.breaker.state, 'closed')
+
+    async def test_warm_opens_a_connection_and_reports_to_the_breaker(self):
+        backend = self.make_transport(lambda request: httpx.Response(405))
+        await backend.warm('rfid/scan/')
+        self.assertEqual(self.calls[0].method, 'OPTIONS')
+        self.assertEqual(str(self.calls[0].url), 'http://backend/api/rfid/scan/')
+
+        def handler(request):
+            raise httpx.ConnectError('refused')
+
+        backend = self.make_transport(handler, breaker=CircuitBreaker(failure_threshold=1))
+        await backend.warm()
+        self.assertEqual(backend.breaker.state, 'open')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+"""Resilient HTTP transport for talking to the Django backend.
+
+One pooled ``httpx.AsyncClient`` is shared by every call, with:
+
+- per-endpoint timeouts (a scan must answer fast; a journal batch may
+  take longer),
+- retries with full jitter: connection failures are retried for every
+  call (the request never reached the backend), read timeouts and
+  502/503/504 only for calls that are safe to repeat,
+- a circuit breaker: after several consecutive failures calls fail fast
+  for a while instead of each waiting out its timeout, then a single
+  trial call decides whether the backend is back,
+- ``warm()`` to open pool connections ahead of the next scan,
+- optional HTTP/2 (needs the ``h2`` package; only used over https).
+
+``request()`` has one result shape for every call: the decoded JSON body
+on success, the body plus ``error`` and ``_status`` for 4xx responses,
+and None when the backend could not give an answer.
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = frozenset({502, 503, 504})
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    """How calls to one endpoint are made."""
+    connect_timeout: float = 2.0
+    read_timeout: float = 5.0
+    # Safe to send twice (reads, or writes the backend deduplicates)
+    idempotent: bool = False
+    retries: int = 2
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+
+DEFAULT_POLICY = EndpointPolicy()
+
+
+class CircuitOpen(Exception):
+    """Raised when the backend is failing and calls are short-circuited."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        state = self.state
+        if state == 'open' or (state == 'half-open' and self._trial_in_flight):
+            raise CircuitOpen()
+        if state == 'half-open':
+            self._trial_in_flight = True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("🔌 Backend reachable again — circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Let another call be the trial after one ended without a verdict (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"🔌 Backend failing — circuit open for {self.reset_timeout:.0f}s")
+            self.opened_at = time.monotonic()
+
+
+class BackendTransport:
+    """Pooled, retrying, circuit-broken JSON client for one base URL."""
+
+    def __init__(self, base_url: str, policies: Optional[Dict[str, EndpointPolicy]] = None,
+                 http2: bool = False, max_connections: int = 10, keepalive_expiry: float = 120.0,
+                 breaker: Optional[CircuitBreaker] = None, retry_backoff: float = 0.2,
+                 max_retry_backoff: float = 2.0):
+        self.base_url = base_url.rstrip('/')
+        self.policies = policies or {}
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        try:
+            self.client = httpx.AsyncClient(limits=limits, timeout=DEFAULT_POLICY.timeout, http2=http2)
+        except ImportError:
+            logger.warning("HTTP/2 requested but the h2 package is not installed — using HTTP/1.1")
+            self.client = httpx.AsyncClient(limits=limits, timeout=DEFAULT_POLICY.timeout)
+
+    async def close(self):
+        await self.client.aclose()
+
+    def policy_for(self, endpoint: str) -> EndpointPolicy:
+        return self.policies.get(endpoint.strip('/') + '/', DEFAULT_POLICY)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: stations that lost the backend together don't retry in lockstep
+        return random.uniform(0, min(self.max_retry_backoff, self.retry_backoff * 2 ** attempt))
+
+    async def request(self, method: str, endpoint: str, json: Any = None,
+                      params: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Any:
+        """Send a request; see the module docstring for the result shape.
+
+        ``timeout`` caps the read timeout of the endpoint's policy.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        policy = self.policy_for(endpoint)
+        request_timeout = policy.timeout
+        if timeout is not None:
+            request_timeout = httpx.Timeout(min(timeout, policy.read_timeout),
+                                            connect=min(timeout, policy.connect_timeout))
+        safe = policy.idempotent or method == 'GET'
+
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpen:
+                logger.debug(f"{method} {url} skipped — circuit open")
+                return None
+
+            retry = False
+            try:
+                logger.debug(f"{method} {url} - {json if json is not None else params}")
+                response = await self.client.request(method, url, json=json, params=params,
+                                                     headers=headers, timeout=request_timeout)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Never reached the backend: safe to retry any call
+                self.breaker.record_failure()
+                logger.warning(f"{method} {url} failed to connect: {e!r}")
+                retry = True
+            except httpx.TransportError as e:
+                # May have been applied (read timeout, dropped connection)
+                self.breaker.record_failure()
+                logger.warning(f"{method} {url} failed: {e!r}")
+                retry = safe
+            except BaseException:
+                # Cancelled or a bug, not a backend verdict: don't leave the breaker stuck half-open
+                self.breaker.release_trial()
+                raise
+            else:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                    logger.warning(f"{method} {url} returned HTTP {response.status_code}")
+                    retry = safe and response.status_code in RETRYABLE_STATUS
+                else:
+                    self.breaker.record_success()
+                    return self._decode(response)
+
+            if not retry or attempt >= policy.retries:
+                return None
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> Any:
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        logger.debug(f"Response ({response.status_code}): {body}")
+        if response.status_code >= 400:
+            body = body if isinstance(body, dict) else {}
+            # Keep the body so callers can see error messages (and fields such as error_code)
+            return {**body, 'error': body.get('error', f'HTTP {response.status_code}'),
+                    '_status': response.status_code}
+        return body
+
+    async def warm(self, endpoint: str = ''):
+        """Open a pooled connection now so the next real call skips TCP setup."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            return
+        try:
+            await self.client.request('OPTIONS', f"{self.base_url}/{endpoint.lstrip('/')}",
+                                      timeout=DEFAULT_POLICY.timeout)
+            self.breaker.record_success()
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            logger.debug(f"Connection warm-up failed: {e!r}")
+        except BaseException:
+            self.breaker.release_trial()
+            raise